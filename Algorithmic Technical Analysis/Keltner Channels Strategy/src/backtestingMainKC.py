@@ -1,12 +1,29 @@
 import parseArgs
 
+from datetime import datetime
+
+import numpy as np
+
 import backtrader as bt
-import backtrader.analyzers as btanal
 
 import btToolbox.backtestingAnalysis as backtestingAnalysis
 
+import btToolbox.checkpointKC as checkpointKC
+
+import btToolbox.experimentStore as experimentStore
+
+import btToolbox.loggingUtils as loggingUtils
+
+import btToolbox.performanceAnalytics as performanceAnalytics
+
+import btToolbox.runCache as runCache
+
 import btToolbox.backtestingRetrivesDatas as backtestingRetrivesDatas
 
+import btToolbox.vectorizedKC as vectorizedKC
+
+import btToolbox.optimizeKC as optimizeKC
+
 
 def retrives_cerebro_with_data(data_args: dict) -> (bt.Cerebro, list):
     """
@@ -21,8 +38,8 @@ def retrives_cerebro_with_data(data_args: dict) -> (bt.Cerebro, list):
     """
     # List to store data analysis
     data_analisys_list = []
-    # Creating a cerebro instance
-    cerebro = bt.Cerebro()
+    # Creating a cerebro instance, keeping only the bars needed in low memory mode
+    cerebro = bt.Cerebro(exactbars=1 if data_args["lowmemory"] else False)
 
     for curr_traded in data_args["nameasset"]:
         try:
@@ -46,13 +63,20 @@ def retrives_cerebro_with_data(data_args: dict) -> (bt.Cerebro, list):
     return cerebro, data_analisys_list
 
 
-def set_cerebro(cerebro: bt.Cerebro, data_args: dict) -> None:
+def set_cerebro(
+    cerebro: bt.Cerebro,
+    data_args: dict,
+    logger: loggingUtils.JsonLinesLogger | None = None,
+    resume: dict | None = None,
+) -> None:
     """
     Sets up the cerebro with strategies and parameters.
 
     Args:
     - cerebro (bt.Cerebro): Cerebro instance
     - data_args (dict): Dictionary containing data-related arguments
+    - logger (JsonLinesLogger | None): Logger of the strategy, None to print
+    - resume (dict | None): Checkpoint the run resumes from, see checkpointKC.load
 
     Returns:
     - None
@@ -60,24 +84,202 @@ def set_cerebro(cerebro: bt.Cerebro, data_args: dict) -> None:
     # Retrieving strategy
     retrives_strategy = backtestingRetrivesDatas.retrives_strategy(data_args)
     # Adding strategy to cerebro
-    cerebro.addstrategy(retrives_strategy[0], **(retrives_strategy[1]))
+    cerebro.addstrategy(retrives_strategy[0], logger=logger, **(retrives_strategy[1]))
 
-    # Setting initial cash
-    cerebro.broker.setcash(data_args["startcash"])
-
-    # Setting commission
-    cerebro.broker.setcommission(commission=data_args["commission"])
+    # Setting initial cash and commission
+    backtestingRetrivesDatas.set_broker(cerebro, data_args)
 
     # Printing starting conditions
     print("Starting Portfolio Value: %.2f" % cerebro.broker.getvalue())
 
-    # Adding analyzers for performance analysis
-    cerebro.addanalyzer(btanal.SharpeRatio_A)
-    cerebro.addanalyzer(btanal.AnnualReturn)
-    cerebro.addanalyzer(btanal.DrawDown)
-    cerebro.addanalyzer(btanal.SQN)
-    cerebro.addanalyzer(btanal.TimeReturn)
-    cerebro.addanalyzer(btanal.TradeAnalyzer)
+    # Adding the analyzer recording the equity curve and the trades: the metrics
+    #   are computed from its arrays once the run is over, also with exactbars
+    cerebro.addanalyzer(performanceAnalytics.PerformanceRecorder, resume=resume)
+
+    if data_args["checkpoint"]:
+        # Keeping the last state a later run on more bars can resume from
+        cerebro.addanalyzer(checkpointKC.Checkpointer, resume=resume)
+
+
+def store_run(
+    data_args: dict,
+    data_analisys_list: list,
+    stamps: np.ndarray,
+    equity: np.ndarray,
+    trades: np.ndarray,
+    cash: float,
+) -> int:
+    """
+    Saves a run with its parameters, metrics, trades and equity curve into the
+    experiment store.
+
+    Args:
+    - data_args (dict): Dictionary containing data-related arguments
+    - data_analisys_list (list): List of data analysis
+    - stamps (np.ndarray): Timestamps (ns) of the bars
+    - equity (np.ndarray): Portfolio value at the end of each bar
+    - trades (np.ndarray): Trades, of vectorizedKC.TRADE_DTYPE
+    - cash (float): Cash at the end of the run
+
+    Returns:
+    - int: Id of the run in the store
+    """
+    run = experimentStore.retrives_run(
+        data_args,
+        experimentStore.data_fingerprint(data_analisys_list),
+        stamps,
+        equity,
+        trades,
+        cash,
+    )
+
+    return experimentStore.save([run])[0]
+
+
+def execute_cached(
+    key: str, cached: tuple, data_args: dict, data_analisys_list: list
+) -> None:
+    """
+    Prints the analysis of a run found in the run cache, without running it.
+
+    Args:
+    - key (str): Key of the run in the cache
+    - cached (tuple): Arrays and other values of the run, see runCache.get
+    - data_args (dict): Dictionary containing data-related arguments
+    - data_analisys_list (list): List of data analysis
+
+    Returns:
+    - None
+    """
+    arrays, meta = cached
+
+    # Printing starting conditions
+    print("Starting Portfolio Value: %.2f" % data_args["startcash"])
+    print("Run found in the run cache: %s" % key)
+
+    # Records as the PerformanceRecorder analyzer returns them
+    records = dict(
+        arrays,
+        startcash=meta["startcash"],
+        start=datetime.fromisoformat(meta["start"]),
+        end=datetime.fromisoformat(meta["end"]),
+    )
+
+    # Analyzing results
+    backtestingAnalysis.analysis_records(
+        records, meta["value"], meta["cash"], data_args, data_analisys_list
+    )
+
+    if data_args["lowmemory"] and not data_args["noPlot"]:
+        # exactbars keeps no history of the bars to plot
+        print("Plot disabled in low memory mode")
+
+
+def execute_vectorized(
+    cerebro: bt.Cerebro, data_args: dict, data_analisys_list: list
+) -> None:
+    """
+    Runs the strategy with the vectorized NumPy engine instead of cerebro.run().
+
+    Args:
+    - cerebro (bt.Cerebro): Cerebro instance holding the data feeds
+    - data_args (dict): Dictionary containing data-related arguments
+    - data_analisys_list (list): List of data analysis
+
+    Returns:
+    - None
+    """
+    if len(data_analisys_list) != 1:
+        # The assets share the cash in the strategy, they cannot be run one by one
+        exit("ERROR: THE VECTORIZED ENGINE SUPPORTS ONE ASSET AT A TIME")
+
+    # Retrieving strategy parameters
+    retrives_strategy = backtestingRetrivesDatas.retrives_strategy(data_args)
+
+    # Bar timestamps as seen by the broker
+    stamps = backtestingRetrivesDatas.retrives_feed_stamps(
+        cerebro.datas[0], data_analisys_list[0]
+    )
+
+    # Printing starting conditions
+    print("Starting Portfolio Value: %.2f" % data_args["startcash"])
+
+    # Looking the run up in the run cache
+    key = None
+    cached = None
+    if data_args["runCache"]:
+        key = runCache.run_key(data_args, retrives_strategy[1], data_analisys_list)
+        cached = runCache.get(key)
+
+    if cached is not None:
+        arrays, meta = cached
+        print("Run found in the run cache: %s" % key)
+        result = dict(arrays, cash=meta["cash"], value=meta["value"])
+        backtestingAnalysis.analysis_vectorized(
+            result, cerebro.datas[0], stamps, data_args, data_analisys_list
+        )
+        return
+
+    # Running the strategy
+    # Bands from the indicator cache, if enabled
+    bands = None
+    if data_args["indicatorCache"]:
+        bands = backtestingRetrivesDatas.retrives_bands(
+            data_analisys_list[0], data_args["periodEMA"], data_args["periodATR"]
+        )
+
+    result = vectorizedKC.run_vectorized(
+        data_analisys_list[0], data_args, retrives_strategy[1], stamps, bands
+    )
+
+    # Analyzing results, with the same report as cerebro
+    backtestingAnalysis.analysis_vectorized(
+        result, cerebro.datas[0], stamps, data_args, data_analisys_list
+    )
+
+    if key is not None:
+        # Saving the result into the run cache
+        runCache.put(
+            key,
+            dict(equity=result["equity"], trades=result["trades"]),
+            dict(cash=result["cash"], value=result["value"]),
+        )
+
+    if data_args["store"]:
+        # Saving the run into the experiment store
+        store_run(
+            data_args,
+            data_analisys_list,
+            stamps,
+            result["equity"],
+            result["trades"],
+            result["cash"],
+        )
+
+
+def execute_optimize(
+    cerebro: bt.Cerebro, data_args: dict, data_analisys_list: list
+) -> None:
+    """
+    Sweeps the strategy parameters over a process pool and prints the ranking.
+
+    Args:
+    - cerebro (bt.Cerebro): Cerebro instance holding the data feeds
+    - data_args (dict): Dictionary containing data-related arguments
+    - data_analisys_list (list): List of data analysis
+
+    Returns:
+    - None
+    """
+    if len(data_analisys_list) != 1:
+        exit("ERROR: THE OPTIMIZATION SUPPORTS ONE ASSET AT A TIME")
+
+    # Running every combination of the ranges
+    df = optimizeKC.optimize(cerebro.datas[0], data_analisys_list[0], data_args)
+
+    # Printing the ranking
+    print("Tested combinations: %d" % len(df))
+    backtestingAnalysis.print_optimization(df)
 
 
 def execute() -> None:
@@ -93,15 +295,117 @@ def execute() -> None:
     # Retrieving cerebro and data analysis
     cerebro, data_analisys_list = retrives_cerebro_with_data(data_args)
 
+    if data_args["optimize"]:
+        # Sweeping the strategy parameters instead of a single backtest
+        execute_optimize(cerebro, data_args, data_analisys_list)
+        return
+
+    if data_args["engine"] == "vectorized":
+        # Running the whole backtest as array operations, without cerebro
+        execute_vectorized(cerebro, data_args, data_analisys_list)
+        return
+
+    # Plotting needs the strategies of a real run
+    plot = not data_args["noPlot"] and not data_args["lowmemory"]
+
+    # Retrieving strategy parameters
+    strategy_params = backtestingRetrivesDatas.retrives_strategy(data_args)[1]
+
+    # Looking the run up in the run cache, which a plotted run only fills
+    key = None
+    if data_args["runCache"]:
+        key = runCache.run_key(data_args, strategy_params, data_analisys_list)
+        cached = None if plot else runCache.get(key)
+        if cached is not None:
+            execute_cached(key, cached, data_args, data_analisys_list)
+            return
+
+    # Looking for the checkpoint of a run on the same first bars
+    checkpoint_key = None
+    resume = None
+    if data_args["checkpoint"]:
+        if len(data_analisys_list) != 1:
+            # The assets share the cash in the strategy, restored one at a time
+            exit("ERROR: THE CHECKPOINTS SUPPORT ONE ASSET AT A TIME")
+        checkpoint_key = checkpointKC.checkpoint_key(data_args, strategy_params)
+        resume = checkpointKC.load(checkpoint_key, data_analisys_list[0], data_args)
+
+    if resume is not None:
+        # Running only the bars from the checkpoint on
+        feed = checkpointKC.retrives_feed(
+            cerebro.datas[0], data_analisys_list[0], data_args, resume
+        )
+        cerebro = bt.Cerebro(exactbars=1 if data_args["lowmemory"] else False)
+        cerebro.adddata(feed, name=data_args["nameasset"][0])
+        print(
+            "Resuming from the checkpoint after bar %d of %d"
+            % (resume["bars"], len(data_analisys_list[0]))
+        )
+
+    # Strategy log as JSON lines, only if a file is given
+    logger = None
+    if data_args["logFile"] is not None:
+        logger = loggingUtils.JsonLinesLogger(
+            data_args["logFile"], data_args["logLevel"]
+        )
+
     # Setting up cerebro with strategies and parameters
-    set_cerebro(cerebro, data_args)
+    set_cerebro(cerebro, data_args, logger, resume)
 
     # Running strategies
-    strats = cerebro.run()
+    try:
+        strats = cerebro.run()
+    finally:
+        if logger is not None:
+            logger.close()
 
     # Analyzing results
     backtestingAnalysis.analysis(strats[0], cerebro, data_args, data_analisys_list)
 
+    if checkpoint_key is not None:
+        # Saving the last state without orders in flight, for the next bars
+        checkpointKC.save(checkpoint_key, strats[0], data_analisys_list[0])
+
+    records = strats[0].analyzers.performancerecorder.get_analysis()
+    if key is not None:
+        # Saving the result into the run cache
+        runCache.put(
+            key,
+            {name: records[name] for name in ("equity", "stamps", "trades")},
+            dict(
+                startcash=records["startcash"],
+                start=records["start"].isoformat(),
+                end=records["end"].isoformat(),
+                value=cerebro.broker.getvalue(),
+                cash=cerebro.broker.getcash(),
+            ),
+        )
+
+    if data_args["store"]:
+        # Saving the run into the experiment store
+        store_run(
+            data_args,
+            data_analisys_list,
+            records["stamps"],
+            records["equity"],
+            records["trades"],
+            cerebro.broker.getcash(),
+        )
+
+    if data_args["noPlot"]:
+        # Batch mode: the plotting libraries are never imported
+        return
+
+    if data_args["lowmemory"]:
+        # exactbars keeps no history of the bars to plot
+        print("Plot disabled in low memory mode")
+        return
+
+    if resume is not None:
+        # The strategy only saw the bars from the checkpoint on
+        print("Plot disabled when resuming from a checkpoint")
+        return
+
     # Plotting results
     cerebro.plot(numfigs=1, style=data_args["plotstyle"])
 
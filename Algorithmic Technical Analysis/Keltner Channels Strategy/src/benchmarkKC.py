@@ -0,0 +1,451 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Hot paths measured for each dataset, in order: the bands computed by backtrader,
+#   then read from the indicator cache (see indicatorCache)
+BENCHMARKS = (
+    "load",
+    "indicator",
+    "strategy",
+    "report",
+    "load_cached",
+    "strategy_cached",
+)
+
+# Relative slowdown (or memory growth) flagged as a regression
+DEFAULT_TOLERANCE = 0.2
+
+# Growths below these are noise, never flagged: a 10 ms benchmark may double
+#   between two identical runs
+MIN_DELTA = dict(seconds=0.05, peak_rss_mb=10.0)
+
+# Runs of each dataset, the best of them is kept
+DEFAULT_REPEAT = 3
+
+# Synthetic datasets: stamped every minute from this date, so that even 100x the
+#   bars of binance.csv stay within the datetime64[ns] range
+SYNTHETIC_START = "2000-01-01"
+SYNTHETIC_TIMEFRAME = "1m"
+
+
+def retrives_history_path() -> str:
+    """
+    Gets the default path of the benchmark history.
+
+    Returns:
+    - str: The full path of the JSON history
+    """
+    return os.path.join(os.path.dirname(__file__), "../benchmarkHistory.json")
+
+
+def retrives_data_args(name_assets: list, timeframe: str) -> dict:
+    """
+    Gets the default arguments of a backtest for the benchmarked assets.
+
+    Args:
+    - name_assets (list): Names of the traded assets
+    - timeframe (str): Timeframe of the data
+
+    Returns:
+    - dict: Dictionary containing data-related arguments
+    """
+    import parseArgs
+
+    # Defaults of the backtest command line, without its own arguments
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    try:
+        data_args = parseArgs.getdata()
+    finally:
+        sys.argv = argv
+
+    data_args["nameasset"] = name_assets
+    data_args["timeframe"] = timeframe
+    data_args["noPlot"] = True
+
+    return data_args
+
+
+def scaled_dataset(factor: int, symbols: int) -> (list, str):
+    """
+    Writes the synthetic datasets of a case into the local catalog, if missing.
+
+    Each symbol resamples the returns of binance.csv by blocks, with its own seed,
+    so that the symbols do not move together.
+
+    Args:
+    - factor (int): Bars of each symbol, in multiples of binance.csv
+    - symbols (int): Number of symbols
+
+    Returns:
+    - list: Names of the traded assets
+    - str: Timeframe of the data
+    """
+    from btToolbox import backtestingRetrivesDatas, dataCatalog, syntheticData
+
+    root = backtestingRetrivesDatas.retrives_catalog_root()
+    source = syntheticData.source_returns(
+        backtestingRetrivesDatas.retireves_data_path("binance.csv")
+    )
+
+    name_assets = []
+    for i in range(symbols):
+        name = "BENCH%dX%d" % (i, factor)
+        name_assets.append(name)
+        if dataCatalog.lookup(root, name + "/USDT", SYNTHETIC_TIMEFRAME) is not None:
+            continue
+
+        syntheticData.write(
+            root,
+            name + "/USDT",
+            SYNTHETIC_TIMEFRAME,
+            bars=factor * (len(source) + 1),
+            start=SYNTHETIC_START,
+            method="bootstrap",
+            source=source,
+            seed=i,
+        )
+
+    return name_assets, SYNTHETIC_TIMEFRAME
+
+
+def peak_rss_mb() -> float:
+    """
+    Gets the peak resident memory of the process.
+
+    Returns:
+    - float: Peak resident set size in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+def run_case(dataset: str) -> dict:
+    """
+    Runs the benchmarks of a dataset, in the current process.
+
+    Args:
+    - dataset (str): 'binance' or '<factor>x<symbols>', e.g. '10x1'
+
+    Returns:
+    - dict: Benchmark -> seconds, bars per second and peak memory (MB)
+    """
+    import backtrader as bt
+
+    import backtestingMainKC
+    from btToolbox import backtestingAnalysis
+    from btToolbox.indicatorKC import IndicatorKeltnerChannels
+
+    if dataset == "binance":
+        data_args = retrives_data_args(["BTC"], "1h")
+    else:
+        factor, symbols = (int(value) for value in dataset.split("x"))
+        data_args = retrives_data_args(*scaled_dataset(factor, symbols))
+
+    # The data of the cases may extend beyond the default dates
+    data_args["fromdate"] = datetime(1970, 1, 2)
+    data_args["todate"] = datetime(2260, 1, 1)
+
+    class IndicatorOnly(bt.Strategy):
+        """Strategy computing the Keltner Channels of each data, without trading."""
+
+        def __init__(self) -> None:
+            for d in self.datas:
+                IndicatorKeltnerChannels(
+                    d,
+                    period_EMA=data_args["periodEMA"],
+                    period_ATR=data_args["periodATR"],
+                )
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        # Data loading, from the local store into the feeds, without the bands: the
+        #   indicator computes the EMA and the ATR instead of aliasing them
+        data_args["indicatorCache"] = False
+        start = time.perf_counter()
+        cerebro, data_analisys_list = backtestingMainKC.retrives_cerebro_with_data(
+            data_args
+        )
+        results["load"] = time.perf_counter() - start
+        rss = {"load": peak_rss_mb()}
+        bars = sum(len(data_analisys) for data_analisys in data_analisys_list)
+
+        # Indicator construction over all the bars
+        cerebro.addstrategy(IndicatorOnly)
+        start = time.perf_counter()
+        cerebro.run()
+        results["indicator"] = time.perf_counter() - start
+        rss["indicator"] = peak_rss_mb()
+
+        # Whole strategy loop, on fresh feeds
+        cerebro, data_analisys_list = backtestingMainKC.retrives_cerebro_with_data(
+            data_args
+        )
+        backtestingMainKC.set_cerebro(cerebro, data_args)
+        start = time.perf_counter()
+        strats = cerebro.run()
+        results["strategy"] = time.perf_counter() - start
+        rss["strategy"] = peak_rss_mb()
+
+        # Report generation from the analyzers
+        start = time.perf_counter()
+        backtestingAnalysis.analysis(strats[0], cerebro, data_args, data_analisys_list)
+        results["report"] = time.perf_counter() - start
+        rss["report"] = peak_rss_mb()
+
+        # Data loading with the bands of the indicator cache, then the strategy loop
+        #   on them
+        data_args["indicatorCache"] = True
+        start = time.perf_counter()
+        cerebro, _ = backtestingMainKC.retrives_cerebro_with_data(data_args)
+        results["load_cached"] = time.perf_counter() - start
+        rss["load_cached"] = peak_rss_mb()
+
+        backtestingMainKC.set_cerebro(cerebro, data_args)
+        start = time.perf_counter()
+        cerebro.run()
+        results["strategy_cached"] = time.perf_counter() - start
+        rss["strategy_cached"] = peak_rss_mb()
+
+    return {
+        name: dict(
+            seconds=seconds,
+            bars_per_second=bars / seconds if seconds > 0 else None,
+            peak_rss_mb=rss[name],
+        )
+        for name, seconds in results.items()
+    }
+
+
+def run_case_process(dataset: str) -> dict:
+    """
+    Runs the benchmarks of a dataset in a fresh interpreter, for a clean peak
+    memory.
+
+    Args:
+    - dataset (str): 'binance' or '<factor>x<symbols>'
+
+    Returns:
+    - dict: Benchmark -> seconds, bars per second and peak memory (MB)
+    """
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", dataset],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        exit("ERROR: BENCHMARK " + dataset.upper() + " FAILED\n" + result.stderr)
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def best_of(runs: list) -> dict:
+    """
+    Keeps the best of several runs of a dataset, benchmark by benchmark.
+
+    Args:
+    - runs (list): Results of each run, see run_case
+
+    Returns:
+    - dict: Benchmark -> lowest seconds (with its bars per second) and lowest
+        peak memory (MB)
+    """
+    best = {}
+    for name in runs[0]:
+        fastest = min((run[name] for run in runs), key=lambda r: r["seconds"])
+        best[name] = dict(
+            fastest,
+            peak_rss_mb=min(run[name]["peak_rss_mb"] for run in runs),
+        )
+
+    return best
+
+
+def retrives_commit() -> str | None:
+    """
+    Gets the current git commit, to tell the history entries apart.
+
+    Returns:
+    - str | None: The commit hash, with a '+' if the tree has changes, None
+        outside a git repository
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ("+" if dirty else "")
+
+
+def compare(previous: dict | None, current: dict, tolerance: float) -> list:
+    """
+    Compares the results of a dataset with the previous entry of the history.
+
+    Args:
+    - previous (dict | None): Previous results of the dataset, None if none
+    - current (dict): Current results of the dataset
+    - tolerance (float): Relative growth flagged as a regression, if also above
+        MIN_DELTA
+
+    Returns:
+    - list: Descriptions of the regressions
+    """
+    regressions = []
+    if previous is None:
+        return regressions
+
+    for name, values in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        for key in ("seconds", "peak_rss_mb"):
+            if (
+                before[key]
+                and values[key] > before[key] * (1.0 + tolerance)
+                and values[key] - before[key] > MIN_DELTA[key]
+            ):
+                regressions.append(
+                    "%s %s: %.3f -> %.3f" % (name, key, before[key], values[key])
+                )
+
+    return regressions
+
+
+def execute() -> None:
+    """
+    Main execution function: runs the benchmarks, appends them to the history
+    and exits with status 1 on a regression.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks of the backtest hot paths")
+    parser.add_argument(
+        "--scales",
+        "-s",
+        required=False,
+        default="1",
+        help="Synthetic bars in binance.csv multiples: 1,10,100 ('' for none)",
+    )
+    parser.add_argument(
+        "--symbols",
+        "-sy",
+        required=False,
+        default="1",
+        help="Symbols of the synthetic datasets: 1,10,100",
+    )
+    parser.add_argument(
+        "--history",
+        "-hi",
+        required=False,
+        default=retrives_history_path(),
+        help="JSON file the results are appended to",
+    )
+    parser.add_argument(
+        "--tolerance",
+        "-to",
+        required=False,
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Relative slowdown or memory growth flagged as a regression",
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        required=False,
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="Runs of each dataset, the best is kept",
+    )
+    parser.add_argument("--case", required=False, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # Child process of run_case_process
+        print(json.dumps(run_case(args.case)))
+        return
+
+    datasets = ["binance"] + [
+        "%sx%s" % (factor.strip(), symbols.strip())
+        for factor in args.scales.split(",")
+        for symbols in args.symbols.split(",")
+        if factor.strip() and symbols.strip()
+    ]
+
+    try:
+        with open(args.history) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = []
+
+    entry = dict(
+        commit=retrives_commit(),
+        date=datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        machine=platform.machine(),
+        results={},
+    )
+    regressions = []
+    print("Dataset\t\tBenchmark\t\tseconds\tbars/s\t\tpeak MB")
+    for dataset in datasets:
+        results = entry["results"][dataset] = best_of(
+            [run_case_process(dataset) for _ in range(max(1, args.repeat))]
+        )
+        for name in BENCHMARKS:
+            print(
+                "%-12s\t%-16s\t%.3f\t%-12.0f\t%.1f"
+                % (
+                    dataset,
+                    name,
+                    results[name]["seconds"],
+                    results[name]["bars_per_second"] or 0.0,
+                    results[name]["peak_rss_mb"],
+                )
+            )
+
+        # Last entry of the history with the same dataset
+        previous = next(
+            (
+                e["results"][dataset]
+                for e in reversed(history)
+                if dataset in e["results"]
+            ),
+            None,
+        )
+        regressions += [
+            dataset + " " + text
+            for text in compare(previous, results, args.tolerance)
+        ]
+
+    history.append(entry)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+
+    if regressions:
+        print("REGRESSIONS:\n" + "\n".join(regressions))
+        exit(1)
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import array
+import math
+
+import numpy as np
+
+import backtrader.feed as feed
+
+from . import columnarStore
+
+# Ordinal (days since 0001-01-01, as datetime.toordinal) of the Unix epoch
+EPOCH_ORDINAL = 719163
+
+# Nanoseconds per day, hour, minute, second and microsecond
+NS_PER_DAY = 86400 * 10**9
+NS_PER_HOUR = 3600 * 10**9
+NS_PER_MINUTE = 60 * 10**9
+NS_PER_SECOND = 10**9
+NS_PER_MICROSECOND = 10**3
+
+
+def date2num_array(stamps: np.ndarray) -> np.ndarray:
+    """
+    Convert int64 timestamps to backtrader float datetimes.
+
+    Same terms and exact summation as backtrader.utils.date2num, so that the
+    values are bit-identical to those of the backtrader feeds.
+
+    Args:
+        stamps (np.ndarray): int64 timestamps (ns since epoch, UTC).
+
+    Returns:
+        np.ndarray: float64 datetimes (days since 0001-01-01).
+    """
+    stamps = np.asarray(stamps, dtype=np.int64)
+    days, ns = np.divmod(stamps, NS_PER_DAY)
+
+    base = (days + EPOCH_ORDINAL).astype(np.float64)
+    hours = (ns // NS_PER_HOUR) / 24.0
+    minutes = (ns % NS_PER_HOUR // NS_PER_MINUTE) / 1440.0
+    seconds = (ns % NS_PER_MINUTE // NS_PER_SECOND) / 86400.0
+    microseconds = (ns % NS_PER_SECOND // NS_PER_MICROSECOND) / 86400000000.0
+
+    # The exact summation is not vectorizable: bars at midnight need none
+    out = base.copy()
+    fraction = np.flatnonzero(ns)
+    out[fraction] = [
+        math.fsum(terms)
+        for terms in zip(
+            base[fraction].tolist(),
+            hours[fraction].tolist(),
+            minutes[fraction].tolist(),
+            seconds[fraction].tolist(),
+            microseconds[fraction].tolist(),
+        )
+    ]
+
+    return out
+
+
+def num2date_array(nums: np.ndarray) -> np.ndarray:
+    """
+    Convert backtrader float datetimes to int64 timestamps, to the microsecond.
+
+    The day is taken from the integer part before scaling, as backtrader.utils.num2date
+    does, so that bars stamped at the end of a session (23:59:59.999989) stay on
+    their day.
+
+    Args:
+        nums (np.ndarray): float64 datetimes (days since 0001-01-01).
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch, UTC).
+    """
+    nums = np.asarray(nums, dtype=np.float64)
+    days = np.floor(nums)
+    microseconds = np.rint((nums - days) * (NS_PER_DAY // NS_PER_MICROSECOND))
+    days = days.astype(np.int64) - EPOCH_ORDINAL
+
+    return days * NS_PER_DAY + microseconds.astype(np.int64) * NS_PER_MICROSECOND
+
+
+class ArrayData(feed.DataBase):
+    """
+    Data feed reading bars from contiguous NumPy arrays.
+
+    Params:
+        - stamps (np.ndarray): int64 timestamps (ns since epoch), one per bar.
+        - columns (dict): Line name (open, high, low, close, volume,
+          openinterest) -> array of values. Missing lines are left as NaN.
+        - dtype (str): dtype in which the feed keeps the columns, 'float64' or
+          'float32' (half the memory, values rounded to single precision).
+
+    When preloading, each line buffer is filled in bulk from the raw bytes of its
+    array, with no per-bar Python conversion. Bars are converted one by one only
+    when the feed is not preloaded (e.g. with exactbars).
+    """
+
+    params = (
+        ("stamps", None),
+        ("columns", None),
+        ("dtype", "float64"),
+    )
+
+    def __init__(self) -> None:
+        """Keep the columns contiguous in the requested dtype."""
+        # No copy if the arrays already are contiguous in that dtype
+        self._columns = {
+            name: np.ascontiguousarray(values, dtype=self.p.dtype)
+            for name, values in self.p.columns.items()
+        }
+
+    def start(self) -> None:
+        """Convert the timestamps to backtrader datetimes."""
+        super(ArrayData, self).start()
+
+        self._idx = -1
+        self._dtnums = date2num_array(self.p.stamps)
+        self._values = None
+
+    def preload(self) -> None:
+        """Fill the line buffers with all the bars at once."""
+        lines = [getattr(self.lines, name) for name in self.lines.getlinealiases()]
+        if (
+            self._filters
+            or self._ffilters
+            or self._tzinput
+            or not all(isinstance(line.array, array.array) for line in lines)
+        ):
+            # Filters and bounded buffers need the bars one by one
+            return super(ArrayData, self).preload()
+
+        # fromdate/todate as the bar by bar loading would apply them
+        lo = int(np.searchsorted(self._dtnums, self.fromdate, side="left"))
+        hi = int(np.searchsorted(self._dtnums, self.todate, side="right"))
+        nan = np.full(hi - lo, np.nan)
+
+        for name in self.lines.getlinealiases():
+            if name == "datetime":
+                values = self._dtnums[lo:hi]
+            else:
+                values = self._columns.get(name, nan)[lo:hi]
+
+            line = getattr(self.lines, name)
+            line.array.frombytes(
+                np.ascontiguousarray(values, dtype=np.float64).data.cast("B")
+            )
+            line.lencount = len(line.array)
+            line.idx = line.lencount - 1
+
+        self._idx = hi - 1
+
+        self._last()
+        self.home()
+
+    def _load(self) -> bool:
+        """Load the next bar."""
+        if self._values is None:
+            # Bars loaded one by one: Python values, converted once
+            self._dtlist = self._dtnums.tolist()
+            self._values = [
+                (getattr(self.lines, name), values.tolist())
+                for name, values in self._columns.items()
+            ]
+
+        self._idx += 1
+
+        if self._idx >= len(self._dtlist):
+            # Exhausted all bars
+            return False
+
+        self.lines.datetime[0] = self._dtlist[self._idx]
+        for line, values in self._values:
+            line[0] = values[self._idx]
+
+        return True
+
+
+class BandsArrayData(ArrayData):
+    """
+    ArrayData with the Keltner Channels bands as extra lines.
+
+    Params:
+        - bands (tuple): (period_EMA, period_ATR) of the bands in the columns
+          'atrlow' and 'atrhigh'. IndicatorKeltnerChannels with the same periods
+          reads them instead of computing the EMA and the ATR.
+    """
+
+    lines = (
+        "atrlow",
+        "atrhigh",
+    )
+
+    params = (("bands", None),)
+
+    def __init__(self) -> None:
+        """Keep the bands in float64 whatever the dtype of the OHLCV columns."""
+        super(BandsArrayData, self).__init__()
+
+        for name in ("atrlow", "atrhigh"):
+            self._columns[name] = np.ascontiguousarray(
+                self.p.columns[name], dtype=np.float64
+            )
+
+
+def memory_usage(data: feed.AbstractDataBase) -> int:
+    """
+    Measure the memory held by a data feed: its line buffers plus the source data
+    it keeps (arrays of ArrayData, DataFrame of PandasData).
+
+    Args:
+        data (feed.AbstractDataBase): A started (or preloaded) data feed.
+
+    Returns:
+        int: Size in bytes.
+    """
+    size = 0
+    for name in data.lines.getlinealiases():
+        buffer = getattr(data.lines, name).array
+        if isinstance(buffer, array.array):
+            size += buffer.itemsize * len(buffer)
+        else:
+            size += 8 * len(buffer)
+
+    if isinstance(data, ArrayData):
+        size += np.asarray(data.p.stamps).nbytes
+        size += sum(values.nbytes for values in data._columns.values())
+    elif hasattr(data.p.dataname, "memory_usage"):
+        size += int(data.p.dataname.memory_usage(index=True, deep=True).sum())
+
+    return size
+
+
+class MmapData(feed.DataBase):
+    """
+    Data feed streaming bars from columnar data on disk (see columnarStore).
+
+    Params:
+        - directory (str): Directory of the columnar data.
+        - start (int | None): First timestamp included (ns), None for the first bar.
+        - end (int | None): First timestamp excluded (ns), None for the last bar.
+        - session_end (int | None): If given, every bar is stamped at this offset
+          (ns) from the start of its day, as GenericCSVData does with its default
+          daily timeframe.
+        - chunk (int): Number of bars read from disk at a time.
+
+    Only one chunk of bars is in memory at a time: each chunk is copied out of a
+    fresh memory map, which is closed right away so that the pages already read do
+    not stay resident. Meant to be run with cerebro's exactbars, which keeps the
+    line buffers bounded as well.
+    """
+
+    params = (
+        ("directory", None),
+        ("start", None),
+        ("end", None),
+        ("session_end", None),
+        ("chunk", 1 << 16),
+    )
+
+    # Line name -> column of the columnar data
+    COLUMNS = {
+        "open": "Open",
+        "high": "High",
+        "low": "Low",
+        "close": "Close",
+        "volume": "Volume",
+    }
+
+    def start(self) -> None:
+        """Resolve the window of bars to stream."""
+        super(MmapData, self).start()
+
+        stamps = self._mmap(columnarStore.INDEX)
+        self._pos, self._stop = columnarStore.window_bounds(
+            stamps, self.p.start, self.p.end
+        )
+        del stamps
+
+        self._chunk_idx = 0
+        self._dtlist = []
+        self._values = []
+
+    def _mmap(self, name: str) -> np.ndarray:
+        """Memory-map a column of the data."""
+        return np.load(columnarStore.column_path(self.p.directory, name), mmap_mode="r")
+
+    def _next_chunk(self) -> bool:
+        """Read the next chunk of bars from disk."""
+        if self._pos >= self._stop:
+            return False
+
+        stop = min(self._pos + self.p.chunk, self._stop)
+        stamps = np.array(self._mmap(columnarStore.INDEX)[self._pos : stop])
+        if self.p.session_end is not None:
+            stamps = stamps - stamps % NS_PER_DAY + self.p.session_end
+
+        self._dtlist = date2num_array(stamps).tolist()
+        self._values = [
+            (getattr(self.lines, line), self._mmap(name)[self._pos : stop].tolist())
+            for line, name in self.COLUMNS.items()
+        ]
+        self._chunk_idx = 0
+        self._pos = stop
+
+        return True
+
+    def _load(self) -> bool:
+        """Load the next bar."""
+        if self._chunk_idx >= len(self._dtlist) and not self._next_chunk():
+            # Exhausted all bars
+            return False
+
+        self.lines.datetime[0] = self._dtlist[self._chunk_idx]
+        for line, values in self._values:
+            line[0] = values[self._chunk_idx]
+        self._chunk_idx += 1
+
+        return True
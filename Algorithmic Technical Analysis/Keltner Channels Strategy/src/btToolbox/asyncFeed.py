@@ -0,0 +1,314 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import ccxt
+
+import backtrader as bt
+from backtrader import feed
+
+from . import loggingUtils, ohlcvDownloader
+
+# Number of candles requested per poll, enough to catch up after a short outage
+POLL_LIMIT = 20
+
+
+class RateLimiter:
+    """
+    Token bucket shared by the requests of all the symbols of an exchange.
+
+    Functionality:
+    - acquire waits until a request can be sent, at most rate per second on
+    average and burst at once after an idle period. Waiting requests are served
+    in order of arrival.
+
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        """
+        Initialize the rate limiter.
+
+        Args:
+            rate (float): Requests per second.
+            burst (int): Requests allowed at once after an idle period.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        Wait for a token.
+
+        Returns:
+            None
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class AsyncMarketData:
+    """
+    Poll the closed candles of many symbols concurrently from an asyncio exchange.
+
+    Functionality:
+    - One task per symbol waits for its next candle to close, then fetches it,
+    all the requests going through one shared RateLimiter. The tasks run on an
+    event loop in a background thread and deliver the closed candles
+    [timestamp (ms), open, high, low, close, volume] to a thread-safe queue per
+    symbol, read by AsyncCandleFeed. A None in the queue marks the end of the
+    data.
+    - The exchange is any object with the ccxt.async_support interface used here:
+    an awaitable fetch_ohlcv, milliseconds and close.
+
+    """
+
+    def __init__(
+        self,
+        exchange,
+        timeframe: str,
+        rate_limiter: RateLimiter | None = None,
+        delay: float = 1.0,
+        retry: float = 1.0,
+        speed: float = 1.0,
+        logger: loggingUtils.JsonLinesLogger | None = None,
+    ) -> None:
+        """
+        Initialize the market data.
+
+        Args:
+            exchange: ccxt.async_support exchange.
+            timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+            rate_limiter (RateLimiter | None): Limiter of the requests, by default
+                from the rateLimit (ms between requests) of the exchange; none if
+                the rateLimit is 0, e.g. for the local simulator.
+            delay (float): Seconds waited after a candle closes before fetching it.
+            retry (float): Seconds between two polls while a closed candle is not
+                available yet, or after a network error.
+            speed (float): Milliseconds of the exchange clock per real millisecond,
+                above 1 for a simulated exchange running faster than real time.
+            logger (JsonLinesLogger | None): Logger of the network errors, None to
+                print them.
+        """
+        self.exchange = exchange
+        self.timeframe = timeframe
+        self.step = ohlcvDownloader.timeframe_to_ms(timeframe)
+        rate_limit = getattr(exchange, "rateLimit", 100)
+        if rate_limiter is None and rate_limit > 0:
+            rate_limiter = RateLimiter(1000.0 / rate_limit)
+        self.rate_limiter = rate_limiter
+        self.delay = delay
+        self.retry = retry
+        self.speed = speed
+        self.logger = logger
+
+        # Symbol -> (open time (ms) of the first candle to deliver, queue)
+        self.subscriptions = {}
+        self.loop = None
+        self.task = None
+        self.thread = None
+
+    def subscribe(self, symbol: str, since: int) -> queue.Queue:
+        """
+        Add a symbol to poll, before start.
+
+        Args:
+            symbol (str): Symbol such as 'BTC/USDT'.
+            since (int): Open time (ms since epoch) of the first candle to deliver.
+
+        Returns:
+            queue.Queue: The queue of the closed candles of the symbol.
+        """
+        candles = queue.Queue()
+        self.subscriptions[symbol] = (since, candles)
+
+        return candles
+
+    def start(self) -> None:
+        """
+        Start polling all the symbols in a background thread.
+
+        Returns:
+            None
+        """
+        self.loop = asyncio.new_event_loop()
+        # Kept to cancel it from another thread
+        self.task = self.loop.create_task(self._run())
+        self.thread = threading.Thread(
+            target=self.loop.run_until_complete, args=(self.task,), daemon=True
+        )
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop polling and wait for the background thread.
+
+        Returns:
+            None
+        """
+        if self.thread is None:
+            return
+
+        # Cancelling the polling tasks too, from the thread of the loop
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join()
+        self.loop.close()
+        self.thread = None
+        self.task = None
+
+    async def _run(self) -> None:
+        """Poll all the symbols until cancelled, then close the exchange."""
+        try:
+            await asyncio.gather(
+                *(
+                    self._poll(symbol, since, candles)
+                    for symbol, (since, candles) in self.subscriptions.items()
+                )
+            )
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for since, candles in self.subscriptions.values():
+                candles.put(None)
+            await self.exchange.close()
+
+    def _warn(self, txt: str, symbol: str) -> None:
+        """Output a warning, to the logger if any, printed otherwise."""
+        if self.logger is None:
+            print(txt)
+        else:
+            self.logger.emit("WARNING", txt, symbol=symbol)
+
+    async def _sleep(self, milliseconds: float) -> None:
+        """Sleep for a duration of the exchange clock."""
+        await asyncio.sleep(max(0.0, milliseconds) / 1000.0 / self.speed)
+
+    async def _poll(self, symbol: str, since: int, candles: queue.Queue) -> None:
+        """Deliver the closed candles of a symbol, from the open time since."""
+        while True:
+            # Wait for the candle opened at since to close
+            await self._sleep(since + self.step - self.exchange.milliseconds())
+            await self._sleep(self.delay * 1000.0)
+
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            try:
+                page = await self.exchange.fetch_ohlcv(
+                    symbol, timeframe=self.timeframe, since=since, limit=POLL_LIMIT
+                )
+            except ccxt.NetworkError as e:
+                self._warn("%s - NETWORK ERROR, RETRY: %s" % (symbol, e), symbol)
+                await self._sleep(self.retry * 1000.0)
+                continue
+
+            # Only closed candles, in order and not delivered yet
+            now = self.exchange.milliseconds()
+            closed = [
+                candle[:6]
+                for candle in sorted(page)
+                if candle[0] >= since and candle[0] + self.step <= now
+            ]
+            if not closed:
+                await self._sleep(self.retry * 1000.0)
+                continue
+
+            for candle in closed:
+                if candle[0] >= since:
+                    candles.put(candle)
+                    since = candle[0] + self.step
+
+
+class AsyncCandleFeed(feed.DataBase):
+    """
+    Live data feed of the closed candles delivered by AsyncMarketData.
+
+    Functionality:
+    - Replays warm_bars first, then waits for the candles of its queue. While
+    waiting, Cerebro can move the other data feeds.
+
+    """
+
+    params = (
+        ("candles", None),  # queue.Queue returned by AsyncMarketData.subscribe
+        ("warm_bars", None),  # Closed candles replayed first, oldest first
+        ("qcheck", 0.5),  # Seconds waited for a candle before yielding to Cerebro
+        ("latency", None),  # latencyTracker.LatencyTracker stamping the live candles
+        ("clock", None),  # Function returning the now of the exchange (ms)
+    )
+
+    def islive(self) -> bool:
+        """
+        The feed is live: Cerebro runs in next mode and waits for its data.
+        """
+        return True
+
+    def haslivedata(self) -> bool:
+        """
+        Tell whether a candle is ready to be loaded without waiting.
+        """
+        return bool(self._warm) or not self.p.candles.empty()
+
+    def start(self) -> None:
+        """
+        Start the feed.
+        """
+        super().start()
+        self._warm = deque(self.p.warm_bars or [])
+        self._last_ts = self._warm[-1][0] if self._warm else None
+        self.put_notification(self.DELAYED if self._warm else self.LIVE)
+
+    def _load(self) -> bool | None:
+        """
+        Load the next candle.
+
+        Returns:
+            bool | None: True if a candle was loaded, None if none is ready yet,
+            False at the end of the data.
+        """
+        # Replayed warm bars have no arrival to measure, even the last one
+        live = not self._warm
+        if not live:
+            candle = self._warm.popleft()
+            if not self._warm:
+                self.put_notification(self.LIVE)
+        else:
+            try:
+                candle = self.p.candles.get(timeout=self._qcheck)
+            except queue.Empty:
+                return None
+            if candle is None:
+                return False
+            if self._last_ts is not None and candle[0] <= self._last_ts:
+                # Already replayed from the warm bars
+                return None
+            self._last_ts = candle[0]
+
+        tstamp, open_, high, low, close, volume = candle
+        self.lines.datetime[0] = bt.date2num(datetime.utcfromtimestamp(tstamp // 1000))
+        self.lines.open[0] = open_
+        self.lines.high[0] = high
+        self.lines.low[0] = low
+        self.lines.close[0] = close
+        self.lines.volume[0] = volume
+        self.lines.openinterest[0] = 0.0
+
+        if live and self.p.latency is not None:
+            self.p.latency.arrived(self, self.p.clock)
+
+        return True
@@ -0,0 +1,550 @@
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import backtrader as bt
+
+from . import backtestingRetrivesDatas
+from . import columnarStore
+from . import experimentStore
+from . import performanceAnalytics
+from . import runCache
+from . import vectorizedKC
+
+# Parameters a request may set, by data_args name, with their type; the others
+#   keep the defaults of the service
+REQUEST_PARAMS = {
+    "nameasset": list,
+    "currencyTrade": str,
+    "timeframe": str,
+    "fromdate": datetime,
+    "todate": datetime,
+    "engine": str,
+    "startcash": float,
+    "commission": float,
+    "periodEMA": int,
+    "periodATR": int,
+    "riskAmountBuy": float,
+    "riskAmountSell": float,
+    "stopprice": float,
+    "orderParamBuy": float,
+    "orderParamSell": float,
+}
+
+# Parameters that must be above 0, and at least 0
+POSITIVE_PARAMS = (
+    "periodEMA",
+    "periodATR",
+    "startcash",
+    "riskAmountBuy",
+    "riskAmountSell",
+    "stopprice",
+)
+NON_NEGATIVE_PARAMS = ("commission", "orderParamBuy", "orderParamSell")
+
+# Upper limits of the parameters, at most and below: the risk amounts are
+#   percentages of the cash, the stop price a fraction of the entry price and the
+#   order parameters percentages of the price
+MAX_PARAMS = dict(riskAmountBuy=100, riskAmountSell=100)
+BELOW_PARAMS = dict(stopprice=1, orderParamBuy=100, orderParamSell=100)
+
+# Engines a request may use
+ENGINES = ("cerebro", "vectorized")
+
+# Local data kept by each worker process: directory -> (mtime of its metadata,
+#   memory-mapped timestamps and columns), shared by the workers through the
+#   page cache
+_datasets = {}
+
+
+def retrives_request_args(default_args: dict, request: dict) -> dict:
+    """
+    Build the data arguments of a request from the defaults of the service.
+
+    Args:
+        default_args (dict): Data arguments of the service, see parseArgs.getdata.
+        request (dict): Parameters of the request, see REQUEST_PARAMS; dates as
+            'YYYY-MM-DD' and the assets as a list or a comma-separated string.
+
+    Returns:
+        dict: The data arguments of the backtest.
+
+    Raises:
+        ValueError: A parameter is unknown or has an invalid value.
+    """
+    data_args = dict(default_args)
+    for name, value in request.items():
+        kind = REQUEST_PARAMS.get(name)
+        if kind is None:
+            raise ValueError("unknown parameter '%s'" % name)
+        try:
+            if kind is list:
+                if isinstance(value, str):
+                    value = value.split(",")
+                value = [str(item).strip() for item in value]
+            elif kind is datetime:
+                value = datetime.strptime(value, "%Y-%m-%d")
+            elif kind in (int, float) and isinstance(value, bool):
+                raise TypeError("boolean")
+            else:
+                value = kind(value)
+            if kind is float and not math.isfinite(value):
+                raise ValueError("not finite")
+        except (TypeError, ValueError) as e:
+            raise ValueError("invalid value of '%s': %s" % (name, e))
+        data_args[name] = value
+
+    for name in POSITIVE_PARAMS:
+        if not data_args[name] > 0:
+            raise ValueError("'%s' must be positive" % name)
+    for name in NON_NEGATIVE_PARAMS:
+        if not data_args[name] >= 0:
+            raise ValueError("'%s' must not be negative" % name)
+    for name, limit in MAX_PARAMS.items():
+        if not data_args[name] <= limit:
+            raise ValueError("'%s' must be at most %s" % (name, limit))
+    for name, limit in BELOW_PARAMS.items():
+        if not data_args[name] < limit:
+            raise ValueError("'%s' must be below %s" % (name, limit))
+
+    if data_args["engine"] not in ENGINES:
+        raise ValueError("engine must be one of %s" % ", ".join(ENGINES))
+    if data_args["engine"] == "vectorized" and len(data_args["nameasset"]) != 1:
+        raise ValueError("the vectorized engine supports one asset at a time")
+
+    return data_args
+
+
+def retrives_resident(directory: str) -> (np.ndarray, dict):
+    """
+    Retrieve the local data of an asset, memory-mapped once per process.
+
+    Args:
+        directory (str): Directory of the columnar data.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch), all the bars.
+        dict: Column name -> float64 array.
+    """
+    # Rewritten with the data (e.g. a new CSV imported): mapped again
+    mtime = os.stat(os.path.join(directory, columnarStore.META)).st_mtime_ns
+    dataset = _datasets.get(directory)
+    if dataset is None or dataset[0] != mtime:
+        dataset = _datasets[directory] = (
+            mtime,
+            *columnarStore.read_columns(directory, True),
+        )
+
+    return dataset[1], dataset[2]
+
+
+def retrives_data(
+    curr_traded: str, data_args: dict
+) -> (backtestingRetrivesDatas.ArrayData, pd.DataFrame):
+    """
+    Retrieve the data feed of a request, as retrivesDatas does with local data but
+    from the resident data.
+
+    Args:
+        curr_traded (str): The symbol of the traded asset.
+        data_args (dict): Data arguments of the request.
+
+    Returns:
+        ArrayData: The backtrader data feed.
+        pd.DataFrame: The data in DataFrame format.
+    """
+    name_asset = curr_traded + "/" + data_args["currencyTrade"]
+    directory, source = backtestingRetrivesDatas.retrives_local_directory(
+        name_asset, data_args["timeframe"]
+    )
+    stamps, columns = retrives_resident(directory)
+
+    # Only the requested window, views on the mapped data
+    lo, hi = columnarStore.window_bounds(
+        stamps,
+        *backtestingRetrivesDatas.retrives_window(
+            data_args["fromdate"], data_args["todate"]
+        ),
+    )
+    if lo == hi:
+        exit(
+            "ERROR: NO DATA OF "
+            + name_asset
+            + " IN "
+            + source.upper()
+            + " BETWEEN FROMDATE AND TODATE"
+        )
+    data_analisys = columnarStore.to_dataframe(
+        stamps[lo:hi], {name: values[lo:hi] for name, values in columns.items()}
+    )
+
+    data = backtestingRetrivesDatas.retrives_feed(
+        data_analisys,
+        dtype=data_args["dtype"],
+        bands=backtestingRetrivesDatas.retrives_feed_bands(data_args),
+    )
+
+    return data, data_analisys
+
+
+def _run_cerebro(
+    datas: list, data_args: dict, strategy_params: dict
+) -> (dict, dict):
+    """
+    Run a backtest with cerebro, silently.
+
+    Args:
+        datas (list): (data feed, data analysis) of each asset.
+        data_args (dict): Data arguments of the request.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+
+    Returns:
+        dict: equity, stamps and trades arrays of the run.
+        dict: Other values of the run, as the run cache stores them.
+    """
+    cerebro = bt.Cerebro(stdstats=False)
+    for curr_traded, (data, _) in zip(data_args["nameasset"], datas):
+        cerebro.adddata(data, name=curr_traded)
+
+    # Silent strategy: the service would otherwise print every order
+    cerebro.addstrategy(
+        backtestingRetrivesDatas.KeltnerChannelsStrategy,
+        print_position=False,
+        **strategy_params,
+    )
+    backtestingRetrivesDatas.set_broker(cerebro, data_args)
+    cerebro.addanalyzer(performanceAnalytics.PerformanceRecorder)
+
+    records = cerebro.run()[0].analyzers.performancerecorder.get_analysis()
+
+    return {name: records[name] for name in ("equity", "stamps", "trades")}, dict(
+        startcash=records["startcash"],
+        start=records["start"].isoformat(),
+        end=records["end"].isoformat(),
+        value=cerebro.broker.getvalue(),
+        cash=cerebro.broker.getcash(),
+    )
+
+
+def _run_vectorized(
+    datas: list, data_args: dict, strategy_params: dict
+) -> (dict, dict):
+    """
+    Run a backtest with the vectorized engine.
+
+    Args:
+        datas (list): (data feed, data analysis) of the asset.
+        data_args (dict): Data arguments of the request.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+
+    Returns:
+        dict: equity and trades arrays of the run.
+        dict: Other values of the run, as the run cache stores them.
+    """
+    data, data_analisys = datas[0]
+    bands = None
+    if data_args["indicatorCache"]:
+        bands = backtestingRetrivesDatas.retrives_bands(
+            data_analisys, data_args["periodEMA"], data_args["periodATR"]
+        )
+
+    result = vectorizedKC.run_vectorized(
+        data_analisys, data_args, strategy_params, data.p.stamps, bands
+    )
+
+    return dict(equity=result["equity"], trades=result["trades"]), dict(
+        cash=result["cash"], value=result["value"]
+    )
+
+
+def run_backtest(data_args: dict, curves: bool = False) -> dict:
+    """
+    Run the backtest of a request in a worker process.
+
+    Args:
+        data_args (dict): Data arguments of the request.
+        curves (bool): Also return the equity curve and the trades.
+
+    Returns:
+        dict: The analysis of the run, see _run_backtest, or the error of the
+        request under "error".
+    """
+    try:
+        return _run_backtest(data_args, curves)
+    except SystemExit as e:
+        # The loaders exit on missing data: an error of the request, the worker
+        #   goes on
+        return dict(error=str(e.code))
+    except ValueError as e:
+        # Parameters not fitting the data of the request
+        return dict(error=str(e))
+
+
+def _run_backtest(data_args: dict, curves: bool) -> dict:
+    """
+    Run the backtest of a request, or find it in the run cache, and analyze it.
+
+    Args:
+        data_args (dict): Data arguments of the request.
+        curves (bool): Also return the equity curve and the trades.
+
+    Returns:
+        dict: params, bars, metrics (as the experiment store), annual_returns,
+        breakdown (see performanceAnalytics.trade_breakdown), cached, run_id (in
+        the experiment store, None if not stored) and seconds; with curves, also
+        stamps, equity and trades.
+
+    Raises:
+        ValueError: The window has too few bars for the periods.
+    """
+    start = time.perf_counter()
+    datas = [
+        retrives_data(curr_traded, data_args) for curr_traded in data_args["nameasset"]
+    ]
+    data_analisys_list = [data_analisys for _, data_analisys in datas]
+
+    # Bars of the bands before the first crossover, the ATR starting from the
+    #   previous close: with fewer, cerebro fails and the vectorized engine is flat
+    needed = max(data_args["periodEMA"] + 1, data_args["periodATR"] + 2)
+    bars = min(len(data_analisys) for data_analisys in data_analisys_list)
+    if bars < needed:
+        raise ValueError(
+            "the periods need %d bars, %d between fromdate and todate"
+            % (needed, bars)
+        )
+
+    strategy_params = backtestingRetrivesDatas.retrives_strategy(data_args)[1]
+
+    # Looking the run up in the run cache, shared with backtestingMainKC
+    key = None
+    cached = None
+    if data_args["runCache"]:
+        key = runCache.run_key(data_args, strategy_params, data_analisys_list)
+        cached = runCache.get(key)
+
+    if cached is not None:
+        arrays, meta = cached
+    elif data_args["engine"] == "vectorized":
+        arrays, meta = _run_vectorized(datas, data_args, strategy_params)
+    else:
+        arrays, meta = _run_cerebro(datas, data_args, strategy_params)
+
+    if key is not None and cached is None:
+        # Saving the result into the run cache
+        runCache.put(key, arrays, meta)
+
+    # Bar timestamps as seen by the broker
+    stamps = arrays["stamps"] if "stamps" in arrays else datas[0][0].p.stamps
+
+    run = experimentStore.retrives_run(
+        data_args,
+        experimentStore.data_fingerprint(data_analisys_list),
+        stamps,
+        arrays["equity"],
+        arrays["trades"],
+        meta["cash"],
+    )
+    run_id = None
+    if data_args["store"]:
+        # Saving the run into the experiment store
+        run_id = experimentStore.save([run])[0]
+
+    metrics = performanceAnalytics.analyze(
+        run["equity"], stamps, run["trades"], data_args["startcash"]
+    )
+
+    response = dict(
+        params=dict(
+            {name: data_args.get(name) for name in experimentStore.PARAM_COLUMNS},
+            nameasset=data_args["nameasset"],
+            fromdate=data_args["fromdate"].strftime("%Y-%m-%d"),
+            todate=data_args["todate"].strftime("%Y-%m-%d"),
+        ),
+        bars=len(run["equity"]),
+        metrics=run["metrics"],
+        annual_returns={
+            str(year): float(annual_return)
+            for year, annual_return in zip(
+                metrics["years"], metrics["annual_returns"]
+            )
+        },
+        breakdown=metrics["breakdown"],
+        cached=cached is not None,
+        run_id=run_id,
+    )
+    if curves:
+        response["stamps"] = run["stamps"].tolist()
+        response["equity"] = run["equity"].tolist()
+        # NaN prices of the trades as null
+        response["trades"] = json.loads(
+            pd.DataFrame(run["trades"]).to_json(orient="records")
+        )
+    response["seconds"] = time.perf_counter() - start
+
+    return response
+
+
+def _init_worker(preload: list) -> None:
+    """
+    Initialize a worker process, loading data and bands before the first request.
+
+    Args:
+        preload (list): Data arguments whose data and bands are loaded.
+
+    Returns:
+        None
+    """
+    for data_args in preload:
+        for curr_traded in data_args["nameasset"]:
+            _, data_analisys = retrives_data(curr_traded, data_args)
+            # Bands of the default periods, in the memory tier of the indicator cache
+            backtestingRetrivesDatas.retrives_bands(
+                data_analisys, data_args["periodEMA"], data_args["periodATR"]
+            )
+
+
+def _json_default(value):
+    """Convert the NumPy scalars for JSON."""
+    if isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    """Threading HTTP server accepting bursts of requests from parameter sweeps."""
+
+    # Connections waiting to be accepted, 5 by default
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class BacktestServer:
+    """
+    Local HTTP service running backtests on a pool of worker processes.
+
+    Functionality:
+    - POST /backtest with a JSON object of parameters (see REQUEST_PARAMS, plus
+    "curves": true for the equity curve and the trades) runs a backtest and
+    answers with its analysis as JSON (see _run_backtest), 400 with an "error"
+    for an invalid request. GET /status answers with the workers and the
+    requests served.
+    - The workers are forked once the modules are imported and keep the data
+    memory-mapped and the bands in the indicator cache between requests: a
+    request only pays its own backtest. Each HTTP request runs in its own
+    thread, so up to processes backtests run at the same time.
+
+    """
+
+    def __init__(
+        self,
+        default_args: dict,
+        port: int,
+        host: str = "127.0.0.1",
+        processes: int | None = None,
+        preload: list | None = None,
+    ) -> None:
+        """
+        Initialize the server, starting the workers and listening at once.
+
+        Args:
+            default_args (dict): Data arguments of the backtests, which the
+                requests override.
+            port (int): Port to listen on, 0 for any free one (see port).
+            host (str): Address to listen on, local only by default.
+            processes (int | None): Worker processes, None for all the cores.
+            preload (list | None): Assets whose data and default bands the workers
+                load at start.
+        """
+        self.default_args = default_args
+        self.processes = processes or os.cpu_count()
+        self.requests = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+        warm = []
+        if preload:
+            warm.append(dict(default_args, nameasset=preload))
+        self.pool = multiprocessing.Pool(
+            self.processes, initializer=_init_worker, initargs=(warm,)
+        )
+
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/status":
+                    self.send_error(404)
+                    return
+                with service.lock:
+                    status = dict(
+                        processes=service.processes,
+                        requests=service.requests,
+                        uptime=time.time() - service.started,
+                    )
+                self.send_json(200, status)
+
+            def do_POST(self) -> None:
+                if self.path.split("?")[0] != "/backtest":
+                    self.send_error(404)
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                    if not isinstance(request, dict):
+                        raise ValueError("the request must be a JSON object")
+                    curves = bool(request.pop("curves", False))
+                    data_args = retrives_request_args(service.default_args, request)
+                except ValueError as e:
+                    self.send_json(400, dict(error=str(e)))
+                    return
+
+                try:
+                    response = service.pool.apply(run_backtest, (data_args, curves))
+                except Exception as e:
+                    self.send_json(500, dict(error=repr(e)))
+                    return
+                with service.lock:
+                    service.requests += 1
+                self.send_json(400 if "error" in response else 200, response)
+
+            def send_json(self, code: int, content: dict) -> None:
+                body = json.dumps(
+                    content, default=_json_default, allow_nan=False
+                ).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # Requests are not logged
+                pass
+
+        self.server = _HTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+
+    def serve_forever(self) -> None:
+        """
+        Serve until interrupted, then stop the workers.
+
+        Returns:
+            None
+        """
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.pool.terminate()
+            self.pool.join()
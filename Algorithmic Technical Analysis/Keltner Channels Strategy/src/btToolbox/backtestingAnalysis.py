@@ -4,7 +4,9 @@ import pandas as pd
 import numpy as np
 
 import backtrader as bt
-from typing import OrderedDict
+import backtrader.feeds as btfeeds
+
+from . import performanceAnalytics
 
 # Constants for number formatting
 num_format = "{:.2f}"
@@ -28,34 +30,93 @@ def analysis(
         None
     """
 
-    # Extract various analysis results from the strategy
-    draw_downer = strat.analyzers.drawdown.get_analysis()
-    sharpe_ratio_annual = strat.analyzers.sharperatio_a.get_analysis()
-    annual_return = strat.analyzers.annualreturn.get_analysis()
-    sqn = strat.analyzers.sqn.get_analysis()
-    timer_return = strat.analyzers.timereturn.get_analysis()
-    trade_analyzer = strat.analyzers.tradeanalyzer.get_analysis()
+    # Extract the equity curve and the trades recorded during the run
+    records = strat.analyzers.performancerecorder.get_analysis()
 
-    # Print an overview of the initial and final states of the strategy
-    overview_init_end(
+    analysis_records(
+        records,
+        cerebro.broker.getvalue(),
+        cerebro.broker.getcash(),
         data_args,
-        cerebro,
-        timer_return,
-        annual_return,
-        trade_analyzer,
-        sqn,
-        sharpe_ratio_annual,
-        draw_downer,
+        data_analisys_list,
     )
 
+
+def analysis_records(
+    records: dict,
+    value: float,
+    cash: float,
+    data_args: dict,
+    data_analisys_list: list,
+) -> None:
+    """
+    Print the results of a run from its records, e.g. those of a cached run.
+
+    Args:
+        records (dict): Records of the PerformanceRecorder analyzer.
+        value (float): Portfolio value at the end of the run.
+        cash (float): Cash at the end of the run.
+        data_args (dict): Dictionary containing data-related arguments.
+        data_analisys_list (list): List of data for analysis.
+
+    Returns:
+        None
+    """
+    # Compute all the metrics at once from the arrays
+    metrics = performanceAnalytics.analyze(
+        records["equity"], records["stamps"], records["trades"], records["startcash"]
+    )
+
+    # Print an overview of the initial and final states of the strategy
+    overview_init_end(data_args, value, cash, records, metrics)
+
     # Print an overview of annual returns and related data
-    overview_year(annual_return, data_analisys_list)
+    overview_year(metrics, data_analisys_list)
 
     # Print an overview of trade statistics
-    overview_bars(trade_analyzer)
+    overview_bars(metrics["breakdown"])
 
     # Print a message about the current portfolio loss
-    print_message(draw_downer, cerebro.broker.getvalue())
+    print_message(metrics, value)
+
+
+def analysis_vectorized(
+    result: dict,
+    data: btfeeds.DataBase,
+    stamps: np.ndarray,
+    data_args: dict,
+    data_analisys_list: list,
+) -> None:
+    """
+    Print the results of a run of the vectorized engine, as those of cerebro.
+
+    Args:
+        result (dict): equity, trades, cash and value of the run, see
+            vectorizedKC.run_vectorized.
+        data (btfeeds.DataBase): The data feed of the run, for its timeframe.
+        stamps (np.ndarray): Timestamps (ns) of the bars as seen by the broker.
+        data_args (dict): Dictionary containing data-related arguments.
+        data_analisys_list (list): List of data for analysis.
+
+    Returns:
+        None
+    """
+    # Records as the PerformanceRecorder analyzer returns them
+    first, last = (pd.Timestamp(stamps[i]).to_pydatetime() for i in (0, -1))
+    records = dict(
+        equity=result["equity"],
+        stamps=stamps,
+        trades=result["trades"],
+        startcash=data_args["startcash"],
+        start=performanceAnalytics.period_key(
+            first, data._timeframe, data._compression
+        ),
+        end=performanceAnalytics.period_key(last, data._timeframe, data._compression),
+    )
+
+    analysis_records(
+        records, result["value"], result["cash"], data_args, data_analisys_list
+    )
 
 
 def print_md(
@@ -77,26 +138,20 @@ def print_md(
 
 def overview_init_end(
     data_args: dict,
-    cerebro: bt.Cerebro,
-    timer_return: OrderedDict,
-    annual_return: OrderedDict,
-    trade_analyzer: OrderedDict,
-    sqn: OrderedDict,
-    sharpe_ratio: OrderedDict,
-    draw_downer: OrderedDict,
+    value: float,
+    cash: float,
+    records: dict,
+    metrics: dict,
 ) -> None:
     """
     Print an overview of the initial and final states of the strategy.
 
     Args:
         data_args (dict): Dictionary containing data-related arguments.
-        cerebro (bt.Cerebro): Backtrader engine instance.
-        timer_return (OrderedDict): Timereturn analysis results.
-        annual_return (OrderedDict): Annualreturn analysis results.
-        trade_analyzer (OrderedDict): Tradeanalyzer analysis results.
-        sqn (OrderedDict): SQN analysis results.
-        sharpe_ratio (OrderedDict): Sharpe ratio analysis results.
-        draw_downer (OrderedDict): Drawdown analysis results.
+        value (float): Portfolio value at the end of the run.
+        cash (float): Cash at the end of the run.
+        records (dict): Records of the PerformanceRecorder analyzer.
+        metrics (dict): Metrics of performanceAnalytics.analyze.
 
     Returns:
         None
@@ -106,8 +161,8 @@ def overview_init_end(
     df = pd.DataFrame(
         {
             "INITIAL DEPOSIT": [f"$ {data_args['startcash']}"],
-            "DATE START DATA": [next(iter(timer_return))],
-            "DATE END DATA": [list(timer_return.keys())[-1]],
+            "DATE START DATA": [records["start"]],
+            "DATE END DATA": [records["end"]],
             "COMMISSION": [data_args["commission"]],
             "CURRENCY TRADE": [data_args["currencyTrade"]],
         }
@@ -134,27 +189,23 @@ def overview_init_end(
     # Create a DataFrame for total portfolio and performance metrics
     df = pd.DataFrame(
         {
-            "TOTAL PORTFOLIO VALUE": [
-                dollar_num_format.format(cerebro.broker.getvalue())
-            ],
-            "TOTAL CASH": [dollar_num_format.format(cerebro.broker.getcash())],
+            "TOTAL PORTFOLIO VALUE": [dollar_num_format.format(value)],
+            "TOTAL CASH": [dollar_num_format.format(cash)],
             "TOTAL NET PROFIT": [
-                dollar_num_format.format(
-                    cerebro.broker.getcash() - data_args["startcash"]
-                )
+                dollar_num_format.format(cash - data_args["startcash"])
             ],
             "TOTAL % NET PROFIT": [
                 perc_num_format.format(
-                    (cerebro.broker.getvalue() - data_args["startcash"])
+                    (value - data_args["startcash"])
                     * 100
                     / data_args["startcash"]
                 )
             ],
             "YEARLY AVG % RETURN": [
-                "{:.2%}".format(np.mean(list(annual_return.values())))
+                "{:.2%}".format(np.mean(metrics["annual_returns"]))
             ],
-            "# OPEN TRADERS": [trade_analyzer["total"]["open"]],
-            "# CLOSED TRADERS": [trade_analyzer["total"]["closed"]],
+            "# OPEN TRADERS": [metrics["open"]],
+            "# CLOSED TRADERS": [metrics["closed"]],
         }
     )
 
@@ -165,27 +216,28 @@ def overview_init_end(
     print_md(
         pd.DataFrame(
             {
-                "SQN": [num_format.format(sqn["sqn"])],
-                "SHARPE RATIO ANNUAL": [num_format.format(sharpe_ratio["sharperatio"])],
-                "MAX DRAWDOWN": [
-                    dollar_num_format.format(draw_downer["max"]["moneydown"])
-                ],
-                "MAX % DRAWDOWN": [
-                    perc_num_format.format(draw_downer["max"]["drawdown"])
+                "SQN": [num_format.format(metrics["sqn"])],
+                # None when the data span less than the annualization period
+                "SHARPE RATIO ANNUAL": [
+                    "-"
+                    if metrics["sharpe_ratio"] is None
+                    else num_format.format(metrics["sharpe_ratio"])
                 ],
-                "ACTUAL DRAWDOWN": [dollar_num_format.format(draw_downer["moneydown"])],
-                "ACTUAL % DRAWDOWN": [perc_num_format.format(draw_downer["drawdown"])],
+                "MAX DRAWDOWN": [dollar_num_format.format(metrics["max_moneydown"])],
+                "MAX % DRAWDOWN": [perc_num_format.format(metrics["max_drawdown"])],
+                "ACTUAL DRAWDOWN": [dollar_num_format.format(metrics["moneydown"][-1])],
+                "ACTUAL % DRAWDOWN": [perc_num_format.format(metrics["drawdown"][-1])],
             }
         )
     )
 
 
-def overview_year(annual_return: OrderedDict, data_analisys_list: list) -> None:
+def overview_year(metrics: dict, data_analisys_list: list) -> None:
     """
     Print an overview of annual returns and related data.
 
     Args:
-        annual_return (OrderedDict): Annualreturn analysis results.
+        metrics (dict): Metrics of performanceAnalytics.analyze.
         data_analisys_list (list): List of data for analysis.
 
     Returns:
@@ -195,9 +247,9 @@ def overview_year(annual_return: OrderedDict, data_analisys_list: list) -> None:
     # Create a DataFrame with annual return information
     df = pd.DataFrame(
         {
-            "YEAR": annual_return.keys(),
+            "YEAR": metrics["years"],
             "ANNUAL % RETURN WALLET": map(
-                lambda x: "{:.1%}".format(x), annual_return.values()
+                lambda x: "{:.1%}".format(x), metrics["annual_returns"]
             ),
         }
     )
@@ -232,12 +284,12 @@ def overview_year(annual_return: OrderedDict, data_analisys_list: list) -> None:
     print_md(df, "\n")
 
 
-def overview_bars(trade_analyzer: OrderedDict) -> None:
+def overview_bars(breakdown: dict) -> None:
     """
     Print an overview of trade statistics.
 
     Args:
-        trade_analyzer (OrderedDict): Tradeanalyzer analysis results.
+        breakdown (dict): Trade statistics of performanceAnalytics.trade_breakdown.
 
     Returns:
         None
@@ -264,14 +316,15 @@ def overview_bars(trade_analyzer: OrderedDict) -> None:
             Returns:
                 list: Trade statistics.
             """
+            stats = breakdown[s_l][w_l]
             return [
-                trade_analyzer[s_l][w_l],
-                dollar_num_format.format(trade_analyzer[s_l]["pnl"][w_l]["total"]),
-                dollar_num_format.format(trade_analyzer[s_l]["pnl"][w_l]["max"]),
-                trade_analyzer["len"][s_l][w_l]["total"],
-                trade_analyzer["len"][s_l][w_l]["max"],
-                trade_analyzer["len"][s_l][w_l]["min"],
-                num_format.format(trade_analyzer["len"][s_l][w_l]["average"]),
+                stats["count"],
+                dollar_num_format.format(stats["pnl_total"]),
+                dollar_num_format.format(stats["pnl_max"]),
+                stats["len_total"],
+                stats["len_max"],
+                stats["len_min"],
+                num_format.format(stats["len_average"]),
             ]
 
         return {"Won": won_or_lost("won"), "Lost": won_or_lost("lost")}
@@ -364,22 +417,47 @@ def annual_max_min_increase_perc_asset(datas: list) -> pd.DataFrame:
     return df
 
 
-def print_message(draw_downer: OrderedDict, value: float) -> None:
+def print_message(metrics: dict, value: float) -> None:
     """
     Print a message about the current portfolio loss.
 
     Args:
-        draw_downer (OrderedDict): Drawdown analysis results.
+        metrics (dict): Metrics of performanceAnalytics.analyze.
         value (float): Current portfolio value.
 
     Returns:
         None
     """
     print(
-        f"\nThe current loss from the maximum value reached by the portfolio is $ {draw_downer['moneydown']:.2f}, "
-        f"which occurred {draw_downer['len']} bars ago, i.e., the portfolio fell by about "
-        f"{draw_downer['drawdown']:.2f}%, until it reached the current level of $ {value:.2f}."
+        f"\nThe current loss from the maximum value reached by the portfolio is $ {metrics['moneydown'][-1]:.2f}, "
+        f"which occurred {metrics['drawdown_len']} bars ago, i.e., the portfolio fell by about "
+        f"{metrics['drawdown'][-1]:.2f}%, until it reached the current level of $ {value:.2f}."
         f"\nIn order to carry out this strategy you had to be prepared to bear a loss of "
-        f"{draw_downer['max']['drawdown']:.2f}%, about $ {draw_downer['max']['moneydown']:.2f} from the maximum "
+        f"{metrics['max_drawdown']:.2f}%, about $ {metrics['max_moneydown']:.2f} from the maximum "
         f"value reached by the portfolio."
     )
+
+
+def print_optimization(df: pd.DataFrame, top: int = 20) -> None:
+    """
+    Print the ranked results of a parameter sweep.
+
+    Args:
+        df (pd.DataFrame): Parameters and metrics of each run, already ranked.
+        top (int): Number of runs to print.
+
+    Returns:
+        None
+    """
+    df = df.head(top).copy()
+
+    # Format metric columns
+    df["SQN"] = df["SQN"].apply(lambda x: num_format.format(x) if x is not None else "-")
+    df["SHARPE RATIO ANNUAL"] = df["SHARPE RATIO ANNUAL"].apply(
+        lambda x: num_format.format(x) if x is not None else "-"
+    )
+    df["MAX DRAWDOWN"] = df["MAX DRAWDOWN"].apply(dollar_num_format.format)
+    df["MAX % DRAWDOWN"] = df["MAX % DRAWDOWN"].apply(perc_num_format.format)
+    df["TOTAL NET PROFIT"] = df["TOTAL NET PROFIT"].apply(dollar_num_format.format)
+
+    print_md(df, "\n", index=True)
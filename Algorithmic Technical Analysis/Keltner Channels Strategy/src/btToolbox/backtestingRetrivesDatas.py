@@ -1,23 +1,34 @@
-import time
+from __future__ import annotations
+
 import os
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
-import yfinance as yf
-
-import ccxt
-
+import backtrader as bt
 import backtrader.feeds as btfeeds
 
 from .strategyKC import KeltnerChannelsStrategy
 
+from . import columnarStore
+
+from . import dataCatalog
+
+from . import indicatorCache
+
+from . import ohlcvDownloader
+
+from .arrayFeed import ArrayData, BandsArrayData, MmapData
+
 from typing import Tuple, Type, Dict
 
 # Flags for different functionalities
 FLAG_YF = False
-FLAG_1H = True
 CSV = True if FLAG_YF == True else True  # TODO insert choice in parseArgs.py
 
+# End of the daily session at which local bars are stamped (backtrader's default)
+SESSION_END = pd.Timedelta(hours=23, minutes=59, seconds=59, microseconds=999990)
+
 
 def retireves_data_path(file_name: str) -> str:
     """
@@ -32,75 +43,77 @@ def retireves_data_path(file_name: str) -> str:
     return os.path.join(os.path.dirname(__file__), "../../datacsv/" + file_name)
 
 
+def retrives_catalog_root() -> str:
+    """
+    Get the root directory of the local data catalog.
+
+    Returns:
+        str: The full path of the catalog root.
+    """
+    return retireves_data_path("store")
+
+
+def retrives_window(from_date: datetime, to_date: datetime) -> (int, int):
+    """
+    Convert the requested dates to a window of timestamps of the local store.
+
+    Args:
+        from_date (datetime): The starting date, included.
+        to_date (datetime): The ending date, included up to the end of its day.
+
+    Returns:
+        int: First timestamp included (ns since epoch).
+        int: First timestamp excluded (ns since epoch).
+    """
+    start = pd.Timestamp(from_date).value
+    end = (pd.Timestamp(to_date).normalize() + pd.Timedelta(days=1)).value
+
+    return start, end
+
+
 def retrievesBinance(
-    name_file: str, from_date: datetime, timeframe: str
+    name_file: str, from_date: datetime, to_date: datetime, timeframe: str
 ) -> pd.DataFrame:
     """
     Retrieve data from the Binance exchange.
 
+    Only the candles missing from the local store are downloaded, then the store
+    is updated.
+
     Args:
         name_file (str): The name of the traded asset.
         from_date (datetime): The starting date for data retrieval.
+        to_date (datetime): The ending date for data retrieval.
         timeframe (str): The timeframe for OHLCV data.
 
     Returns:
         pd.DataFrame: The retrieved data in DataFrame format.
     """
 
+    # Imported on first use: ccxt is slow to load and the local data do not need it
+    import ccxt
+
     # Initialize the Binance exchange object
-    exchange = ccxt.binance()  # TODO: change if is not 1h
-    flag = 2
+    exchange = ccxt.binance()
     start_date_int = exchange.parse8601(from_date.strftime("%Y-%m-%dT%H:%M:%SZ"))
 
-    df = None
-    while flag != 0:
-        print(start_date_int, timeframe)
-        if FLAG_1H:
-            print(
-                "I'M USING 1 HOUR TIMEFRAME, IF YOU WANT 1MINUTE OR OTHER CHANGE MANUALLY IN THE CODE"
-            )  # TODO fix and delete this prints
-            print("THE FIX WILL COME SOON")
-            timeframe = "1h"
-
-        # Fetch OHLCV data from Binance
-        ohlc = exchange.fetch_ohlcv(
-            name_file, timeframe=timeframe, since=start_date_int
-        )
-        old_date = start_date_int
-        start_date_int = ohlc[-1][0] + 3600000
-
-        if flag == 2:
-            df = pd.DataFrame(
-                ohlc, columns=["Date", "Open", "High", "Low", "Close", "Volume"]
-            )
-            df["Date"] = pd.to_datetime(df["Date"], unit="ms")
-            df.set_index("Date", inplace=True)
-            flag = 1
-        else:
-            nuovi_df = pd.DataFrame(
-                ohlc, columns=["Date", "Open", "High", "Low", "Close", "Volume"]
-            )
-            nuovi_df["Date"] = pd.to_datetime(nuovi_df["Date"], unit="ms")
-            nuovi_df.set_index("Date", inplace=True)
-            df = df.append(nuovi_df)
-        print(df)
-
-        # Check if additional data is needed
-        if int(time.time()) * 1000 <= start_date_int or old_date == start_date_int:
-            flag = 0
-
-    # Drop the last row to avoid duplicated data
-    df = df.drop(df.index[-1])
+    # Fetch the missing OHLCV data from Binance into the local store
+    root = retrives_catalog_root()
+    stamps, columns = ohlcvDownloader.refresh(
+        exchange,
+        name_file,
+        timeframe,
+        start_date_int,
+        dataCatalog.symbol_directory(root, name_file, timeframe),
+    )
+    dataCatalog.register(root, name_file, timeframe)
 
-    # Adjust the DataFrame columns
-    df["Adj Close"] = df["Close"]
-    df["Datetime"] = df.index
-    df.set_index("Datetime", inplace=True)
-    df = df[["Open", "High", "Low", "Close", "Adj Close", "Volume"]]
-    # df.to_csv(retireves_data_path('binance.csv'), index=True)
-    print(df)
+    # Only the requested window, found by binary search on the sorted timestamps
+    lo, hi = columnarStore.window_bounds(stamps, *retrives_window(from_date, to_date))
 
-    return df
+    return columnarStore.to_dataframe(
+        stamps[lo:hi], {name: values[lo:hi] for name, values in columns.items()}
+    )
 
 
 def retrivesDatas(
@@ -126,6 +139,9 @@ def retrivesDatas(
                 "ERROR: UPCOMING ON YT THE POSIBILITY OF MULTIPLE CHOICE, FOR NOW BTC/USD"
             )  # TODO
         name_asset = curr_traded + "/" + "USD"
+        # Imported on first use: yfinance is slow to load
+        import yfinance as yf
+
         data_analisys = yf.download(
             name_asset,
             start=data_args["fromdate"],
@@ -135,33 +151,267 @@ def retrivesDatas(
         data = btfeeds.PandasData(dataname=data_analisys)
         print(name_asset + ":\t\t\tCorrectly contacted Yahoo Financials")
     else:
+        window = retrives_window(data_args["fromdate"], data_args["todate"])
+
         if CSV:
-            if name_asset != "BTC/USDT":
+            directory, source = retrives_local_directory(
+                name_asset, data_args["timeframe"]
+            )
+
+            # Only the requested window: a single in-memory copy, or memory-mapped
+            #   in low memory mode
+            stamps, columns = columnarStore.read_columns(
+                directory, data_args["lowmemory"], *window
+            )
+            if not len(stamps):
                 exit(
-                    "ERROR: UPCOMING ON binance.csv THE POSIBILITY OF MULTIPLE CHOICE, FOR NOW BTC/USDT"
-                )  # TODO
+                    "ERROR: NO DATA OF "
+                    + name_asset
+                    + " IN "
+                    + source.upper()
+                    + " BETWEEN FROMDATE AND TODATE"
+                )
+            data_analisys = columnarStore.to_dataframe(stamps, columns)
+
+            if data_args["lowmemory"]:
+                # Bars streamed from disk, stamped as retrives_feed does
+                data = MmapData(
+                    directory=directory,
+                    start=window[0],
+                    end=window[1],
+                    session_end=SESSION_END.value,
+                )
+            else:
+                # The feed shares the columns of data_analisys (unless float32)
+                data = retrives_feed(
+                    data_analisys,
+                    dtype=data_args["dtype"],
+                    bands=retrives_feed_bands(data_args),
+                )
+
+            print(name_asset + ":\t\t\tCorrectly contacted " + source)
+        else:
+            data_analisys = retrievesBinance(
+                name_asset,
+                data_args["fromdate"],
+                data_args["todate"],
+                data_args["timeframe"],
+            )
+            if data_args["lowmemory"]:
+                # The store is up to date: stream it from disk instead
+                directory = dataCatalog.symbol_directory(
+                    retrives_catalog_root(), name_asset, data_args["timeframe"]
+                )
+                data_analisys = columnarStore.to_dataframe(
+                    *columnarStore.read_columns(directory, True, *window)
+                )
+                data = MmapData(directory=directory, start=window[0], end=window[1])
+            else:
+                data = retrives_feed(
+                    data_analisys,
+                    data_analisys.index.values.astype("datetime64[ns]").astype(
+                        np.int64
+                    ),
+                    data_args["dtype"],
+                    retrives_feed_bands(data_args),
+                )
+            print(name_asset + ":\t\t\tCorrectly contacted Binance")
 
-            name_file = retireves_data_path("binance.csv")
+    return data, data_analisys
 
-            data = btfeeds.GenericCSVData(dataname=name_file)
 
-            data_analisys = pd.read_csv(retireves_data_path("binance.csv"))
+def retrives_local_directory(name_asset: str, timeframe: str) -> (str, str):
+    """
+    Retrieve the directory of the columnar local data of an asset.
 
-            # Converts 'Datetime' column to a datetime object
-            data_analisys["Datetime"] = pd.to_datetime(data_analisys["Datetime"])
+    Args:
+        name_asset (str): The traded asset, e.g. 'ETH/USDT'.
+        timeframe (str): The timeframe for OHLCV data.
 
-            # Set 'Datetime' as the index of the DataFrame
-            data_analisys.set_index("Datetime", inplace=True)
+    Returns:
+        str: The directory of the columnar data of the asset.
+        str: Its source, for the messages.
+    """
+    if name_asset == "BTC/USDT":
+        # Columnar cache of the CSV, parsed only when the file changes
+        return (
+            columnarStore.ensure_csv_cache(retireves_data_path("binance.csv")),
+            "binance.csv",
+        )
 
-            print(name_asset + ":\t\t\tCorrectly contacted binance.csv")
-        else:
-            data_analisys = retrievesBinance(
-                name_asset, data_args["fromdate"], data_args["timeframe"]
+    return retrives_catalog_directory(name_asset, timeframe), "the local catalog"
+
+
+def retrives_catalog_directory(name_asset: str, timeframe: str) -> str:
+    """
+    Retrieve the directory of the local data of an asset from the catalog.
+
+    A CSV file named '<BASE>-<QUOTE>-<timeframe>.csv' in datacsv (e.g.
+    ETH-USDT-1h.csv) is imported into the catalog on first use and whenever it
+    changes; afterwards the asset is found through the manifest only. Candles of
+    the asset downloaded from Binance take precedence over the file.
+
+    Args:
+        name_asset (str): The traded asset, e.g. 'ETH/USDT'.
+        timeframe (str): The timeframe for OHLCV data.
+
+    Returns:
+        str: The directory of the columnar data of the asset.
+    """
+    root = retrives_catalog_root()
+
+    name_file = retireves_data_path(
+        name_asset.replace("/", "-") + "-" + timeframe + ".csv"
+    )
+    if os.path.exists(name_file):
+        try:
+            dataCatalog.import_csv(root, name_file, name_asset, timeframe)
+        except ValueError:
+            # Downloaded candles, never overwritten by the file
+            print(
+                "%s not imported: the local catalog holds the downloaded %s %s"
+                % (os.path.basename(name_file), name_asset, timeframe)
             )
-            data = btfeeds.PandasData(dataname=data_analisys)
-            print(name_asset + ":\t\t\tCorrectly contacted Binance")
 
-    return data, data_analisys
+    entry = dataCatalog.lookup(root, name_asset, timeframe)
+    if entry is None:
+        exit(
+            "ERROR: NO LOCAL DATA OF "
+            + name_asset
+            + " "
+            + timeframe
+            + ", ADD "
+            + os.path.basename(name_file)
+            + " TO datacsv OR DOWNLOAD IT FROM BINANCE"
+        )
+
+    return os.path.join(root, entry["directory"])
+
+
+def retrives_feed(
+    data_analisys: pd.DataFrame,
+    stamps: np.ndarray | None = None,
+    dtype: str = "float64",
+    bands: Tuple[int, int] | None = None,
+) -> ArrayData:
+    """
+    Build a backtrader data feed on the columns of local data.
+
+    Args:
+        data_analisys (pd.DataFrame): The data in DataFrame format.
+        stamps (np.ndarray | None): int64 timestamps (ns) of the bars for the feed. By
+            default each bar is stamped at the end of its day session, as
+            GenericCSVData does with its default daily timeframe.
+        dtype (str): dtype of the OHLCV data kept by the feed, 'float64' or 'float32'.
+        bands (Tuple[int, int] | None): (period_EMA, period_ATR) of the Keltner
+            Channels bands to add to the feed from the indicator cache, None for
+            a feed without bands.
+
+    Returns:
+        ArrayData: The backtrader data feed.
+    """
+    if stamps is None:
+        stamps = (data_analisys.index.normalize() + SESSION_END).values.astype(
+            "datetime64[ns]"
+        ).astype(np.int64)
+
+    columns = {
+        "open": data_analisys["Open"].to_numpy(),
+        "high": data_analisys["High"].to_numpy(),
+        "low": data_analisys["Low"].to_numpy(),
+        "close": data_analisys["Close"].to_numpy(),
+        "volume": data_analisys["Volume"].to_numpy(),
+    }
+    if bands is None:
+        return ArrayData(stamps=stamps, columns=columns, dtype=dtype)
+
+    columns["atrlow"], columns["atrhigh"] = retrives_bands(
+        data_analisys, bands[0], bands[1], dtype
+    )
+    return BandsArrayData(stamps=stamps, columns=columns, dtype=dtype, bands=bands)
+
+
+def retrives_bands(
+    data_analisys: pd.DataFrame,
+    period_EMA: int,
+    period_ATR: int,
+    dtype: str = "float64",
+) -> (np.ndarray, np.ndarray):
+    """
+    Retrieve the Keltner Channels bands of local data from the indicator cache.
+
+    Args:
+        data_analisys (pd.DataFrame): The data in DataFrame format.
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+        dtype (str): dtype of the OHLCV data seen by the indicators.
+
+    Returns:
+        np.ndarray: Lower band (atrlow).
+        np.ndarray: Upper band (atrhigh).
+    """
+    # The values as the feed passes them to backtrader
+    high, low, close = (
+        data_analisys[col].to_numpy(dtype=dtype).astype(np.float64, copy=False)
+        for col in ["High", "Low", "Close"]
+    )
+
+    return indicatorCache.keltner_bands(
+        indicatorCache.dataset_hash(high, low, close),
+        high,
+        low,
+        close,
+        period_EMA,
+        period_ATR,
+    )
+
+
+def retrives_feed_bands(data_args: dict) -> Tuple[int, int] | None:
+    """
+    Retrieve the periods of the bands to precompute on the data feeds.
+
+    Args:
+        data_args (dict): Dictionary containing data-related arguments.
+
+    Returns:
+        Tuple[int, int] | None: (period_EMA, period_ATR), None if the indicator
+        cache is disabled.
+    """
+    if not data_args["indicatorCache"]:
+        return None
+
+    return data_args["periodEMA"], data_args["periodATR"]
+
+
+def retrives_feed_stamps(
+    data: btfeeds.DataBase, data_analisys: pd.DataFrame
+) -> np.ndarray:
+    """
+    Retrieve the bar timestamps as the broker sees them through the data feed.
+
+    Args:
+        data (btfeeds.DataBase): The backtrader data feed built by retrivesDatas.
+        data_analisys (pd.DataFrame): The same data in DataFrame format.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns), one per bar.
+    """
+    stamps = data_analisys.index
+    if isinstance(data, ArrayData):
+        # The feed carries its own stamps
+        return data.p.stamps
+    elif isinstance(data, MmapData):
+        if data.p.session_end is not None:
+            stamps = stamps.normalize() + pd.Timedelta(data.p.session_end)
+    elif (
+        isinstance(data, btfeeds.GenericCSVData)
+        and data.p.timeframe >= bt.TimeFrame.Days
+    ):
+        # GenericCSVData with a daily timeframe stamps every bar at the end of its
+        #   session, so all the bars of a day share the same datetime
+        stamps = stamps.normalize()
+
+    return stamps.values.astype("datetime64[ns]").astype(np.int64)
 
 
 def retrives_strategy(data_args: dict) -> Tuple[Type, Dict]:
@@ -196,3 +446,24 @@ def retrives_strategy(data_args: dict) -> Tuple[Type, Dict]:
             order_params_buy=data_args["orderParamBuy"],
             order_params_sell=data_args["orderParamSell"],
         )
+
+
+def set_broker(cerebro: bt.Cerebro, data_args: dict) -> None:
+    """
+    Set the starting cash and the commission of the broker of a backtest.
+
+    Shared by every backtest path, so that the run cache hashes this setup with
+    the strategy (see runCache.SOURCE_MODULES).
+
+    Args:
+        cerebro (bt.Cerebro): Cerebro instance.
+        data_args (dict): Dictionary containing data-related arguments.
+
+    Returns:
+        None
+    """
+    # Setting initial cash
+    cerebro.broker.setcash(data_args["startcash"])
+
+    # Setting commission
+    cerebro.broker.setcommission(commission=data_args["commission"])
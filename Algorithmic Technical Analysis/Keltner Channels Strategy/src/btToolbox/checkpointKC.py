@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import backtrader as bt
+import backtrader.feeds as btfeeds
+
+from . import backtestingRetrivesDatas, experimentStore, runCache
+from .arrayFeed import BandsArrayData
+from .vectorizedKC import TRADE_DTYPE
+
+# Checkpoints of the backtests, next to the other caches
+CHECKPOINT_DIRECTORY = os.path.join(
+    os.path.dirname(__file__), "../../datacsv/.cache/checkpoints"
+)
+
+# Attributes restoring an open backtrader Trade
+TRADE_ATTRIBUTES = (
+    "ref",
+    "tradeid",
+    "size",
+    "price",
+    "value",
+    "commission",
+    "pnl",
+    "pnlcomm",
+    "justopened",
+    "isopen",
+    "isclosed",
+    "baropen",
+    "dtopen",
+    "barclose",
+    "dtclose",
+    "barlen",
+    "status",
+    "long",
+)
+
+
+def warmup_bars(period_EMA: int, period_ATR: int) -> int:
+    """
+    Number of bars before the first call of the strategy, as with the bands of the
+    indicator cache: the bands need max(period_EMA, period_ATR + 1) bars and the
+    crossovers one more.
+
+    Args:
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+
+    Returns:
+        int: Bars replayed before the checkpoint when resuming.
+    """
+    return max(period_EMA, period_ATR + 1)
+
+
+def checkpoint_key(data_args: dict, strategy_params: dict) -> str:
+    """
+    Build the key of the checkpoint of a backtest, from everything but its last bars.
+
+    Args:
+        data_args (dict): Dictionary containing data-related arguments.
+        strategy_params (dict): Parameters of the strategy, see retrives_strategy.
+
+    Returns:
+        str: Hexadecimal SHA-256, also used as file name.
+    """
+    content = dict(
+        assets=data_args["nameasset"],
+        currency=data_args["currencyTrade"],
+        timeframe=data_args["timeframe"],
+        fromdate=data_args["fromdate"],
+        dtype=data_args["dtype"],
+        startcash=data_args["startcash"],
+        commission=data_args["commission"],
+        strategy=strategy_params,
+        source=runCache.source_hash(),
+    )
+
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class Checkpointer(bt.Analyzer):
+    """
+    Analyzer keeping the last state of the strategy a later run can resume from.
+
+    Functionality:
+    - After each call of the strategy with no order in flight (none pending in the
+    broker and no notification left to deliver), it records the broker cash, the
+    position and the open trade of the data, position_short_long, flagclose and
+    how far the PerformanceRecorder went. At that point nothing else carries over
+    to the next bar: the bands and the crossovers only depend on the bars.
+    - With resume, it restores such a state before the first bar of a run on the
+    bars from the checkpoint on. One asset at a time.
+
+    """
+
+    params = dict(
+        resume=None,  # Checkpoint to resume from, see load
+    )
+
+    def start(self) -> None:
+        """Restore the state of the checkpoint, if resuming."""
+        self.last = None
+        # Bars of the data before the first one of this run
+        self.bar_offset = 0
+
+        resume = self.p.resume
+        if resume is None:
+            return
+
+        self.bar_offset = resume["offset"]
+        d = self.data
+        strategy = self.strategy
+        strategy.broker.set_cash(resume["cash"])
+        if resume["position"] is not None:
+            saved = resume["position"]
+            position = bt.Position(saved["size"], saved["price"])
+            # Date of the last update, from which the broker charges interest
+            position.datetime = datetime.fromisoformat(saved["datetime"])
+            strategy.broker.positions[d] = position
+        if resume["trade"] is not None:
+            # Closed by the next orders as if it had been opened in this run
+            trade = bt.Trade(data=d)
+            trade.__dict__.update(resume["trade"])
+            trade.baropen -= self.bar_offset
+            strategy._trades[d][trade.tradeid].append(trade)
+        strategy.position_short_long[d._name] = resume["position_short_long"]
+        strategy.flagclose[d._name] = resume["flagclose"]
+
+    def prenext(self) -> None:
+        """The strategy has not started yet: nothing to record."""
+        pass
+
+    def next(self) -> None:
+        """Record the state, if no order is in flight."""
+        strategy = self.strategy
+        broker = strategy.broker
+        if broker.pending or broker.submitted or broker.notifs:
+            return
+        if any(order is not None for order in strategy.orders.values()):
+            return
+
+        d = self.data
+        position = strategy.getposition(d)
+        if position.size:
+            position = dict(
+                size=position.size,
+                price=position.price,
+                datetime=position.datetime.isoformat(),
+            )
+        else:
+            position = None
+        trades = strategy._trades[d][0]
+        trade = None
+        if trades and trades[-1].isopen:
+            trade = {name: getattr(trades[-1], name) for name in TRADE_ATTRIBUTES}
+            trade["baropen"] += self.bar_offset
+        recorder = strategy.analyzers.performancerecorder
+
+        self.last = dict(
+            bars=len(d) + self.bar_offset,
+            cash=broker.getcash(),
+            position=position,
+            trade=trade,
+            position_short_long=strategy.position_short_long[d._name],
+            flagclose=strategy.flagclose[d._name],
+            trades=len(recorder.trades),
+            sizes=dict(recorder.sizes),
+        )
+
+    def get_analysis(self) -> dict | None:
+        """
+        Get the last state recorded.
+
+        Returns:
+            dict | None: The state, None if there was none.
+        """
+        return self.last
+
+
+def save(
+    key: str,
+    strat: bt.Strategy,
+    data_analisys: pd.DataFrame,
+    directory: str = CHECKPOINT_DIRECTORY,
+) -> None:
+    """
+    Save the last state recorded by the Checkpointer of a run, with the records of
+    the PerformanceRecorder up to it.
+
+    Args:
+        key (str): Key of the checkpoint, see checkpoint_key.
+        strat (bt.Strategy): The strategy of the run.
+        data_analisys (pd.DataFrame): The data of the run, in DataFrame format.
+        directory (str): Directory of the checkpoints.
+
+    Returns:
+        None
+    """
+    last = strat.analyzers.checkpointer.get_analysis()
+    if last is None:
+        return
+
+    recorder = strat.analyzers.performancerecorder
+    bars = last["bars"]
+    arrays = dict(
+        nums=np.array(recorder.nums[:bars], dtype=np.float64),
+        values=np.array(recorder.values[:bars], dtype=np.float64),
+        trades=np.array(recorder.trades[: last["trades"]], dtype=TRADE_DTYPE),
+    )
+    meta = dict(
+        last,
+        startcash=recorder.startcash,
+        # The bars the state comes from, checked before resuming
+        fingerprint=experimentStore.data_fingerprint([data_analisys.iloc[:bars]]),
+    )
+
+    os.makedirs(directory, exist_ok=True)
+    # Written aside then renamed: a concurrent reader never sees a partial file
+    path = os.path.join(directory, key + ".npz")
+    tmp_path = "%s.%d.tmp.npz" % (path[:-4], os.getpid())
+    np.savez(tmp_path, _meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load(
+    key: str,
+    data_analisys: pd.DataFrame,
+    data_args: dict,
+    directory: str = CHECKPOINT_DIRECTORY,
+) -> dict | None:
+    """
+    Load the checkpoint of a backtest, if the data starts with the same bars.
+
+    Args:
+        key (str): Key of the checkpoint, see checkpoint_key.
+        data_analisys (pd.DataFrame): The data of the new run, in DataFrame format.
+        data_args (dict): Dictionary containing data-related arguments.
+        directory (str): Directory of the checkpoints.
+
+    Returns:
+        dict | None: The state (see Checkpointer) with the records (nums, values,
+        trades and startcash) and where the new run starts: offset (bars skipped)
+        and warmup (bars replayed before the checkpoint). None if there is no
+        checkpoint, its bars have changed or no bar follows them.
+    """
+    try:
+        with np.load(os.path.join(directory, key + ".npz"), allow_pickle=False) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    except (OSError, ValueError):
+        return None
+
+    meta = json.loads(arrays.pop("_meta").item())
+    bars = meta["bars"]
+    if len(data_analisys) <= bars:
+        # No new bar to run: the same run is in the run cache
+        return None
+    if experimentStore.data_fingerprint([data_analisys.iloc[:bars]]) != meta[
+        "fingerprint"
+    ]:
+        # Bars edited or fromdate moved: the state no longer matches them
+        return None
+
+    warmup = warmup_bars(data_args["periodEMA"], data_args["periodATR"])
+
+    return dict(
+        meta,
+        nums=arrays["nums"],
+        values=arrays["values"],
+        trades=arrays["trades"],
+        sizes={int(ref): size for ref, size in meta["sizes"].items()},
+        offset=bars - warmup,
+        warmup=warmup,
+    )
+
+
+def retrives_feed(
+    data: btfeeds.DataBase,
+    data_analisys: pd.DataFrame,
+    data_args: dict,
+    resume: dict,
+) -> BandsArrayData:
+    """
+    Build the data feed of a resumed run: the bars from the checkpoint on, after
+    the warm-up ones, with the bands of the whole data from the indicator cache.
+
+    Args:
+        data (btfeeds.DataBase): The data feed of the whole data, see retrivesDatas.
+        data_analisys (pd.DataFrame): The whole data in DataFrame format.
+        data_args (dict): Dictionary containing data-related arguments.
+        resume (dict): The checkpoint, see load.
+
+    Returns:
+        BandsArrayData: The backtrader data feed.
+    """
+    first = resume["offset"]
+    stamps = backtestingRetrivesDatas.retrives_feed_stamps(data, data_analisys)
+    # The bands continue those of the previous runs instead of starting again
+    atrlow, atrhigh = backtestingRetrivesDatas.retrives_bands(
+        data_analisys,
+        data_args["periodEMA"],
+        data_args["periodATR"],
+        data_args["dtype"],
+    )
+
+    columns = {
+        name.lower(): data_analisys[name].to_numpy()[first:]
+        for name in ("Open", "High", "Low", "Close", "Volume")
+    }
+    columns["atrlow"] = atrlow[first:]
+    columns["atrhigh"] = atrhigh[first:]
+
+    return BandsArrayData(
+        stamps=stamps[first:],
+        columns=columns,
+        dtype=data_args["dtype"],
+        bands=(data_args["periodEMA"], data_args["periodATR"]),
+    )
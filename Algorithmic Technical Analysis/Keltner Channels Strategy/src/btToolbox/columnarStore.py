@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# OHLCV columns of the local data, in the order of the CSV files
+COLUMNS = ("Open", "High", "Low", "Close", "Adj Close", "Volume")
+
+# Name of the int64 timestamp index (ns since epoch) and of the metadata file
+INDEX = "Datetime"
+META = "meta.json"
+
+
+def column_path(directory: str, name: str) -> str:
+    """
+    Get the path of the .npy file of a column.
+
+    Args:
+        directory (str): Directory of the columnar data.
+        name (str): Column name.
+
+    Returns:
+        str: The full path of the column file.
+    """
+    return os.path.join(directory, name.replace(" ", "_") + ".npy")
+
+
+def write_columns(
+    directory: str, stamps: np.ndarray, columns: dict, meta: dict | None = None
+) -> None:
+    """
+    Write OHLCV data as one raw .npy file per column plus the timestamp index.
+
+    The timestamps must be sorted: windows are then resolved by binary search.
+
+    Args:
+        directory (str): Directory of the columnar data.
+        stamps (np.ndarray): int64 timestamps (ns since epoch), one per bar.
+        columns (dict): Column name -> float64 array.
+        meta (dict | None): Metadata stored next to the columns.
+
+    Returns:
+        None
+    """
+    if len(stamps) > 1 and np.any(np.diff(stamps) < 0):
+        raise ValueError("The timestamps of %s are not sorted" % directory)
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Metadata first removed, then written last: a crash leaves no valid cache behind
+    meta_path = os.path.join(directory, META)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    np.save(column_path(directory, INDEX), np.ascontiguousarray(stamps, dtype=np.int64))
+    for name, values in columns.items():
+        np.save(
+            column_path(directory, name), np.ascontiguousarray(values, dtype=np.float64)
+        )
+
+    meta = dict(meta or {})
+    meta["columns"] = list(columns.keys())
+    meta["rows"] = len(stamps)
+    meta["first"] = int(stamps[0]) if len(stamps) else None
+    meta["last"] = int(stamps[-1]) if len(stamps) else None
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_meta(directory: str) -> dict | None:
+    """
+    Read the metadata of columnar data.
+
+    Args:
+        directory (str): Directory of the columnar data.
+
+    Returns:
+        dict | None: The metadata, None if the directory holds no valid data.
+    """
+    try:
+        with open(os.path.join(directory, META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def window_bounds(
+    stamps: np.ndarray, start: int | None = None, end: int | None = None
+) -> (int, int):
+    """
+    Resolve a time window to row bounds by binary search on the sorted timestamps.
+
+    Args:
+        stamps (np.ndarray): Sorted int64 timestamps (ns since epoch), possibly
+            memory-mapped: only the pages touched by the search are read.
+        start (int | None): First timestamp included (ns), None for the first row.
+        end (int | None): First timestamp excluded (ns), None for the last row.
+
+    Returns:
+        int: First row of the window.
+        int: Row after the last of the window.
+    """
+    lo = 0 if start is None else int(np.searchsorted(stamps, start, side="left"))
+    hi = len(stamps) if end is None else int(np.searchsorted(stamps, end, side="left"))
+
+    return lo, max(lo, hi)
+
+
+def read_columns(
+    directory: str,
+    mmap: bool = False,
+    start: int | None = None,
+    end: int | None = None,
+) -> (np.ndarray, dict):
+    """
+    Read OHLCV data written by write_columns, optionally only a time window.
+
+    The files are memory-mapped and, unless mmap is requested, only the rows of the
+    window are read into memory.
+
+    Args:
+        directory (str): Directory of the columnar data.
+        mmap (bool): Return memory-mapped arrays instead of in-memory copies.
+        start (int | None): First timestamp included (ns), None for the first row.
+        end (int | None): First timestamp excluded (ns), None for the last row.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch).
+        dict: Column name -> float64 array.
+    """
+    meta = read_meta(directory)
+
+    stamps = np.load(column_path(directory, INDEX), mmap_mode="r")
+    lo, hi = window_bounds(stamps, start, end)
+    columns = {
+        name: np.load(column_path(directory, name), mmap_mode="r")[lo:hi]
+        for name in meta["columns"]
+    }
+    stamps = stamps[lo:hi]
+
+    if not mmap:
+        # Materialize only the window
+        stamps = np.array(stamps)
+        columns = {name: np.array(values) for name, values in columns.items()}
+
+    return stamps, columns
+
+
+def to_dataframe(stamps: np.ndarray, columns: dict) -> pd.DataFrame:
+    """
+    Wrap columnar data in a DataFrame indexed by datetime, without copying the columns.
+
+    Args:
+        stamps (np.ndarray): int64 timestamps (ns since epoch).
+        columns (dict): Column name -> float64 array.
+
+    Returns:
+        pd.DataFrame: OHLCV data with a 'Datetime' index.
+    """
+    index = pd.DatetimeIndex(stamps.view("datetime64[ns]"), name=INDEX)
+
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def file_hash(path: str) -> str:
+    """
+    Compute the SHA-256 of a file.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        str: Hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def cache_directory(csv_path: str) -> str:
+    """
+    Get the cache directory of a CSV file: '.cache/<name>' next to the file.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+
+    Returns:
+        str: The cache directory.
+    """
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+
+    return os.path.join(os.path.dirname(csv_path), ".cache", name)
+
+
+def ensure_csv_cache(csv_path: str, directory: str | None = None) -> str:
+    """
+    Build or validate the columnar cache of an OHLCV CSV file.
+
+    The CSV is parsed only on first use or when it changes: the cache is valid while
+    the source mtime and size are unchanged, or, if they changed, while its SHA-256 is.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        directory (str | None): Directory of the columnar copy, by default the
+            cache directory of the file.
+
+    Returns:
+        str: The directory of the columnar copy.
+    """
+    if directory is None:
+        directory = cache_directory(csv_path)
+    stat = os.stat(csv_path)
+    meta = read_meta(directory)
+
+    if meta is not None:
+        if meta.get("mtime_ns") == stat.st_mtime_ns and meta["size"] == stat.st_size:
+            return directory
+
+        source_hash = file_hash(csv_path)
+        if meta.get("sha256") == source_hash:
+            # Touched but unchanged: only refresh the stored mtime
+            meta["mtime_ns"] = stat.st_mtime_ns
+            meta["size"] = stat.st_size
+            with open(os.path.join(directory, META), "w") as f:
+                json.dump(meta, f, indent=2)
+            return directory
+    else:
+        source_hash = file_hash(csv_path)
+
+    # Parse the CSV once and convert it, sorted by time
+    df = pd.read_csv(csv_path)
+    stamps = (
+        pd.to_datetime(df[INDEX]).values.astype("datetime64[ns]").astype(np.int64)
+    )
+    order = np.argsort(stamps, kind="stable")
+    columns = {name: df[name].to_numpy(dtype=np.float64)[order] for name in COLUMNS}
+
+    write_columns(
+        directory,
+        stamps[order],
+        columns,
+        dict(
+            source=os.path.basename(csv_path),
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            sha256=source_hash,
+        ),
+    )
+
+    return directory
+
+
+def load_csv_cached(
+    csv_path: str, start: int | None = None, end: int | None = None
+) -> (np.ndarray, dict):
+    """
+    Load an OHLCV CSV file, or a time window of it, through its columnar cache.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+        start (int | None): First timestamp included (ns), None for the first row.
+        end (int | None): First timestamp excluded (ns), None for the last row.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch).
+        dict: Column name -> float64 array.
+    """
+    return read_columns(ensure_csv_cache(csv_path), start=start, end=end)
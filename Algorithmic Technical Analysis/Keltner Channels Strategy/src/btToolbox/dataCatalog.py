@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import json
+import os
+
+import numpy as np
+
+from . import columnarStore
+
+# Manifest of the catalog, in its root directory
+MANIFEST = "manifest.json"
+
+
+def manifest_path(root: str) -> str:
+    """
+    Get the path of the manifest of a catalog.
+
+    Args:
+        root (str): Root directory of the catalog.
+
+    Returns:
+        str: The full path of the manifest.
+    """
+    return os.path.join(root, MANIFEST)
+
+
+def symbol_directory(root: str, symbol: str, timeframe: str) -> str:
+    """
+    Get the directory of the columnar data of a symbol: '<BASE-QUOTE>/<timeframe>'.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+
+    Returns:
+        str: The full path of the directory.
+    """
+    return os.path.join(root, symbol.replace("/", "-"), timeframe)
+
+
+def read_manifest(root: str) -> dict:
+    """
+    Read the manifest of a catalog.
+
+    Args:
+        root (str): Root directory of the catalog.
+
+    Returns:
+        dict: Symbol -> timeframe -> entry, empty if the catalog has no manifest.
+    """
+    try:
+        with open(manifest_path(root)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(root: str, manifest: dict) -> None:
+    """
+    Write the manifest of a catalog, replacing the previous one atomically.
+
+    Args:
+        root (str): Root directory of the catalog.
+        manifest (dict): Symbol -> timeframe -> entry.
+
+    Returns:
+        None
+    """
+    os.makedirs(root, exist_ok=True)
+
+    path = manifest_path(root)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _entry(root: str, symbol: str, timeframe: str, directory: str) -> dict | None:
+    """
+    Build the manifest entry of columnar data from its metadata.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        directory (str): Directory of the columnar data.
+
+    Returns:
+        dict | None: The manifest entry, None if the directory holds no valid data.
+    """
+    meta = columnarStore.read_meta(directory)
+    if meta is None:
+        return None
+
+    if "first" in meta:
+        first, last = meta["first"], meta["last"]
+    else:
+        # Data written without the bounds in its metadata: read them from the index
+        stamps = np.load(
+            columnarStore.column_path(directory, columnarStore.INDEX), mmap_mode="r"
+        )
+        first = int(stamps[0]) if len(stamps) else None
+        last = int(stamps[-1]) if len(stamps) else None
+
+    return dict(
+        symbol=symbol,
+        timeframe=timeframe,
+        directory=os.path.relpath(directory, root),
+        first=first,
+        last=last,
+        rows=meta["rows"],
+    )
+
+
+def lookup(root: str, symbol: str, timeframe: str) -> dict | None:
+    """
+    Look up a symbol in the manifest, without touching its data.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+
+    Returns:
+        dict | None: Symbol, timeframe, directory (relative to the root), first and
+        last timestamps (ns since epoch) and row count, None if not in the catalog.
+    """
+    return read_manifest(root).get(symbol, {}).get(timeframe)
+
+
+def register(root: str, symbol: str, timeframe: str) -> dict:
+    """
+    Add or update the manifest entry of a symbol from the metadata of its data.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+
+    Returns:
+        dict: The manifest entry.
+    """
+    entry = _entry(
+        root, symbol, timeframe, symbol_directory(root, symbol, timeframe)
+    )
+    if entry is None:
+        raise ValueError("No data for %s %s in %s" % (symbol, timeframe, root))
+
+    manifest = read_manifest(root)
+    if manifest.get(symbol, {}).get(timeframe) != entry:
+        # The manifest is rewritten only when the data changed
+        manifest.setdefault(symbol, {})[timeframe] = entry
+        write_manifest(root, manifest)
+
+    return entry
+
+
+def write(
+    root: str,
+    symbol: str,
+    timeframe: str,
+    stamps: np.ndarray,
+    columns: dict,
+    meta: dict | None = None,
+) -> dict:
+    """
+    Store the OHLCV data of a symbol in the catalog, replacing any previous data.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        stamps (np.ndarray): Sorted int64 timestamps (ns since epoch).
+        columns (dict): Column name -> float64 array.
+        meta (dict | None): Metadata stored next to the columns.
+
+    Returns:
+        dict: The manifest entry.
+    """
+    meta = dict(meta or {})
+    meta.update(symbol=symbol, timeframe=timeframe)
+    columnarStore.write_columns(
+        symbol_directory(root, symbol, timeframe), stamps, columns, meta
+    )
+
+    return register(root, symbol, timeframe)
+
+
+def import_csv(root: str, csv_path: str, symbol: str, timeframe: str) -> dict:
+    """
+    Import an OHLCV CSV file (Datetime, Open, High, Low, Close, Adj Close, Volume)
+    into the catalog. The file is parsed only if it changed since the last import.
+
+    Only data imported from the same file is replaced: candles downloaded or
+    written otherwise for the symbol (even if a download resumed from a previous
+    import) are never overwritten.
+
+    Args:
+        root (str): Root directory of the catalog.
+        csv_path (str): The path of the CSV file.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+
+    Returns:
+        dict: The manifest entry.
+
+    Raises:
+        ValueError: The catalog holds other data of the symbol and timeframe.
+    """
+    directory = symbol_directory(root, symbol, timeframe)
+    meta = columnarStore.read_meta(directory)
+    if meta is not None and not (
+        meta.get("source") == os.path.basename(csv_path) and "sha256" in meta
+    ):
+        raise ValueError(
+            "%s %s in %s does not come from %s"
+            % (symbol, timeframe, root, os.path.basename(csv_path))
+        )
+
+    columnarStore.ensure_csv_cache(csv_path, directory)
+
+    return register(root, symbol, timeframe)
+
+
+def load(
+    root: str,
+    symbol: str,
+    timeframe: str,
+    start: int | None = None,
+    end: int | None = None,
+) -> (np.ndarray, dict):
+    """
+    Load the OHLCV data of a symbol, or a time window of it.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        start (int | None): First timestamp included (ns), None for the first row.
+        end (int | None): First timestamp excluded (ns), None for the last row.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch).
+        dict: Column name -> float64 array.
+    """
+    entry = lookup(root, symbol, timeframe)
+    if entry is None:
+        raise KeyError("%s %s is not in the catalog %s" % (symbol, timeframe, root))
+
+    return columnarStore.read_columns(
+        os.path.join(root, entry["directory"]), start=start, end=end
+    )
+
+
+def rebuild(root: str) -> dict:
+    """
+    Rebuild the manifest by scanning the catalog directories, e.g. after the
+    manifest was lost. Directories without valid metadata are skipped.
+
+    Args:
+        root (str): Root directory of the catalog.
+
+    Returns:
+        dict: The new manifest.
+    """
+    manifest = {}
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if not os.path.isdir(path):
+            continue
+        for timeframe in sorted(os.listdir(path)):
+            directory = os.path.join(path, timeframe)
+            meta = columnarStore.read_meta(directory)
+            if meta is None:
+                continue
+            symbol = meta.get("symbol", name.replace("-", "/"))
+            manifest.setdefault(symbol, {})[timeframe] = _entry(
+                root, symbol, timeframe, directory
+            )
+
+    write_manifest(root, manifest)
+
+    return manifest
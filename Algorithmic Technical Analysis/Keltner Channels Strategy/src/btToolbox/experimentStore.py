@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from . import performanceAnalytics
+from .vectorizedKC import TRADE_DTYPE
+
+# SQLite database of the runs, next to the data
+STORE_PATH = os.path.join(
+    os.path.dirname(__file__), "../../datacsv/experiments.sqlite"
+)
+
+# Strategy parameters stored as columns of the runs, by data_args name
+PARAM_COLUMNS = {
+    "engine": "TEXT",
+    "timeframe": "TEXT",
+    "currencyTrade": "TEXT",
+    "startcash": "REAL",
+    "commission": "REAL",
+    "periodEMA": "INTEGER",
+    "periodATR": "INTEGER",
+    "riskAmountBuy": "REAL",
+    "riskAmountSell": "REAL",
+    "stopprice": "REAL",
+    "orderParamBuy": "REAL",
+    "orderParamSell": "REAL",
+}
+
+# Metrics stored as columns of the runs
+METRIC_COLUMNS = {
+    "value": "REAL",
+    "cash": "REAL",
+    "net_profit": "REAL",
+    "net_profit_perc": "REAL",
+    "yearly_return": "REAL",
+    "sharpe_ratio": "REAL",
+    "sqn": "REAL",
+    "max_moneydown": "REAL",
+    "max_drawdown": "REAL",
+    "closed": "INTEGER",
+    "open": "INTEGER",
+    "won": "INTEGER",
+    "lost": "INTEGER",
+}
+
+# Columns the queries filter and sort on
+INDEXES = (
+    ("created",),
+    ("fingerprint",),
+    ("sharpe_ratio",),
+    ("max_drawdown",),
+    ("net_profit",),
+    ("periodEMA", "periodATR"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    assets TEXT NOT NULL,
+    fromdate TEXT,
+    todate TEXT,
+    fingerprint TEXT NOT NULL,
+    %s,
+    %s,
+    data_args TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stamps (
+    hash TEXT PRIMARY KEY,
+    stamps BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS curves (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+    stamps_hash TEXT NOT NULL REFERENCES stamps(hash),
+    equity BLOB NOT NULL,
+    trades BLOB NOT NULL
+);
+""" % (
+    ",\n    ".join('"%s" %s' % item for item in PARAM_COLUMNS.items()),
+    ",\n    ".join('"%s" %s' % item for item in METRIC_COLUMNS.items()),
+)
+
+
+def connect(path: str = STORE_PATH) -> sqlite3.Connection:
+    """
+    Open the experiment store, creating its tables and indexes if missing.
+
+    Args:
+        path (str): Path of the SQLite database.
+
+    Returns:
+        sqlite3.Connection: The connection.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30.0)
+    # Readers do not block the writer of another process, e.g. a sweep
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA foreign_keys=ON")
+    connection.executescript(SCHEMA)
+    for columns in INDEXES:
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS "runs_%s" ON runs (%s)'
+            % ("_".join(columns), ", ".join('"%s"' % name for name in columns))
+        )
+
+    return connection
+
+
+def data_fingerprint(data_analisys_list: list) -> str:
+    """
+    Hash the content of the data of a run, to tell runs on different data apart.
+
+    Args:
+        data_analisys_list (list): OHLCV data of each asset, in DataFrame format.
+
+    Returns:
+        str: Hexadecimal SHA-256 of the timestamps and the values.
+    """
+    digest = hashlib.sha256()
+    for data_analisys in data_analisys_list:
+        digest.update(
+            np.ascontiguousarray(
+                data_analisys.index.values.astype("datetime64[ns]").view(np.int64)
+            ).data
+        )
+        for name in data_analisys.columns:
+            digest.update(name.encode())
+            digest.update(
+                np.ascontiguousarray(data_analisys[name].to_numpy(np.float64)).data
+            )
+
+    return digest.hexdigest()
+
+
+def retrives_run(
+    data_args: dict,
+    fingerprint: str,
+    stamps: np.ndarray,
+    equity: np.ndarray,
+    trades: np.ndarray,
+    cash: float,
+) -> dict:
+    """
+    Build the record of a run from its equity curve and trades.
+
+    Args:
+        data_args (dict): Data arguments of the run.
+        fingerprint (str): Fingerprint of its data, see data_fingerprint.
+        stamps (np.ndarray): int64 timestamps (ns) of the bars.
+        equity (np.ndarray): Portfolio value at the end of each bar.
+        trades (np.ndarray): Trades, of TRADE_DTYPE.
+        cash (float): Cash at the end of the run.
+
+    Returns:
+        dict: The run, as save expects it.
+    """
+    metrics = performanceAnalytics.analyze(
+        equity, stamps, trades, data_args["startcash"], breakdown=False
+    )
+    closed = trades[trades["exit_bar"] >= 0]
+    value = float(equity[-1]) if len(equity) else data_args["startcash"]
+
+    return dict(
+        data_args=data_args,
+        fingerprint=fingerprint,
+        stamps=np.asarray(stamps, dtype=np.int64),
+        equity=np.asarray(equity, dtype=np.float64),
+        trades=np.asarray(trades, dtype=TRADE_DTYPE),
+        metrics=dict(
+            value=value,
+            cash=cash,
+            # Net profit as in the report: realized, from the cash
+            net_profit=cash - data_args["startcash"],
+            net_profit_perc=(value - data_args["startcash"])
+            * 100
+            / data_args["startcash"],
+            yearly_return=float(np.mean(metrics["annual_returns"]))
+            if len(metrics["annual_returns"])
+            else None,
+            sharpe_ratio=metrics["sharpe_ratio"],
+            sqn=metrics["sqn"],
+            max_moneydown=metrics["max_moneydown"],
+            max_drawdown=metrics["max_drawdown"],
+            closed=metrics["closed"],
+            open=metrics["open"],
+            # Won as in the TradeAnalyzer: not negative
+            won=int(np.sum(closed["pnlcomm"] >= 0)),
+            lost=int(np.sum(closed["pnlcomm"] < 0)),
+        ),
+    )
+
+
+def save(runs: list, path: str = STORE_PATH) -> list:
+    """
+    Store runs, in a single transaction.
+
+    Args:
+        runs (list): Runs built by retrives_run.
+        path (str): Path of the SQLite database.
+
+    Returns:
+        list: Ids of the runs.
+    """
+    columns = (
+        ["created", "assets", "fromdate", "todate", "fingerprint"]
+        + list(PARAM_COLUMNS)
+        + list(METRIC_COLUMNS)
+        + ["data_args"]
+    )
+    insert = "INSERT INTO runs (%s) VALUES (%s)" % (
+        ", ".join('"%s"' % name for name in columns),
+        ", ".join("?" * len(columns)),
+    )
+    created = datetime.now().isoformat(timespec="seconds")
+
+    ids = []
+    connection = connect(path)
+    try:
+        with connection:
+            for run in runs:
+                data_args = run["data_args"]
+                values = (
+                    [
+                        created,
+                        ",".join(data_args["nameasset"]),
+                        str(data_args["fromdate"]),
+                        str(data_args["todate"]),
+                        run["fingerprint"],
+                    ]
+                    + [data_args.get(name) for name in PARAM_COLUMNS]
+                    + [run["metrics"][name] for name in METRIC_COLUMNS]
+                    # Every argument, also those without a column
+                    + [json.dumps(data_args, default=str)]
+                )
+                run_id = connection.execute(insert, values).lastrowid
+
+                # The bars are shared by the runs on the same data, stored once
+                stamps = run["stamps"].tobytes()
+                stamps_hash = hashlib.sha256(stamps).hexdigest()
+                connection.execute(
+                    "INSERT OR IGNORE INTO stamps VALUES (?, ?)", (stamps_hash, stamps)
+                )
+                connection.execute(
+                    "INSERT INTO curves VALUES (?, ?, ?, ?)",
+                    (
+                        run_id,
+                        stamps_hash,
+                        run["equity"].tobytes(),
+                        run["trades"].tobytes(),
+                    ),
+                )
+                ids.append(run_id)
+    finally:
+        connection.close()
+
+    return ids
+
+
+def query(
+    where: str | None = None,
+    args: tuple = (),
+    order_by: str = "sharpe_ratio DESC",
+    limit: int | None = 20,
+    last: int | None = None,
+    path: str = STORE_PATH,
+) -> pd.DataFrame:
+    """
+    Find runs by parameters and metrics, without their curves.
+
+    E.g. the best Sharpe ratio with a drawdown under 10% among the last 1000 runs:
+    query("max_drawdown < ?", (10,), "sharpe_ratio DESC", 1, 1000).
+
+    Args:
+        where (str | None): SQL condition on the columns of the runs.
+        args (tuple): Values of the placeholders of where.
+        order_by (str): SQL order of the runs.
+        limit (int | None): Number of runs returned, None for all.
+        last (int | None): Only search the last runs stored, None for all.
+        path (str): Path of the SQLite database.
+
+    Returns:
+        pd.DataFrame: The runs, indexed by id.
+    """
+    source = "runs"
+    if last is not None:
+        # The newest runs first, through the primary key
+        source = "(SELECT * FROM runs ORDER BY id DESC LIMIT %d)" % last
+    sql = "SELECT * FROM %s" % source
+    if where:
+        sql += " WHERE " + where
+    sql += " ORDER BY " + order_by
+    if limit is not None:
+        sql += " LIMIT %d" % limit
+
+    connection = connect(path)
+    try:
+        df = pd.read_sql_query(sql, connection, params=args, index_col="id")
+    finally:
+        connection.close()
+
+    return df
+
+
+def load(run_id: int, path: str = STORE_PATH) -> dict | None:
+    """
+    Load a run with its curves.
+
+    Args:
+        run_id (int): Id of the run.
+        path (str): Path of the SQLite database.
+
+    Returns:
+        dict | None: Columns of the run, data_args decoded, with stamps, equity and
+        trades arrays; None if there is no such run.
+    """
+    connection = connect(path)
+    try:
+        connection.row_factory = sqlite3.Row
+        row = connection.execute(
+            "SELECT * FROM runs JOIN curves ON curves.run_id = runs.id"
+            " JOIN stamps ON stamps.hash = curves.stamps_hash WHERE id = ?",
+            (run_id,),
+        ).fetchone()
+    finally:
+        connection.close()
+
+    if row is None:
+        return None
+
+    run = dict(row)
+    run["data_args"] = json.loads(run["data_args"])
+    run["stamps"] = np.frombuffer(run["stamps"], dtype=np.int64)
+    run["equity"] = np.frombuffer(run["equity"], dtype=np.float64)
+    run["trades"] = np.frombuffer(run["trades"], dtype=TRADE_DTYPE)
+
+    return run
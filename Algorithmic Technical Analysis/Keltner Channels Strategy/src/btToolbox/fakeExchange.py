@@ -0,0 +1,524 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import random
+import threading
+import time
+from datetime import datetime
+
+import ccxt
+import numpy as np
+
+from . import columnarStore
+from . import ohlcvDownloader
+
+# Exchange id of the simulator, as passed with --exchangeId
+EXCHANGE_ID = "fake"
+
+
+class FakeExchange:
+    """
+    Local exchange with the subset of the ccxt interface used by CCXTStore,
+    CCXTBroker and the live data feeds.
+
+    Functionality:
+    - Replays the columnar data of each symbol on a simulated clock, starting at
+    'start' and running 'speed' times faster than real time: fetch_ohlcv returns
+    only the candles closed at the simulated now.
+    - Accepts the order types of retrive_broker_mapping: 'MARKET' fills at the
+    last close, 'LIMIT' fills at once if marketable, otherwise on the first
+    later candle reaching its price, 'STOP_LOSS_LIMIT' becomes a limit order once
+    a candle reaches params['stopPrice']. Funds are reserved while an order is
+    open and a taker fee is charged in the quote currency.
+    - Every call waits 'latency' seconds (plus a uniform 'jitter'), as a request
+    to a remote exchange would.
+
+    """
+
+    def __init__(self, config: dict | None = None) -> None:
+        """
+        Initialize the exchange, with the same config dictionary as the ccxt ones.
+
+        Args:
+            config (dict | None): Besides the ccxt keys (ignored), 'directories'
+                (dict, symbol -> directory of its columnar data), 'timeframe'
+                (str, of the data), 'start' (int, ms since epoch of the simulated
+                now at creation, default the first candle), 'speed' (float),
+                'latency' and 'jitter' (float, seconds), 'balance' (dict,
+                currency -> starting amount), 'fee' (float, rate) and 'seed'
+                (int, of the jitter).
+        """
+        config = dict(config or {})
+        self.id = EXCHANGE_ID
+        self.timeframe = config.get("timeframe", "1h")
+        self.step = ohlcvDownloader.timeframe_to_ms(self.timeframe)
+        self.speed = config.get("speed", 1.0)
+        self.latency = config.get("latency", 0.0)
+        self.jitter = config.get("jitter", 0.0)
+        self.fee = config.get("fee", 0.001)
+        self.random = random.Random(config.get("seed"))
+        # Requests per second are not limited: the latency already spaces them
+        self.rateLimit = 0
+
+        # Symbol -> (open times in ms, Open, High, Low, Close, Volume)
+        self.candles = {}
+        for symbol, directory in config.get("directories", {}).items():
+            stamps, columns = columnarStore.read_columns(directory)
+            self.candles[symbol] = (stamps // 1000000,) + tuple(
+                columns[name] for name in ("Open", "High", "Low", "Close", "Volume")
+            )
+
+        start = config.get("start")
+        if start is None:
+            start = min(
+                (
+                    int(candles[0][0])
+                    for candles in self.candles.values()
+                    if len(candles[0])
+                ),
+                default=0,
+            )
+        self.start = start
+        self.started = time.monotonic()
+
+        # Currency -> total amount, and open orders -> reserved currency and amount
+        self.balance = dict(config.get("balance", {}))
+        self.orders = {}
+        self.reserved = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+
+    # Clock and network
+
+    def milliseconds(self) -> int:
+        """
+        Get the simulated now.
+
+        Returns:
+            int: Milliseconds since epoch.
+        """
+        return self.start + int((time.monotonic() - self.started) * 1000 * self.speed)
+
+    def iso8601(self, timestamp: int) -> str:
+        """
+        Format a timestamp as ccxt does.
+
+        Args:
+            timestamp (int): Milliseconds since epoch.
+
+        Returns:
+            str: ISO 8601 date in UTC.
+        """
+        return datetime.utcfromtimestamp(timestamp / 1000).isoformat()[:23] + "Z"
+
+    def delay(self) -> float:
+        """
+        Draw the latency of a request.
+
+        Returns:
+            float: Seconds.
+        """
+        return self.latency + self.random.uniform(0.0, self.jitter)
+
+    def set_sandbox_mode(self, enabled: bool) -> None:
+        """
+        Accept the sandbox mode set by CCXTStore: the simulator is always one.
+        """
+
+    # Market data
+
+    def fetch_ohlcv(
+        self,
+        symbol: str,
+        timeframe: str = "1m",
+        since: int | None = None,
+        limit: int | None = None,
+        params: dict | None = None,
+    ) -> list:
+        """
+        Fetch the closed candles of a symbol.
+
+        Args:
+            symbol (str): Symbol such as 'BTC/USDT'.
+            timeframe (str): Timeframe, that of the replayed data.
+            since (int | None): Open time (ms) of the first candle, default the
+                last limit candles.
+            limit (int | None): Maximum number of candles.
+            params (dict | None): Ignored.
+
+        Returns:
+            list: Candles [timestamp (ms), open, high, low, close, volume].
+        """
+        time.sleep(self.delay())
+
+        return self._ohlcv(symbol, timeframe, since, limit)
+
+    def _ohlcv(
+        self, symbol: str, timeframe: str, since: int | None, limit: int | None
+    ) -> list:
+        """Candles of fetch_ohlcv, without the latency."""
+        if timeframe != self.timeframe:
+            raise ccxt.BadRequest(
+                "%s replays %s candles, not %s" % (self.id, self.timeframe, timeframe)
+            )
+        stamps, open_, high, low, close, volume = self._symbol(symbol)
+
+        # Closed candles only
+        hi = int(np.searchsorted(stamps, self.milliseconds() - self.step, side="right"))
+        if since is None:
+            lo = max(0, hi - (limit or 500))
+        else:
+            lo = min(hi, int(np.searchsorted(stamps, since, side="left")))
+        if limit is not None:
+            hi = min(hi, lo + limit)
+
+        return [
+            list(candle)
+            for candle in zip(
+                stamps[lo:hi].tolist(),
+                open_[lo:hi].tolist(),
+                high[lo:hi].tolist(),
+                low[lo:hi].tolist(),
+                close[lo:hi].tolist(),
+                volume[lo:hi].tolist(),
+            )
+        ]
+
+    def _symbol(self, symbol: str) -> tuple:
+        """Replayed candles of a symbol."""
+        if symbol not in self.candles:
+            raise ccxt.BadSymbol("%s has no data of %s" % (self.id, symbol))
+
+        return self.candles[symbol]
+
+    # Orders and balance
+
+    def fetch_balance(self, params: dict | None = None) -> dict:
+        """
+        Fetch the balance, in the ccxt structure.
+
+        Args:
+            params (dict | None): Ignored.
+
+        Returns:
+            dict: 'free', 'used' and 'total' (currency -> amount), and currency ->
+            {'free', 'used', 'total'}.
+        """
+        time.sleep(self.delay())
+
+        with self.lock:
+            self._match()
+            used = {currency: 0.0 for currency in self.balance}
+            for currency, amount in self.reserved.values():
+                used[currency] = used.get(currency, 0.0) + amount
+
+            balance = dict(free={}, used={}, total={})
+            for currency in used:
+                total = self.balance.get(currency, 0.0)
+                balance["free"][currency] = total - used[currency]
+                balance["used"][currency] = used[currency]
+                balance["total"][currency] = total
+                balance[currency] = dict(
+                    free=total - used[currency], used=used[currency], total=total
+                )
+
+        return balance
+
+    def create_order(
+        self,
+        symbol: str,
+        type: str,
+        side: str,
+        amount: float,
+        price: float | None = None,
+        params: dict | None = None,
+    ) -> dict:
+        """
+        Place an order.
+
+        Args:
+            symbol (str): Symbol such as 'BTC/USDT'.
+            type (str): 'MARKET', 'LIMIT' or 'STOP_LOSS_LIMIT' (case insensitive).
+            side (str): 'buy' or 'sell'.
+            amount (float): Amount of the base currency.
+            price (float | None): Limit price, ignored for market orders.
+            params (dict | None): 'stopPrice' for the stop orders.
+
+        Returns:
+            dict: The order, in the ccxt structure.
+        """
+        time.sleep(self.delay())
+        params = params or {}
+        type = type.lower()
+        if type not in ("market", "limit", "stop_loss_limit"):
+            raise ccxt.InvalidOrder("%s does not accept %s orders" % (self.id, type))
+        if type == "stop_loss_limit" and "stopPrice" not in params:
+            raise ccxt.InvalidOrder("%s: stop orders need a stopPrice" % self.id)
+        if amount <= 0:
+            raise ccxt.InvalidOrder("%s: the amount must be positive" % self.id)
+
+        with self.lock:
+            self._match()
+            stamps, open_, high, low, close, volume = self._symbol(symbol)
+            now = self.milliseconds()
+            last = int(np.searchsorted(stamps, now - self.step, side="right")) - 1
+            if last < 0:
+                raise ccxt.ExchangeNotAvailable(
+                    "%s: no market for %s yet" % (self.id, symbol)
+                )
+            last_price = float(close[last])
+
+            base, quote = symbol.split("/")
+            if side == "buy":
+                reserved = (quote, amount * (last_price if type == "market" else price))
+            else:
+                reserved = (base, amount)
+            free = self.balance.get(reserved[0], 0.0) - sum(
+                value
+                for currency, value in self.reserved.values()
+                if currency == reserved[0]
+            )
+            if reserved[1] > free:
+                raise ccxt.InsufficientFunds(
+                    "%s: %f %s available, %f needed"
+                    % (self.id, free, reserved[0], reserved[1])
+                )
+
+            order_id = str(next(self.ids))
+            order = dict(
+                id=order_id,
+                clientOrderId=None,
+                timestamp=now,
+                datetime=self.iso8601(now),
+                lastTradeTimestamp=None,
+                symbol=symbol,
+                type=type,
+                side=side,
+                price=price if type != "market" else last_price,
+                stopPrice=params.get("stopPrice"),
+                amount=amount,
+                cost=0.0,
+                average=None,
+                filled=0.0,
+                remaining=amount,
+                status="open",
+                fee=None,
+                trades=[],
+                # Next candle to check against the order
+                next_candle=last + 1,
+                triggered=type != "stop_loss_limit",
+            )
+            self.orders[order_id] = order
+            self.reserved[order_id] = reserved
+
+            # Taker fill if marketable now
+            if type == "market" or (
+                type == "limit"
+                and (price >= last_price if side == "buy" else price <= last_price)
+            ):
+                self._fill(order, last_price, now)
+
+            return self._public(order)
+
+    def cancel_order(
+        self, id: str, symbol: str | None = None, params: dict | None = None
+    ) -> dict:
+        """
+        Cancel an open order.
+
+        Args:
+            id (str): Id of the order.
+            symbol (str | None): Symbol of the order.
+            params (dict | None): Ignored.
+
+        Returns:
+            dict: The order, in the ccxt structure.
+        """
+        time.sleep(self.delay())
+
+        with self.lock:
+            self._match()
+            order = self._order(id)
+            if order["status"] != "open":
+                raise ccxt.OrderNotFound(
+                    "%s: order %s is %s" % (self.id, id, order["status"])
+                )
+            order["status"] = "canceled"
+            del self.reserved[id]
+
+            return self._public(order)
+
+    def fetch_order(
+        self, id: str, symbol: str | None = None, params: dict | None = None
+    ) -> dict:
+        """
+        Fetch an order, filled in the meantime if its price was reached.
+
+        Args:
+            id (str): Id of the order.
+            symbol (str | None): Symbol of the order.
+            params (dict | None): Ignored.
+
+        Returns:
+            dict: The order, in the ccxt structure.
+        """
+        time.sleep(self.delay())
+
+        with self.lock:
+            self._match()
+
+            return self._public(self._order(id))
+
+    def fetch_open_orders(
+        self,
+        symbol: str | None = None,
+        since: int | None = None,
+        limit: int | None = None,
+        params: dict | None = None,
+    ) -> list:
+        """
+        Fetch the open orders.
+
+        Args:
+            symbol (str | None): Symbol of the orders, default all.
+            since (int | None): Ignored.
+            limit (int | None): Ignored.
+            params (dict | None): Ignored.
+
+        Returns:
+            list: The orders, in the ccxt structure.
+        """
+        time.sleep(self.delay())
+
+        with self.lock:
+            self._match()
+
+            return [
+                self._public(order)
+                for order in self.orders.values()
+                if order["status"] == "open" and symbol in (None, order["symbol"])
+            ]
+
+    def _order(self, id: str) -> dict:
+        """Internal order from its id."""
+        if id not in self.orders:
+            raise ccxt.OrderNotFound("%s: order %s not found" % (self.id, id))
+
+        return self.orders[id]
+
+    def _public(self, order: dict) -> dict:
+        """Copy of an order without the internal fields."""
+        order = dict(order)
+        del order["next_candle"], order["triggered"]
+        order["trades"] = list(order["trades"])
+
+        return order
+
+    def _fill(self, order: dict, price: float, timestamp: int) -> None:
+        """Fill a whole order, moving the funds and charging the fee."""
+        base, quote = order["symbol"].split("/")
+        cost = order["amount"] * price
+        fee = cost * self.fee
+        if order["side"] == "buy":
+            self.balance[quote] = self.balance.get(quote, 0.0) - cost - fee
+            self.balance[base] = self.balance.get(base, 0.0) + order["amount"]
+        else:
+            self.balance[base] = self.balance.get(base, 0.0) - order["amount"]
+            self.balance[quote] = self.balance.get(quote, 0.0) + cost - fee
+        del self.reserved[order["id"]]
+
+        order.update(
+            status="closed",
+            filled=order["amount"],
+            remaining=0.0,
+            cost=cost,
+            average=price,
+            lastTradeTimestamp=timestamp,
+            fee=dict(currency=quote, cost=fee, rate=self.fee),
+        )
+
+    def _match(self) -> None:
+        """Check the open orders against the candles closed since their last check."""
+        now = self.milliseconds()
+        for order in self.orders.values():
+            if order["status"] != "open":
+                continue
+            stamps, open_, high, low, close, volume = self.candles[order["symbol"]]
+            end = int(np.searchsorted(stamps, now - self.step, side="right"))
+
+            buy = order["side"] == "buy"
+            for i in range(order["next_candle"], end):
+                if not order["triggered"]:
+                    stop = order["stopPrice"]
+                    if (high[i] < stop) if buy else (low[i] > stop):
+                        continue
+                    order["triggered"] = True
+
+                price = order["price"]
+                if (low[i] <= price) if buy else (high[i] >= price):
+                    # A gap through the limit fills at the better open
+                    fill = min(price, open_[i]) if buy else max(price, open_[i])
+                    self._fill(order, float(fill), int(stamps[i]) + self.step)
+                    break
+            order["next_candle"] = max(order["next_candle"], end)
+
+    # Aliases of the ccxt camelCase names
+
+    fetchOHLCV = fetch_ohlcv
+    fetchBalance = fetch_balance
+    createOrder = create_order
+    cancelOrder = cancel_order
+    fetchOrder = fetch_order
+    fetchOpenOrders = fetch_open_orders
+
+
+class AsyncFakeExchange:
+    """
+    ccxt.async_support view of a FakeExchange, for AsyncMarketData.
+
+    Functionality:
+    - Shares the clock and the data of the wrapped exchange, the latency being
+    awaited instead of slept.
+
+    """
+
+    def __init__(self, exchange: FakeExchange) -> None:
+        """
+        Initialize the view.
+
+        Args:
+            exchange (FakeExchange): The wrapped exchange.
+        """
+        self.exchange = exchange
+        self.id = exchange.id
+        self.rateLimit = exchange.rateLimit
+
+    def milliseconds(self) -> int:
+        """
+        Get the simulated now.
+
+        Returns:
+            int: Milliseconds since epoch.
+        """
+        return self.exchange.milliseconds()
+
+    async def fetch_ohlcv(
+        self,
+        symbol: str,
+        timeframe: str = "1m",
+        since: int | None = None,
+        limit: int | None = None,
+        params: dict | None = None,
+    ) -> list:
+        """
+        Fetch the closed candles of a symbol, see FakeExchange.fetch_ohlcv.
+        """
+        await asyncio.sleep(self.exchange.delay())
+
+        return self.exchange._ohlcv(symbol, timeframe, since, limit)
+
+    async def close(self) -> None:
+        """
+        Close the connections: the simulator has none.
+        """
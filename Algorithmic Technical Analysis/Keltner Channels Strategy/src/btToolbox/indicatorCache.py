@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from . import vectorizedKC
+
+# On-disk tier of the cache, next to the columnar cache of the CSV files
+CACHE_DIRECTORY = os.path.join(
+    os.path.dirname(__file__), "../../datacsv/.cache/indicators"
+)
+
+# Number of series kept in memory and on disk, least recently used evicted first
+MAX_MEMORY_ENTRIES = 64
+MAX_DISK_ENTRIES = 1024
+
+# In-memory tier: key -> series, in order of use
+_memory = OrderedDict()
+
+
+def dataset_hash(*arrays: np.ndarray) -> str:
+    """
+    Hash the content of the input series of the indicators.
+
+    Args:
+        *arrays (np.ndarray): Input series (e.g. high, low, close).
+
+    Returns:
+        str: Hexadecimal SHA-256 of the float64 values.
+    """
+    digest = hashlib.sha256()
+    for values in arrays:
+        digest.update(np.ascontiguousarray(values, dtype=np.float64).data)
+
+    return digest.hexdigest()
+
+
+def cache_key(data_hash: str, indicator: str, *periods: int) -> str:
+    """
+    Build the key of an indicator series.
+
+    Args:
+        data_hash (str): Hash of the input series, see dataset_hash.
+        indicator (str): Name of the indicator, e.g. 'ema'.
+        *periods (int): Periods of the indicator.
+
+    Returns:
+        str: The key, also used as file name of the on-disk tier.
+    """
+    return "-".join([data_hash, indicator] + [str(period) for period in periods])
+
+
+def get(key: str, directory: str = CACHE_DIRECTORY) -> np.ndarray | None:
+    """
+    Look up a series, in memory first and then on disk.
+
+    Args:
+        key (str): Key of the series, see cache_key.
+        directory (str): Directory of the on-disk tier.
+
+    Returns:
+        np.ndarray | None: The series (read-only), None if not cached.
+    """
+    if key in _memory:
+        _memory.move_to_end(key)
+        return _memory[key]
+
+    path = os.path.join(directory, key + ".npy")
+    try:
+        values = np.load(path)
+    except (OSError, ValueError):
+        return None
+
+    # Recently used: the disk tier evicts by modification time
+    os.utime(path)
+    _remember(key, values)
+
+    return values
+
+
+def put(key: str, values: np.ndarray, directory: str = CACHE_DIRECTORY) -> None:
+    """
+    Store a series in memory and on disk.
+
+    Args:
+        key (str): Key of the series, see cache_key.
+        values (np.ndarray): The series.
+        directory (str): Directory of the on-disk tier.
+
+    Returns:
+        None
+    """
+    values = np.array(values, dtype=np.float64)
+    _remember(key, values)
+
+    os.makedirs(directory, exist_ok=True)
+    # Written aside then renamed: a concurrent reader never sees a partial file
+    path = os.path.join(directory, key + ".npy")
+    tmp_path = "%s.%d.tmp.npy" % (path[:-4], os.getpid())
+    np.save(tmp_path, values)
+    os.replace(tmp_path, path)
+
+    _evict_disk(directory)
+
+
+def _remember(key: str, values: np.ndarray) -> None:
+    """Keep a series in memory, evicting the least recently used ones."""
+    values.flags.writeable = False
+    _memory[key] = values
+    _memory.move_to_end(key)
+    while len(_memory) > MAX_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def _evict_disk(directory: str) -> None:
+    """Remove the least recently used files beyond MAX_DISK_ENTRIES."""
+    with os.scandir(directory) as entries:
+        files = [entry for entry in entries if entry.name.endswith(".npy")]
+    if len(files) <= MAX_DISK_ENTRIES:
+        return
+
+    files.sort(key=lambda entry: entry.stat().st_mtime_ns)
+    for entry in files[: len(files) - MAX_DISK_ENTRIES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            # Already removed by another process
+            pass
+
+
+def get_or_compute(key: str, compute, directory: str = CACHE_DIRECTORY) -> np.ndarray:
+    """
+    Look up a series, computing and storing it if not cached.
+
+    Args:
+        key (str): Key of the series, see cache_key.
+        compute: Function without arguments returning the series.
+        directory (str): Directory of the on-disk tier.
+
+    Returns:
+        np.ndarray: The series.
+    """
+    values = get(key, directory)
+    if values is None:
+        values = compute()
+        put(key, values, directory)
+        values = _memory[key]
+
+    return values
+
+
+def keltner_bands(
+    data_hash: str,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period_EMA: int,
+    period_ATR: int,
+    directory: str = CACHE_DIRECTORY,
+) -> (np.ndarray, np.ndarray):
+    """
+    Keltner Channels bands from the cached EMA and ATR series.
+
+    The EMA and the ATR are cached separately, so a sweep over both periods
+    computes each series once. The values are bit-identical to those of
+    indicatorKC.IndicatorKeltnerChannels.
+
+    Args:
+        data_hash (str): Hash of high, low and close, see dataset_hash.
+        high (np.ndarray): High prices.
+        low (np.ndarray): Low prices.
+        close (np.ndarray): Close prices.
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+        directory (str): Directory of the on-disk tier.
+
+    Returns:
+        np.ndarray: Lower band (atrlow).
+        np.ndarray: Upper band (atrhigh).
+    """
+    mid = get_or_compute(
+        cache_key(data_hash, "ema", period_EMA),
+        lambda: vectorizedKC.ema(close, period_EMA),
+        directory,
+    )
+    atr = get_or_compute(
+        cache_key(data_hash, "atr", period_ATR),
+        lambda: vectorizedKC.atr(high, low, close, period_ATR),
+        directory,
+    )
+    atr_x_2 = atr * 2
+
+    return mid - atr_x_2, mid + atr_x_2
@@ -1,8 +1,12 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import time
+
 import backtrader as bt
 import backtrader.indicators as btind
 
+from . import streamingKC
+
 
 class IndicatorKeltnerChannels(bt.Indicator):
     """
@@ -45,6 +49,17 @@ class IndicatorKeltnerChannels(bt.Indicator):
         Calculates Keltner Channels based on Exponential Moving Average (EMA) and Average True Range (ATR).
         """
 
+        if getattr(self.data.p, "bands", None) == (
+            self.p.period_EMA,
+            self.p.period_ATR,
+        ):
+            # Bands precomputed on the data feed (see indicatorCache): same values
+            #   and same minimum period as computed below
+            self.l.atrlow = self.data.atrlow
+            self.l.atrhigh = self.data.atrhigh
+            self.addminperiod(max(self.p.period_EMA, self.p.period_ATR + 1))
+            return
+
         # Calculate Exponential Moving Average (EMA) of the input data
         ema = btind.EMA(self.data, period=self.p.period_EMA)
 
@@ -54,3 +69,91 @@ class IndicatorKeltnerChannels(bt.Indicator):
         # Calculate Keltner Channels: lower and upper bands
         self.l.atrlow = ema - atr_x_2
         self.l.atrhigh = ema + atr_x_2
+
+
+class StreamingKeltnerChannels(bt.Indicator):
+    """
+    Keltner Channels updated in constant time per bar, for live trading.
+
+    Functionality:
+    - Same 'atrlow' and 'atrhigh' lines as IndicatorKeltnerChannels, computed
+    bar by bar by streamingKC. The state of the EMA and the ATR is saved to
+    state_path, so that a restarted process resumes with warm bands instead of
+    recomputing them over a history download. Bars already in the saved state
+    are skipped. A state newer than the first bar (e.g. saved by a simulator run
+    from a later date) is discarded: its bands would come from the future.
+
+    """
+
+    # Define lines for the indicator
+    lines = (
+        "atrlow",
+        "atrhigh",
+    )
+
+    # Define plot information
+    plotinfo = dict(subplot=False, plotname="Keltner Channel")
+
+    # Define plot lines with colors
+    plotlines = dict(
+        atrlow=dict(color="cyan"),
+        atrhigh=dict(color="cyan"),
+    )
+
+    # Define parameters for the indicator
+    params = dict(
+        period_EMA=20,  # Period for Exponential Moving Average
+        period_ATR=14,  # Period for Average True Range
+        state_path=None,  # File of the saved state, None to keep it in memory
+        save_interval=1.0,  # Minimum seconds between two saves of the state
+    )
+
+    def __init__(self) -> None:
+        """
+        Initialization method for the indicator.
+
+        Loads the saved state, if any, for the same periods.
+        """
+        if self.p.state_path is None:
+            self.state = streamingKC.new_state(self.p.period_EMA, self.p.period_ATR)
+        else:
+            self.state = streamingKC.load_state(
+                self.p.state_path, self.p.period_EMA, self.p.period_ATR
+            )
+        self.last_save = None
+        self.first_bar = True
+
+    def next(self) -> None:
+        """
+        Update the bands with the current bar.
+        """
+        stamp = streamingKC.datetime_to_ns(self.data.datetime.datetime(0))
+        if self.first_bar:
+            self.first_bar = False
+            last_stamp = self.state["last_stamp"]
+            if last_stamp is not None and last_stamp > stamp:
+                # Not a continuation of the saved bars: start again from this one
+                self.state = streamingKC.new_state(self.p.period_EMA, self.p.period_ATR)
+
+        bands = streamingKC.update(
+            self.state,
+            self.data.high[0],
+            self.data.low[0],
+            self.data.close[0],
+            stamp,
+        )
+        if bands is not None:
+            self.l.atrlow[0], self.l.atrhigh[0] = bands
+
+        # Saving at most every save_interval seconds while replaying history
+        now = time.monotonic()
+        if self.last_save is None or now - self.last_save >= self.p.save_interval:
+            self.save_state()
+            self.last_save = now
+
+    def save_state(self) -> None:
+        """
+        Save the state to state_path, if any.
+        """
+        if self.p.state_path is not None:
+            streamingKC.save_state(self.state, self.p.state_path)
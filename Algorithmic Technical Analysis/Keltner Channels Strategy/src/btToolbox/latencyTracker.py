@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import json
+import math
+import time
+
+import backtrader as bt
+
+from . import streamingKC
+
+# Sub-buckets per power of two of the histograms: about 19% resolution
+SUB_BUCKETS = 4
+
+# Milliseconds per unit of the backtrader timeframes of the live data
+TIMEFRAME_MS = {
+    bt.TimeFrame.Minutes: 60 * 1000,
+    bt.TimeFrame.Days: 24 * 60 * 60 * 1000,
+}
+
+# Intervals measured for each symbol, in order along the path of a candle
+INTERVALS = (
+    "close_to_arrival",  # Candle closed (exchange clock) -> data feed loaded it
+    "arrival_to_next",  # Loaded -> strategy next() entered
+    "next",  # next() entered -> next() returned
+    "arrival_to_submit",  # Loaded -> order submitted to the broker
+    "submit_to_accept",  # Submitted -> broker accepted the order
+    "submit_to_complete",  # Submitted -> broker completed the order
+)
+
+
+class Histogram:
+    """
+    Histogram of durations on logarithmic buckets.
+
+    Functionality:
+    - add is O(1) and the memory is fixed, whatever the number of samples. The
+    percentiles are exact to the bucket width (about 19%), the maximum is exact.
+
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty histogram.
+        """
+        self.buckets = [0] * (SUB_BUCKETS * 48 + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, ms: float) -> None:
+        """
+        Add a duration.
+
+        Args:
+            ms (float): Duration in milliseconds.
+
+        Returns:
+            None
+        """
+        us = ms * 1000.0
+        if us < 1.0:
+            index = 0
+        else:
+            index = min(len(self.buckets) - 1, int(math.log2(us) * SUB_BUCKETS) + 1)
+        self.buckets[index] += 1
+        self.count += 1
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        """
+        Get a percentile.
+
+        Args:
+            q (float): Percentile, between 0 and 100.
+
+        Returns:
+            float: Upper bound (ms) of the bucket of the percentile, at most the
+            maximum; 0 if the histogram is empty.
+        """
+        rank = math.ceil(self.count * q / 100.0)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(self.max, 2.0 ** (index / SUB_BUCKETS) / 1000.0)
+
+        return 0.0
+
+    def summary(self) -> dict:
+        """
+        Summarize the histogram.
+
+        Returns:
+            dict: count, p50, p99 and max (ms).
+        """
+        return dict(
+            count=self.count,
+            p50=self.percentile(50),
+            p99=self.percentile(99),
+            max=self.max,
+        )
+
+
+class LatencyTracker:
+    """
+    Latency of the live loop, from a candle closing to its orders being accepted.
+
+    Functionality:
+    - The data feeds stamp each live candle on arrival (see arrived), the strategy
+    marks the entry and the exit of next() and the orders it submits, and the
+    order notifications mark their acceptance and completion. The intervals of
+    INTERVALS are aggregated into a Histogram per symbol.
+    - The strategy holds None instead of a tracker when the measure is disabled,
+    so the hot path then costs a single comparison.
+
+    """
+
+    def __init__(self, speed: float = 1.0) -> None:
+        """
+        Initialize the tracker, without samples.
+
+        Args:
+            speed (float): Milliseconds of the exchange clock per real millisecond,
+                above 1 for a simulated exchange running faster than real time.
+        """
+        self.speed = speed
+        # Symbol -> interval -> Histogram
+        self.histograms = {}
+        # Name of the data feed -> [perf_counter of its last candle, seen by next()]
+        self.arrivals = {}
+        # Order ref -> (symbol, perf_counter of the submit)
+        self.submits = {}
+        self.next_entry = None
+
+    def histogram(self, symbol: str, interval: str) -> Histogram:
+        """
+        Get the histogram of an interval of a symbol, created on first use.
+
+        Args:
+            symbol (str): Name of the data feed.
+            interval (str): One of INTERVALS.
+
+        Returns:
+            Histogram: The histogram.
+        """
+        intervals = self.histograms.get(symbol)
+        if intervals is None:
+            intervals = self.histograms[symbol] = {}
+        histogram = intervals.get(interval)
+        if histogram is None:
+            histogram = intervals[interval] = Histogram()
+
+        return histogram
+
+    def arrived(self, data, clock=None) -> None:
+        """
+        Stamp the arrival of a live candle, called by the data feed once loaded.
+
+        Args:
+            data: The data feed.
+            clock: Function returning the now of the exchange (ms since epoch), to
+                measure the delay from the candle close; None if unknown.
+
+        Returns:
+            None
+        """
+        self.arrivals[data._name] = [time.perf_counter(), False]
+        if clock is not None and data._timeframe in TIMEFRAME_MS:
+            close = (
+                streamingKC.datetime_to_ns(data.datetime.datetime(0)) // 1000000
+                + TIMEFRAME_MS[data._timeframe] * data._compression
+            )
+            self.histogram(data._name, "close_to_arrival").add(
+                (clock() - close) / self.speed
+            )
+
+    def enter_next(self, datas: list) -> None:
+        """
+        Mark the entry of the strategy next().
+
+        Args:
+            datas (list): Data feeds of the strategy.
+
+        Returns:
+            None
+        """
+        self.next_entry = now = time.perf_counter()
+        for data in datas:
+            arrival = self.arrivals.get(data._name)
+            if arrival is not None and not arrival[1]:
+                self.histogram(data._name, "arrival_to_next").add(
+                    (now - arrival[0]) * 1000.0
+                )
+
+    def exit_next(self, datas: list) -> None:
+        """
+        Mark the exit of the strategy next().
+
+        Args:
+            datas (list): Data feeds of the strategy.
+
+        Returns:
+            None
+        """
+        duration = (time.perf_counter() - self.next_entry) * 1000.0
+        for data in datas:
+            arrival = self.arrivals.get(data._name)
+            if arrival is not None and not arrival[1]:
+                # The candle is processed: measured once
+                arrival[1] = True
+                self.histogram(data._name, "next").add(duration)
+
+    def submitted(self, order) -> None:
+        """
+        Mark the submission of an order.
+
+        Args:
+            order (bt.Order): The order returned by buy, sell or close.
+
+        Returns:
+            None
+        """
+        now = time.perf_counter()
+        symbol = order.data._name
+        arrival = self.arrivals.get(symbol)
+        if arrival is None:
+            # Order on the replayed bars, before any live candle
+            return
+
+        self.submits[order.ref] = (symbol, now)
+        self.histogram(symbol, "arrival_to_submit").add((now - arrival[0]) * 1000.0)
+
+    def notified(self, order) -> None:
+        """
+        Mark an order notification: acceptance and completion are measured.
+
+        Args:
+            order (bt.Order): The notified order.
+
+        Returns:
+            None
+        """
+        submit = self.submits.get(order.ref)
+        if submit is None:
+            return
+
+        symbol, start = submit
+        if order.status == order.Accepted:
+            self.histogram(symbol, "submit_to_accept").add(
+                (time.perf_counter() - start) * 1000.0
+            )
+        elif order.status == order.Completed:
+            self.histogram(symbol, "submit_to_complete").add(
+                (time.perf_counter() - start) * 1000.0
+            )
+        if not order.alive():
+            del self.submits[order.ref]
+
+    def summary(self) -> dict:
+        """
+        Summarize the histograms.
+
+        Returns:
+            dict: Symbol -> interval -> count, p50, p99 and max (ms).
+        """
+        return {
+            symbol: {
+                interval: intervals[interval].summary()
+                for interval in INTERVALS
+                if interval in intervals
+            }
+            for symbol, intervals in sorted(self.histograms.items())
+        }
+
+    def dump(self, path: str | None = None) -> None:
+        """
+        Print the latency table, and write the summary as JSON if a path is given.
+
+        Args:
+            path (str | None): The path of the JSON file.
+
+        Returns:
+            None
+        """
+        summary = self.summary()
+
+        print("Latency (ms)\t\t\tcount\tp50\tp99\tmax")
+        for symbol, intervals in summary.items():
+            for interval, values in intervals.items():
+                print(
+                    "%s %-20s\t%d\t%.3f\t%.3f\t%.3f"
+                    % (
+                        symbol,
+                        interval,
+                        values["count"],
+                        values["p50"],
+                        values["p99"],
+                        values["max"],
+                    )
+                )
+
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
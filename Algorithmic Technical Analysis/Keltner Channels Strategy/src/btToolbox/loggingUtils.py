@@ -6,6 +6,11 @@ from __future__ import (
     annotations,
 )
 
+import json
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
 import backtrader as bt
@@ -13,8 +18,177 @@ import backtrader.feeds as btfeeds
 
 from typing import Type
 
+# Severity of the levels, records below the level of the logger are discarded
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
 
-def log(self, txt: str, dt: datetime | float | None = None) -> None:
+
+class JsonLinesLogger:
+    """
+    Non-blocking logger writing one JSON object per line.
+
+    Functionality:
+    - emit only filters the level and puts the record in a bounded queue, never
+    waiting: when the queue is full the record is dropped and counted. A
+    background thread serializes the records and writes them in batches, one
+    write and flush per batch.
+    - Each record holds the wall time (time), the level, the message (msg), the
+    bar datetime (dt) if any and the extra fields of emit.
+
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        level: str = "INFO",
+        batch_size: int = 256,
+        flush_interval: float = 0.2,
+        maxsize: int = 100000,
+    ) -> None:
+        """
+        Initialize the logger and start its writer thread.
+
+        Args:
+            path (str | None): File the lines are appended to, None for stdout.
+            level (str): Lowest level written, one of LEVELS.
+            batch_size (int): Maximum records per write.
+            flush_interval (float): Seconds the writer waits for a record before
+                checking whether it is closed.
+            maxsize (int): Maximum records queued before dropping.
+        """
+        if level not in LEVELS:
+            exit("ERROR: LOG LEVEL MUST BE ONE OF %s" % ", ".join(LEVELS))
+
+        self.path = path
+        self.level = LEVELS[level]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def enabled(self, level: str) -> bool:
+        """
+        Tell whether the records of a level are written.
+
+        Args:
+            level (str): One of LEVELS.
+
+        Returns:
+            bool: True if the level is not filtered out.
+        """
+        return LEVELS[level] >= self.level
+
+    def emit(
+        self, level: str, msg: str, dt: datetime | float | None = None, **fields
+    ) -> None:
+        """
+        Queue a record, without blocking.
+
+        Args:
+            level (str): One of LEVELS.
+            msg (str): Message.
+            dt (datetime | float | None): Datetime of the bar, or backtrader float.
+            **fields: Extra fields of the record, e.g. symbol='BTC'.
+
+        Returns:
+            None
+        """
+        if LEVELS[level] < self.level:
+            return
+
+        # Serialization is left to the writer thread
+        record = dict(time=time.time(), level=level, msg=msg, dt=dt, **fields)
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        """
+        Write the queued records and stop the writer thread.
+
+        Returns:
+            None
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        self.thread.join()
+
+    def _run(self) -> None:
+        """Write the queued records in batches until closed and drained."""
+        f = sys.stdout if self.path is None else open(self.path, "a")
+        try:
+            while True:
+                try:
+                    batch = [self.records.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    if self.closed:
+                        break
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.records.get_nowait())
+                    except queue.Empty:
+                        break
+
+                f.write("".join(_dumps(record) + "\n" for record in batch))
+                f.flush()
+
+            if self.dropped:
+                f.write(
+                    _dumps(
+                        dict(
+                            time=time.time(),
+                            level="WARNING",
+                            msg="%d LOG RECORDS DROPPED" % self.dropped,
+                            dt=None,
+                        )
+                    )
+                    + "\n"
+                )
+                f.flush()
+        finally:
+            if f is not sys.stdout:
+                f.close()
+
+
+def _dumps(record: dict) -> str:
+    """Serialize a record, converting its bar datetime to ISO format."""
+    dt = record["dt"]
+    if isinstance(dt, float):
+        dt = bt.num2date(dt)
+    record["dt"] = None if dt is None else dt.isoformat()
+
+    return json.dumps(record, default=str)
+
+
+def write(self, txt: str, level: str = "INFO", **fields) -> None:
+    """
+    Output a line of the strategy, to its logger if any, printed otherwise.
+
+    Args:
+        self: Reference to the strategy instance.
+        txt (str): Text to be written.
+        level (str): One of LEVELS.
+        **fields: Extra fields of the record.
+
+    Returns:
+        None
+    """
+    if self.p.logger is None:
+        print(txt)
+    else:
+        self.p.logger.emit(level, txt, **fields)
+
+
+def log(
+    self, txt: str, dt: datetime | float | None = None, level: str = "INFO", **fields
+) -> None:
     """
     Custom log function to print strategy-specific logs.
 
@@ -22,6 +196,8 @@ def log(self, txt: str, dt: datetime | float | None = None) -> None:
         self: Reference to the strategy instance.
         txt (str): Text to be logged.
         dt (datetime | float | None): Datetime or float timestamp. Defaults to None.
+        level (str): One of LEVELS, used by the logger of the strategy.
+        **fields: Extra fields of the record, used by the logger of the strategy.
 
     Returns:
         None
@@ -29,6 +205,10 @@ def log(self, txt: str, dt: datetime | float | None = None) -> None:
     if self.p.print_position:
         # Logging function fot this strategy
         dt = dt or self.data.datetime[0]
+        if self.p.logger is not None:
+            # Formatted by the writer thread of the logger
+            self.p.logger.emit(level, txt, dt, **fields)
+            return
         if isinstance(dt, float):
             dt = bt.num2date(dt)
         print("%s, %s" % (dt.isoformat(), txt))
@@ -50,7 +230,12 @@ def notify_order(self, order: bt.Order) -> None:
     if order.status in [order.Submitted, order.Accepted]:
         if self.debug == True:
             # Buy/Sell order submitted/accepted to/by broker - Nothing to do
-            self.log("%s - ORDER ACCEPTED/SUBMITTED" % d_name, dt=order.created.dt)
+            self.log(
+                "%s - ORDER ACCEPTED/SUBMITTED" % d_name,
+                dt=order.created.dt,
+                level="DEBUG",
+                symbol=d_name,
+            )
         self.orders[d_name] = order
     else:
         # Handling order status other than Submitted or Accepted
@@ -68,9 +253,14 @@ def notify_order(self, order: bt.Order) -> None:
                             order.executed.price,
                             order.executed.value,
                             order.executed.comm,
-                        )
+                        ),
+                        symbol=d_name,
+                    )
+                    write(
+                        self,
+                        "USDT present in the wallet %.2f" % self.broker.getvalue(),
+                        level="DEBUG",
                     )
-                    print("USDT present in the wallet %.2f" % self.broker.getvalue())
                 else:
                     self.log(
                         "%s - BUY EXECUTED, Price: %.2f, Cost: %.2f, Comm %.2f"
@@ -79,7 +269,8 @@ def notify_order(self, order: bt.Order) -> None:
                             order.executed.price,
                             order.executed.value,
                             order.executed.comm,
-                        )
+                        ),
+                        symbol=d_name,
                     )
             else:  # Sell
                 # Handling Sell order execution
@@ -93,9 +284,14 @@ def notify_order(self, order: bt.Order) -> None:
                             order.executed.price,
                             order.executed.value,
                             order.executed.comm,
-                        )
+                        ),
+                        symbol=d_name,
+                    )
+                    write(
+                        self,
+                        "USDT present in the wallet %.2f" % self.broker.getvalue(),
+                        level="DEBUG",
                     )
-                    print("USDT present in the wallet %.2f" % self.broker.getvalue())
                 else:
                     self.log(
                         "%s - SELL EXECUTED, Price: %.2f, Cost: %.2f, Comm %.2f"
@@ -104,22 +300,43 @@ def notify_order(self, order: bt.Order) -> None:
                             order.executed.price,
                             order.executed.value,
                             order.executed.comm,
-                        )
+                        ),
+                        symbol=d_name,
                     )
             self.flagclose[d_name] = 0
         else:
             # Handling order status other than Completed
             self.position_short_long[d_name] = 0
             if order.status in [order.Partial]:
-                self.log("%s - ORDER Partial: %s" % (d_name, order.status))
+                self.log(
+                    "%s - ORDER Partial: %s" % (d_name, order.status),
+                    level="INFO",
+                    symbol=d_name,
+                )
             elif order.status in [order.Rejected]:
-                self.log("%s - ORDER Rejected: %s" % (d_name, order.status))
+                self.log(
+                    "%s - ORDER Rejected: %s" % (d_name, order.status),
+                    level="WARNING",
+                    symbol=d_name,
+                )
             elif order.status in [order.Margin]:
-                self.log("%s - ORDER Margin: %s" % (d_name, order.status))
+                self.log(
+                    "%s - ORDER Margin: %s" % (d_name, order.status),
+                    level="WARNING",
+                    symbol=d_name,
+                )
             elif order.status in [order.Cancelled]:
-                self.log("%s - ORDER Cancelled: %s" % (d_name, order.status))
+                self.log(
+                    "%s - ORDER Cancelled: %s" % (d_name, order.status),
+                    level="INFO",
+                    symbol=d_name,
+                )
             elif order.status in [order.Expired]:
-                self.log("%s - ORDER Expired: %s" % (d_name, order.status))
+                self.log(
+                    "%s - ORDER Expired: %s" % (d_name, order.status),
+                    level="WARNING",
+                    symbol=d_name,
+                )
 
         # Sentinel to None: new orders allowed
         self.orders[d_name] = None
@@ -137,6 +354,20 @@ def print_values_candel(self, d: Type[btfeeds.BaseData]) -> None:
         None
     """
     if self.p.print_position:
+        if self.p.logger is not None:
+            # Structured record, formatted by the writer thread of the logger
+            self.p.logger.emit(
+                "INFO",
+                "CANDLE",
+                d.datetime[0],
+                symbol=d._name,
+                open=d.open[0],
+                high=d.high[0],
+                low=d.low[0],
+                close=d.close[0],
+                volume=d.volume[0],
+            )
+            return
         print(
             "{} - {} | O: {} H: {} L: {} C: {} V:{}".format(
                 d.datetime.datetime(),
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import streamingKC
+from .latencyTracker import TIMEFRAME_MS
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metrics:
+    """
+    Registry of counters and gauges, rendered in the Prometheus text format.
+
+    Functionality:
+    - Each metric is declared once with its type and help, then updated by name
+    and labels. The updates come from the Cerebro thread and the rendering from
+    the HTTP thread: both hold the lock of the registry.
+
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty registry.
+        """
+        # Name -> [type, help, {labels (tuple of pairs): value}]
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def declare(self, name: str, kind: str, help: str) -> None:
+        """
+        Declare a metric.
+
+        Args:
+            name (str): Name of the metric, e.g. 'kc_bars_total'.
+            kind (str): 'counter' or 'gauge'.
+            help (str): Description of the metric.
+
+        Returns:
+            None
+        """
+        with self.lock:
+            self.metrics.setdefault(name, [kind, help, {}])
+
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """
+        Increase a counter.
+
+        Args:
+            name (str): Name of the metric.
+            value (float): Increment.
+            **labels (str): Labels of the series, e.g. symbol='BTC'.
+
+        Returns:
+            None
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.metrics[name][2]
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """
+        Set a gauge.
+
+        Args:
+            name (str): Name of the metric.
+            value (float): New value.
+            **labels (str): Labels of the series, e.g. symbol='BTC'.
+
+        Returns:
+            None
+        """
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.metrics[name][2][key] = value
+
+    def render(self) -> str:
+        """
+        Render all the metrics.
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, (kind, help, series) in sorted(self.metrics.items()):
+                lines.append("# HELP %s %s" % (name, help))
+                lines.append("# TYPE %s %s" % (name, kind))
+                for key, value in sorted(series.items()):
+                    labels = ",".join('%s="%s"' % pair for pair in key)
+                    lines.append(
+                        "%s%s %r" % (name, "{%s}" % labels if labels else "", value)
+                    )
+
+        return "\n".join(lines) + "\n"
+
+
+class StrategyMetrics(Metrics):
+    """
+    Metrics of the live strategy: bars processed, feed lag, pending orders,
+    cancels, portfolio value and loop iteration time.
+
+    Functionality:
+    - observe_next is called by the strategy after each next(), cancelled by its
+    cancel. kc_last_loop_timestamp_seconds allows to alert on a stalled loop.
+
+    """
+
+    def __init__(self, clock=None, speed: float = 1.0) -> None:
+        """
+        Initialize the metrics of the strategy.
+
+        Args:
+            clock: Function returning the now of the exchange (ms since epoch), for
+                the feed lag; None for the local clock.
+            speed (float): Milliseconds of the exchange clock per real millisecond,
+                above 1 for a simulated exchange running faster than real time.
+        """
+        super().__init__()
+        self.clock = clock
+        self.speed = speed
+        # Name of the data feed -> bars seen
+        self.bars = {}
+
+        self.declare("kc_bars_total", "counter", "Bars processed by the strategy")
+        self.declare(
+            "kc_feed_lag_seconds",
+            "gauge",
+            "Seconds between the close of the last bar and its processing",
+        )
+        self.declare("kc_pending_orders", "gauge", "Orders pending for the data")
+        self.declare("kc_cancels_total", "counter", "Orders cancelled by the strategy")
+        self.declare("kc_portfolio_value", "gauge", "Value of the portfolio")
+        self.declare(
+            "kc_loop_seconds", "gauge", "Duration of the last strategy iteration"
+        )
+        self.declare(
+            "kc_loop_seconds_total", "counter", "Time spent in strategy iterations"
+        )
+        self.declare(
+            "kc_loop_iterations_total", "counter", "Strategy iterations performed"
+        )
+        self.declare(
+            "kc_last_loop_timestamp_seconds",
+            "gauge",
+            "Unix time of the end of the last strategy iteration",
+        )
+
+    def observe_next(self, strategy, duration: float) -> None:
+        """
+        Update the metrics after an iteration of the strategy.
+
+        Args:
+            strategy (KeltnerChannelsStrategy): The strategy.
+            duration (float): Seconds spent in next().
+
+        Returns:
+            None
+        """
+        now = time.time()
+        clock = self.clock() if self.clock is not None else now * 1000.0
+
+        for d in strategy.datas:
+            d_name = d._name
+            new_bars = len(d) - self.bars.get(d_name, 0)
+            if new_bars > 0:
+                self.inc("kc_bars_total", new_bars, symbol=d_name)
+                self.bars[d_name] = len(d)
+                if d._timeframe in TIMEFRAME_MS:
+                    close = (
+                        streamingKC.datetime_to_ns(d.datetime.datetime(0)) // 1000000
+                        + TIMEFRAME_MS[d._timeframe] * d._compression
+                    )
+                    self.set(
+                        "kc_feed_lag_seconds",
+                        (clock - close) / self.speed / 1000.0,
+                        symbol=d_name,
+                    )
+            self.set(
+                "kc_pending_orders",
+                0 if strategy.orders[d_name] is None else 1,
+                symbol=d_name,
+            )
+
+        self.set("kc_portfolio_value", strategy.broker.getvalue())
+        self.set("kc_loop_seconds", duration)
+        self.inc("kc_loop_seconds_total", duration)
+        self.inc("kc_loop_iterations_total")
+        self.set("kc_last_loop_timestamp_seconds", now)
+
+    def cancelled(self, order) -> None:
+        """
+        Count an order cancelled by the strategy.
+
+        Args:
+            order (bt.Order): The order.
+
+        Returns:
+            None
+        """
+        self.inc("kc_cancels_total", symbol=order.data._name)
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint serving a Metrics registry on /metrics, from a background
+    thread.
+    """
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1") -> None:
+        """
+        Initialize the server, listening at once.
+
+        Args:
+            metrics (Metrics): The registry to serve.
+            port (int): Port to listen on, 0 for any free one (see port).
+            host (str): Address to listen on, local only by default.
+        """
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # Scrapes are not logged
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self) -> None:
+        """
+        Serve in a background thread.
+
+        Returns:
+            None
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop serving and close the socket.
+
+        Returns:
+            None
+        """
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server.server_close()
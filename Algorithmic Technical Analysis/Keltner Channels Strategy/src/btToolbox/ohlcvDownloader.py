@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import numpy as np
+
+from . import columnarStore
+
+# Milliseconds per timeframe unit, as in the ccxt timeframe strings ('1m', '4h', '1d'...)
+TIMEFRAME_UNITS_MS = {
+    "s": 1000,
+    "m": 60 * 1000,
+    "h": 60 * 60 * 1000,
+    "d": 24 * 60 * 60 * 1000,
+    "w": 7 * 24 * 60 * 60 * 1000,
+}
+
+# Number of candles requested per page
+PAGE_LIMIT = 1000
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """
+    Convert a ccxt timeframe string to its duration.
+
+    Args:
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+
+    Returns:
+        int: Duration of one candle in milliseconds.
+    """
+    try:
+        return int(timeframe[:-1]) * TIMEFRAME_UNITS_MS[timeframe[-1]]
+    except (KeyError, ValueError):
+        raise ValueError("Unsupported timeframe: %s" % timeframe)
+
+
+def download_ohlcv(
+    exchange,
+    symbol: str,
+    timeframe: str,
+    since: int,
+    until: int | None = None,
+    limit: int = PAGE_LIMIT,
+) -> (np.ndarray, dict):
+    """
+    Download the closed candles of a symbol, page by page.
+
+    The pages are copied into a preallocated array, sized from the requested window,
+    and the columns are extracted once at the end.
+
+    Args:
+        exchange: ccxt exchange (or any object with fetch_ohlcv and milliseconds).
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        since (int): Open time (ms since epoch) of the first candle.
+        until (int | None): Open time (ms) after which to stop, default now.
+        limit (int): Number of candles per page.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch).
+        dict: Column name -> float64 array.
+    """
+    step = timeframe_to_ms(timeframe)
+    now = exchange.milliseconds()
+    # Only closed candles: the one still forming is left for the next refresh
+    last_closed = (now // step) * step - step
+    until = last_closed if until is None else min(until, last_closed)
+
+    rows = np.empty((max(0, (until - since) // step + 1), 6), dtype=np.float64)
+    count = 0
+
+    while since <= until:
+        page = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
+        if not page:
+            break
+        page = np.asarray(page, dtype=np.float64)[:, :6]
+        page = page[(page[:, 0] >= since) & (page[:, 0] <= until)]
+        if not len(page):
+            break
+
+        if count + len(page) > len(rows):
+            # More candles than expected (e.g. irregular timeframe): grow the buffer
+            rows = np.resize(rows, (max(2 * len(rows), count + len(page)), 6))
+        rows[count : count + len(page)] = page
+        count += len(page)
+
+        since = int(page[-1, 0]) + step
+
+    rows = rows[:count]
+    stamps = rows[:, 0].astype(np.int64) * 1000000
+    columns = {
+        "Open": rows[:, 1].copy(),
+        "High": rows[:, 2].copy(),
+        "Low": rows[:, 3].copy(),
+        "Close": rows[:, 4].copy(),
+        "Adj Close": rows[:, 4].copy(),
+        "Volume": rows[:, 5].copy(),
+    }
+
+    return stamps, columns
+
+
+def refresh(
+    exchange, symbol: str, timeframe: str, since: int, directory: str
+) -> (np.ndarray, dict):
+    """
+    Bring the local store of a symbol up to date, fetching only the missing tail
+    (and the head, if since is older than the first stored candle).
+
+    Args:
+        exchange: ccxt exchange (or any object with fetch_ohlcv and milliseconds).
+        symbol (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        since (int): Open time (ms since epoch) of the first candle when the store
+            is empty.
+        directory (str): Directory of the columnar data of the symbol.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch) of the whole store.
+        dict: Column name -> float64 array of the whole store.
+    """
+    step = timeframe_to_ms(timeframe)
+    meta = columnarStore.read_meta(directory)
+    if meta is None or not meta["rows"]:
+        stamps, columns = download_ohlcv(exchange, symbol, timeframe, since)
+    else:
+        stamps, columns = columnarStore.read_columns(directory)
+        first = int(stamps[0]) // 1000000
+        last = int(stamps[-1]) // 1000000
+
+        # Missing head, older than the first stored candle
+        parts = []
+        if since < first:
+            parts.append(
+                download_ohlcv(exchange, symbol, timeframe, since, until=first - step)
+            )
+        parts.append((stamps, columns))
+        # Missing tail: resume right after the last stored candle
+        parts.append(download_ohlcv(exchange, symbol, timeframe, last + step))
+
+        if sum(len(part[0]) for part in parts) == len(stamps):
+            # Already up to date
+            return stamps, columns
+
+        stamps = np.concatenate([part[0] for part in parts])
+        columns = {
+            name: np.concatenate([part[1][name] for part in parts]) for name in columns
+        }
+
+    columnarStore.write_columns(
+        directory, stamps, columns, dict(symbol=symbol, timeframe=timeframe)
+    )
+
+    return stamps, columns
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+import backtrader as bt
+import backtrader.feeds as btfeeds
+
+from . import backtestingRetrivesDatas
+from . import columnarStore
+from . import experimentStore
+from . import performanceAnalytics
+from . import sharedData
+from . import vectorizedKC
+
+# Data shared with the worker processes: published once by the parent in shared
+#   memory, which each worker attaches to when the pool starts, without copying
+_worker_data = {}
+
+# Runs of a sweep written to the experiment store per transaction
+STORE_BATCH = 100
+
+
+def retrives_combinations(data_args: dict) -> list:
+    """
+    Build the data arguments of every combination of the optimization ranges.
+
+    Args:
+        data_args (dict): Dictionary containing data-related arguments, with the
+            "optimize" ranges.
+
+    Returns:
+        list: One data arguments dictionary per combination.
+    """
+    names = list(data_args["optimize"].keys())
+    combinations = []
+    for values in itertools.product(*data_args["optimize"].values()):
+        combination = dict(data_args)
+        combination.update(zip(names, values))
+        combinations.append(combination)
+
+    return combinations
+
+
+def _init_worker(handle: dict, name_asset: str) -> None:
+    """
+    Initialize a worker process with views on the shared data.
+
+    Args:
+        handle (dict): Handle of the shared memory block, see sharedData.publish.
+        name_asset (str): Name of the asset.
+
+    Returns:
+        None
+    """
+    shm, arrays = sharedData.attach(handle)
+    # The block must stay open as long as its arrays are in use
+    _worker_data["shm"] = shm
+    _worker_data["stamps"] = arrays.pop("stamps")
+    _worker_data["name_asset"] = name_asset
+    _worker_data["data_analisys"] = columnarStore.to_dataframe(
+        arrays.pop(columnarStore.INDEX), arrays
+    )
+    _worker_data["arrays"] = arrays
+
+
+def _retrives_bands(data_args: dict, strategy_params: dict) -> tuple | None:
+    """
+    Retrieve the bands of a combination from the indicator cache.
+
+    Args:
+        data_args (dict): Data arguments of the combination.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+
+    Returns:
+        tuple | None: (atrlow, atrhigh), None if the indicator cache is disabled.
+    """
+    if not data_args["indicatorCache"]:
+        return None
+
+    return backtestingRetrivesDatas.retrives_bands(
+        _worker_data["data_analisys"],
+        strategy_params["period_EMA"],
+        strategy_params["period_ATR"],
+    )
+
+
+def _run_vectorized(data_args: dict, strategy_params: dict) -> (dict, dict):
+    """
+    Run one combination with the vectorized engine and compute its metrics.
+
+    Args:
+        data_args (dict): Data arguments of the combination.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+
+    Returns:
+        dict: Metrics of the run.
+        dict: equity, trades and final cash of the run.
+    """
+    arrays = _worker_data["arrays"]
+    result = vectorizedKC.backtest(
+        arrays["Open"],
+        arrays["High"],
+        arrays["Low"],
+        arrays["Close"],
+        data_args["startcash"],
+        data_args["commission"],
+        stamps=_worker_data["stamps"],
+        bands=_retrives_bands(data_args, strategy_params),
+        **strategy_params,
+    )
+
+    metrics = performanceAnalytics.analyze(
+        result["equity"],
+        _worker_data["stamps"],
+        result["trades"],
+        data_args["startcash"],
+        breakdown=False,
+    )
+
+    return {
+        "SQN": metrics["sqn"],
+        "SHARPE RATIO ANNUAL": metrics["sharpe_ratio"],
+        "MAX DRAWDOWN": metrics["max_moneydown"],
+        "MAX % DRAWDOWN": metrics["max_drawdown"],
+        "TOTAL NET PROFIT": result["cash"] - data_args["startcash"],
+        "# TRADES": metrics["closed"],
+    }, {name: result[name] for name in ("equity", "trades", "cash")}
+
+
+def _run_cerebro(data_args: dict, strategy_params: dict) -> (dict, dict):
+    """
+    Run one combination with cerebro and compute its metrics from the recorded arrays.
+
+    Args:
+        data_args (dict): Data arguments of the combination.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+
+    Returns:
+        dict: Metrics of the run.
+        dict: equity, trades and final cash of the run.
+    """
+    cerebro = bt.Cerebro(stdstats=False)
+
+    # Feed built from the shared data, stamped as the broker of the main process sees it
+    data = backtestingRetrivesDatas.retrives_feed(
+        _worker_data["data_analisys"],
+        _worker_data["stamps"],
+        data_args["dtype"],
+        backtestingRetrivesDatas.retrives_feed_bands(data_args),
+    )
+    cerebro.adddata(data, name=_worker_data["name_asset"])
+
+    # Silent strategy: the workers would otherwise print every order
+    cerebro.addstrategy(
+        backtestingRetrivesDatas.KeltnerChannelsStrategy,
+        print_position=False,
+        **strategy_params,
+    )
+    backtestingRetrivesDatas.set_broker(cerebro, data_args)
+
+    cerebro.addanalyzer(performanceAnalytics.PerformanceRecorder)
+
+    strat = cerebro.run()[0]
+    records = strat.analyzers.performancerecorder.get_analysis()
+    metrics = performanceAnalytics.analyze(
+        records["equity"],
+        records["stamps"],
+        records["trades"],
+        records["startcash"],
+        breakdown=False,
+    )
+
+    return {
+        "SQN": metrics["sqn"],
+        "SHARPE RATIO ANNUAL": metrics["sharpe_ratio"],
+        "MAX DRAWDOWN": metrics["max_moneydown"],
+        "MAX % DRAWDOWN": metrics["max_drawdown"],
+        "TOTAL NET PROFIT": cerebro.broker.getcash() - data_args["startcash"],
+        "# TRADES": metrics["closed"],
+    }, dict(
+        equity=records["equity"],
+        trades=records["trades"],
+        cash=cerebro.broker.getcash(),
+    )
+
+
+def _run_combination(data_args: dict) -> dict:
+    """
+    Run one combination in a worker process.
+
+    Args:
+        data_args (dict): Data arguments of the combination.
+
+    Returns:
+        dict: Parameters and metrics of the run, with its curves under "_curves"
+        if the runs are stored.
+    """
+    strategy_params = backtestingRetrivesDatas.retrives_strategy(data_args)[1]
+
+    if data_args["engine"] == "vectorized":
+        metrics, curves = _run_vectorized(data_args, strategy_params)
+    else:
+        metrics, curves = _run_cerebro(data_args, strategy_params)
+
+    row = {name: data_args[name] for name in data_args["optimize"]}
+    row.update(metrics)
+    if data_args["store"]:
+        # Sent back to the main process, the only one writing the store
+        row["_curves"] = curves
+    return row
+
+
+def optimize(
+    data: btfeeds.DataBase, data_analisys: pd.DataFrame, data_args: dict
+) -> pd.DataFrame:
+    """
+    Sweep the strategy parameters over a process pool.
+
+    Args:
+        data (btfeeds.DataBase): Data feed of the asset, as built by retrivesDatas.
+        data_analisys (pd.DataFrame): OHLCV data of the asset.
+        data_args (dict): Dictionary containing data-related arguments.
+
+    Returns:
+        pd.DataFrame: Parameters and metrics of every run, ranked by Sharpe ratio
+        and net profit.
+    """
+    combinations = retrives_combinations(data_args)
+    stamps = backtestingRetrivesDatas.retrives_feed_stamps(data, data_analisys)
+    processes = data_args["processes"] or os.cpu_count()
+
+    # Several combinations per task, to amortize the inter-process communication
+    chunksize = max(1, len(combinations) // (processes * 4))
+
+    # The data is copied once into shared memory, the workers only get its handle
+    arrays = {name: data_analisys[name].to_numpy() for name in data_analisys.columns}
+    arrays[columnarStore.INDEX] = data_analisys.index.values.astype(
+        "datetime64[ns]"
+    ).astype(np.int64)
+    arrays["stamps"] = stamps
+    shm, handle = sharedData.publish(arrays)
+    del arrays
+
+    try:
+        with multiprocessing.Pool(
+            processes,
+            initializer=_init_worker,
+            initargs=(handle, data._name),
+        ) as pool:
+            rows = []
+            runs = []
+            fingerprint = None
+            if data_args["store"]:
+                fingerprint = experimentStore.data_fingerprint([data_analisys])
+            for combination, row in zip(
+                combinations,
+                pool.imap(_run_combination, combinations, chunksize=chunksize),
+            ):
+                rows.append(row)
+                if "_curves" not in row:
+                    continue
+                curves = row.pop("_curves")
+                runs.append(
+                    experimentStore.retrives_run(
+                        combination,
+                        fingerprint,
+                        stamps,
+                        curves["equity"],
+                        curves["trades"],
+                        curves["cash"],
+                    )
+                )
+                # Stored by batches: the curves of a whole sweep may not fit in memory
+                if len(runs) >= STORE_BATCH:
+                    experimentStore.save(runs)
+                    runs = []
+            if runs:
+                experimentStore.save(runs)
+    finally:
+        sharedData.release(shm, unlink=True)
+
+    df = pd.DataFrame(rows)
+    # Runs without a Sharpe ratio go last
+    df["_sharpe"] = df["SHARPE RATIO ANNUAL"].fillna(-np.inf)
+    df = df.sort_values(
+        ["_sharpe", "TOTAL NET PROFIT"], ascending=False, ignore_index=True
+    ).drop(columns="_sharpe")
+    df.index += 1
+    df.index.name = "RANK"
+
+    return df
@@ -0,0 +1,341 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime
+
+import numpy as np
+
+import backtrader as bt
+
+from .arrayFeed import num2date_array
+from .vectorizedKC import TRADE_DTYPE
+
+# Same sentinel as the TradeAnalyzer minimum length when no trade matches
+MAXINT = bt.analyzers.tradeanalyzer.MAXINT
+
+
+def drawdown_array(equity: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Compute the drawdown series of an equity curve, as the DrawDown analyzer.
+
+    Args:
+        equity (np.ndarray): Portfolio value at the end of each bar.
+
+    Returns:
+        np.ndarray: Money down from the running maximum.
+        np.ndarray: Percentage down from the running maximum.
+    """
+    peak = np.maximum.accumulate(equity)
+    moneydown = peak - equity
+
+    return moneydown, 100.0 * moneydown / peak
+
+
+def annual_return_array(
+    equity: np.ndarray, stamps: np.ndarray, startcash: float
+) -> (np.ndarray, np.ndarray):
+    """
+    Compute the yearly returns of an equity curve, as the TimeReturn analyzer on years.
+
+    Args:
+        equity (np.ndarray): Portfolio value at the end of each bar.
+        stamps (np.ndarray): int64 timestamps (ns) of the bars.
+        startcash (float): Value before the first bar.
+
+    Returns:
+        np.ndarray: Years.
+        np.ndarray: Return of each year.
+    """
+    years = (
+        stamps.astype("datetime64[ns]").astype("datetime64[Y]").astype(np.int64) + 1970
+    )
+    # Last bar of each year
+    last = np.flatnonzero(np.append(years[1:] != years[:-1], True))
+    year_end = equity[last]
+    year_start = np.append(startcash, year_end[:-1])
+
+    return years[last], year_end / year_start - 1.0
+
+
+def sharpe_ratio_annual_array(
+    annual_returns: np.ndarray, riskfreerate: float = 0.01
+) -> float | None:
+    """
+    Compute the annualized Sharpe ratio from yearly returns, as the SharpeRatio_A analyzer.
+
+    Args:
+        annual_returns (np.ndarray): Return of each year.
+        riskfreerate (float): Yearly risk-free rate.
+
+    Returns:
+        float | None: Sharpe ratio, None if it cannot be calculated.
+    """
+    if not len(annual_returns):
+        return None
+    ret_free = annual_returns - (pow(1.0 + riskfreerate, 1.0) - 1.0)
+    ret_free_avg = math.fsum(ret_free) / len(ret_free)
+    retdev = math.sqrt(math.fsum((ret_free - ret_free_avg) ** 2.0) / len(ret_free))
+    if not retdev:
+        return None
+
+    return ret_free_avg / retdev
+
+
+def sqn_array(pnlcomm: np.ndarray) -> float | None:
+    """
+    Compute the System Quality Number of closed trades, as the SQN analyzer.
+
+    Args:
+        pnlcomm (np.ndarray): Net profit and loss of each closed trade.
+
+    Returns:
+        float | None: SQN, None if the trades have no dispersion.
+    """
+    if len(pnlcomm) < 2:
+        return 0
+    pnl_av = math.fsum(pnlcomm) / len(pnlcomm)
+    pnl_stddev = math.sqrt(math.fsum((pnlcomm - pnl_av) ** 2.0) / len(pnlcomm))
+    if not pnl_stddev:
+        return None
+
+    return math.sqrt(len(pnlcomm)) * pnl_av / pnl_stddev
+
+
+def trade_breakdown(closed: np.ndarray) -> dict:
+    """
+    Compute the won/lost statistics of the long and short trades, as the
+    TradeAnalyzer.
+
+    A trade is won when its net profit is not negative. As in the TradeAnalyzer,
+    the maximum profit of the won trades and the minimum of the lost ones start
+    from 0, the maximum length from 0 and the minimum length from MAXINT.
+
+    Args:
+        closed (np.ndarray): Closed trades, of TRADE_DTYPE.
+
+    Returns:
+        dict: 'long'/'short' -> 'won'/'lost' -> count, pnl_total, pnl_max,
+        len_total, len_max, len_min and len_average.
+    """
+    won = closed["pnlcomm"] >= 0.0
+    is_long = closed["size"] > 0
+    barlen = closed["exit_bar"] - closed["entry_bar"]
+
+    breakdown = {}
+    for side, side_mask in (("long", is_long), ("short", ~is_long)):
+        breakdown[side] = {}
+        for result, result_mask in (("won", won), ("lost", ~won)):
+            mask = side_mask & result_mask
+            pnl = closed["pnlcomm"][mask]
+            lengths = barlen[mask]
+            nonzero = lengths[lengths > 0]
+            count = int(mask.sum())
+            breakdown[side][result] = dict(
+                count=count,
+                pnl_total=float(pnl.sum()),
+                pnl_max=float(
+                    max(0.0, pnl.max()) if result == "won" else min(0.0, pnl.min())
+                )
+                if count
+                else 0.0,
+                len_total=int(lengths.sum()),
+                len_max=int(max(0, lengths.max())) if count else 0,
+                len_min=int(nonzero.min()) if len(nonzero) else MAXINT,
+                len_average=float(lengths.sum()) / (count or 1.0),
+            )
+
+    return breakdown
+
+
+def analyze(
+    equity: np.ndarray,
+    stamps: np.ndarray,
+    trades: np.ndarray,
+    startcash: float,
+    breakdown: bool = True,
+) -> dict:
+    """
+    Compute all the performance metrics of a run from its equity curve and trades.
+
+    The metrics match the analyzers backtestingMainKC attached before (SharpeRatio_A,
+    AnnualReturn, DrawDown, SQN, TimeReturn and TradeAnalyzer), computed in a few
+    passes over arrays instead of bar by bar.
+
+    Args:
+        equity (np.ndarray): Portfolio value at the end of each bar.
+        stamps (np.ndarray): int64 timestamps (ns) of the bars.
+        trades (np.ndarray): Trades of TRADE_DTYPE, exit_bar -1 while open.
+        startcash (float): Value before the first bar.
+        breakdown (bool): Also compute the won/lost statistics of the long and
+            short trades, not needed by a sweep.
+
+    Returns:
+        dict: years, annual_returns (from the value of the first bar, as
+        AnnualReturn), sharpe_ratio, sqn, moneydown and drawdown series,
+        max_moneydown, max_drawdown, drawdown_len (bars since the last peak),
+        open and closed trades, and breakdown (see trade_breakdown) if requested.
+    """
+    closed = trades[trades["exit_bar"] >= 0]
+    moneydown, drawdown = drawdown_array(equity)
+
+    # TimeReturn on years starts from the cash, AnnualReturn from the first bar
+    years, time_returns = annual_return_array(equity, stamps, startcash)
+    _, annual_returns = annual_return_array(
+        equity, stamps, equity[0] if len(equity) else startcash
+    )
+
+    # Bars since the drawdown was last zero
+    zero = np.flatnonzero(drawdown == 0)
+    drawdown_len = len(drawdown) - 1 - (zero[-1] if len(zero) else -1)
+
+    metrics = dict(
+        years=years,
+        annual_returns=annual_returns,
+        sharpe_ratio=sharpe_ratio_annual_array(time_returns),
+        sqn=sqn_array(closed["pnlcomm"]),
+        moneydown=moneydown,
+        drawdown=drawdown,
+        max_moneydown=float(moneydown.max()) if len(equity) else 0.0,
+        max_drawdown=float(drawdown.max()) if len(equity) else 0.0,
+        drawdown_len=int(drawdown_len),
+        open=len(trades) - len(closed),
+        closed=len(closed),
+    )
+    if breakdown:
+        metrics["breakdown"] = trade_breakdown(closed)
+
+    return metrics
+
+
+class _PeriodKeyer:
+    """Timeframe and compression for the period keys of TimeFrameAnalyzerBase."""
+
+    _get_subday_cmpkey = bt.TimeFrameAnalyzerBase._get_subday_cmpkey
+
+    def __init__(self, timeframe: int, compression: int) -> None:
+        self.timeframe = timeframe
+        self.compression = compression
+
+
+def period_key(dt: datetime, timeframe: int, compression: int):
+    """
+    Compute the key of the period of a datetime, as the TimeReturn analyzer.
+
+    Args:
+        dt (datetime): Datetime of the bar.
+        timeframe (int): backtrader timeframe of the data.
+        compression (int): Compression of the data.
+
+    Returns:
+        The end of the period of the bar, e.g. its day for daily data.
+    """
+    keyer = _PeriodKeyer(timeframe, compression)
+
+    return bt.TimeFrameAnalyzerBase._get_dt_cmpkey(keyer, dt)[1]
+
+
+class PerformanceRecorder(bt.Analyzer):
+    """
+    Single analyzer recording what the performance metrics need.
+
+    Functionality:
+    - Records the portfolio value and the datetime of each bar and the trades,
+    without computing anything while the strategy runs; get_analysis returns the
+    arrays for analyze. It keeps no history of the data, so it also works with
+    exactbars.
+    - With resume, it continues the records of a checkpoint (see checkpointKC):
+    the warm-up bars replayed before it are not recorded again and the bars of
+    the trades count from the first bar of the data.
+
+    """
+
+    params = dict(
+        resume=None,  # Checkpoint to resume from, see checkpointKC.load
+    )
+
+    def start(self) -> None:
+        """Initialize the records."""
+        self.startcash = self.strategy.broker.getvalue()
+        self.value = self.startcash
+        self.nums = []
+        self.values = []
+        self.trades = []
+        # Trade ref -> size when opened
+        self.sizes = {}
+        # Bars of the data before the first one of this run, and bars to skip
+        self.bar_offset = 0
+        self.skip = 0
+
+        resume = self.p.resume
+        if resume is not None:
+            self.startcash = resume["startcash"]
+            self.nums = resume["nums"].tolist()
+            self.values = resume["values"].tolist()
+            self.trades = resume["trades"].tolist()
+            self.sizes = dict(resume["sizes"])
+            self.bar_offset = resume["offset"]
+            self.skip = resume["warmup"]
+
+    def notify_fund(
+        self, cash: float, value: float, fundvalue: float, shares: float
+    ) -> None:
+        """Keep the portfolio value, as the DrawDown analyzer."""
+        self.value = value
+
+    def next(self) -> None:
+        """Record the bar."""
+        if self.skip:
+            # Already recorded before the checkpoint
+            self.skip -= 1
+            return
+        self.nums.append(self.data.datetime[0])
+        self.values.append(self.value)
+
+    def notify_trade(self, trade: bt.Trade) -> None:
+        """Record a trade when it opens and when it closes."""
+        if trade.justopened:
+            self.sizes[trade.ref] = trade.size
+        elif trade.status == trade.Closed:
+            self.trades.append(
+                (
+                    trade.baropen + self.bar_offset,
+                    trade.barclose + self.bar_offset,
+                    self.sizes.pop(trade.ref, 1.0 if trade.long else -1.0),
+                    trade.price,
+                    np.nan,
+                    np.nan,
+                    trade.pnl,
+                    trade.pnlcomm,
+                    trade.commission,
+                )
+            )
+
+    def period_key(self, num: float):
+        """Key of the period of a bar, as TimeReturn on the timeframe of the data."""
+        return period_key(
+            bt.num2date(num), self.data._timeframe, self.data._compression
+        )
+
+    def get_analysis(self) -> dict:
+        """
+        Get the records as arrays.
+
+        Returns:
+            dict: equity, stamps (int64 ns), trades (TRADE_DTYPE, the open ones with
+            exit_bar -1), startcash, and start and end (period keys of the first
+            and last bars, as the TimeReturn analyzer).
+        """
+        open_trades = [
+            (0, -1, size, np.nan, np.nan, np.nan, 0.0, 0.0, 0.0)
+            for size in self.sizes.values()
+        ]
+        nums = np.array(self.nums, dtype=np.float64)
+
+        return dict(
+            equity=np.array(self.values, dtype=np.float64),
+            stamps=num2date_array(nums),
+            trades=np.array(self.trades + open_trades, dtype=TRADE_DTYPE),
+            startcash=self.startcash,
+            start=self.period_key(nums[0]) if len(nums) else None,
+            end=self.period_key(nums[-1]) if len(nums) else None,
+        )
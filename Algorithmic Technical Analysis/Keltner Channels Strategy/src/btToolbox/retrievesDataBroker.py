@@ -1,22 +1,97 @@
 import config
 
+import os
+
 import backtrader as bt
 
+import ccxt
+import ccxt.async_support as ccxt_async
+
 from ccxtbt import CCXTStore
 
 from typing import Type
 
 import time
-from datetime import datetime, timedelta
 
+from . import columnarStore
+from .asyncFeed import AsyncCandleFeed, AsyncMarketData
+from .latencyTracker import LatencyTracker
+from . import dataCatalog
+from . import fakeExchange
+from . import loggingUtils
+from . import ohlcvDownloader
+from . import streamingKC
+
+# Bars of local history replayed at startup, in multiples of the longest period of the
+#   indicators: enough for the EMA and the ATR to forget their seed
+WARM_UP_PERIODS = 10
+
+# backtrader timeframe and compression of each timeframe
+TIMEFRAMES = {
+    "1m": (bt.TimeFrame.Minutes, 1),
+    "1h": (bt.TimeFrame.Minutes, 60),
+    "1d": (bt.TimeFrame.Days, 1),
+}
+
+
+class WarmCCXTFeed(CCXTStore.DataCls):
+    """
+    CCXT data feed that replays bars of the local store before going live.
+
+    Params:
+        - warm_bars (list | None): Closed candles [timestamp (ms), open, high, low,
+            close, volume] to replay, oldest first. The feed then fetches only the
+            candles after the last one.
+        - latency (LatencyTracker | None): Tracker stamping the arrival of the live
+            candles.
+    """
+
+    params = (
+        ("warm_bars", None),
+        ("latency", None),
+    )
+
+    def start(self) -> None:
+        """
+        Queue the local bars, then start the live feed.
+        """
+        self._warm_left = 0
+        if self.p.warm_bars:
+            # Queued ahead of the exchange data: only newer candles are fetched
+            self._data.extend(self.p.warm_bars)
+            self._last_ts = self.p.warm_bars[-1][0]
+            self._warm_left = len(self.p.warm_bars)
+
+        super().start()
+
+    def _load(self) -> bool | None:
+        """
+        Load the next candle, stamping the arrival of the live ones.
+        """
+        if self._warm_left and self._state != self._ST_OVER:
+            # Local bars popped from the queue as they are: live, CCXTFeed would
+            #   fetch from the exchange before each of them
+            self._warm_left -= 1
+            return self._load_ohlcv()
+
+        ret = super()._load()
+        if ret and self.p.latency is not None:
+            self.p.latency.arrived(self, self.store.exchange.milliseconds)
 
-def set_store(exchange_id: str, currency_trade: str) -> CCXTStore:
+        return ret
+
+
+def set_store(
+    exchange_id: str, currency_trade: str, data_args: dict | None = None
+) -> CCXTStore:
     """
     Set up and return a CCXTStore instance.
 
     Args:
         exchange_id (str): Identifier for the exchange.
         currency_trade (str): Currency used for trading.
+        data_args (dict | None): Dictionary containing data-related arguments, needed
+            by the local exchange simulator.
 
     Returns:
         CCXTStore: Configured CCXTStore instance.
@@ -28,6 +103,10 @@ def set_store(exchange_id: str, currency_trade: str) -> CCXTStore:
         "enableRateLimit": True,
         "nonce": lambda: str(int(time.time() * 1000)),
     }
+    if exchange_id == fakeExchange.EXCHANGE_ID:
+        store_config.update(retrives_fake_config(currency_trade, data_args))
+        # CCXTStore creates the exchange by its ccxt class name
+        setattr(ccxt, exchange_id, fakeExchange.FakeExchange)
 
     store = CCXTStore(
         exchange=exchange_id,
@@ -40,8 +119,184 @@ def set_store(exchange_id: str, currency_trade: str) -> CCXTStore:
     return store
 
 
-def retrieves_data(
+def retrives_fake_config(currency_trade: str, data_args: dict) -> dict:
+    """
+    Build the config of the local exchange simulator, replaying the local data of the
+    traded assets from data_args["fromdate"].
+
+    Args:
+        currency_trade (str): Currency used for trading.
+        data_args (dict): Dictionary containing data-related arguments.
+
+    Returns:
+        dict: Config of fakeExchange.FakeExchange.
+    """
+    # Imported only here: the backtesting data sources are not needed to trade live
+    from .backtestingRetrivesDatas import (
+        retireves_data_path,
+        retrives_catalog_directory,
+    )
+
+    directories = {}
+    for curr_traded in data_args["nameasset"]:
+        name_asset = curr_traded + "/" + currency_trade
+        if name_asset == "BTC/USDT" and data_args["timeframe"] == "1h":
+            directories[name_asset] = columnarStore.ensure_csv_cache(
+                retireves_data_path("binance.csv")
+            )
+        else:
+            directories[name_asset] = retrives_catalog_directory(
+                name_asset, data_args["timeframe"]
+            )
+
+    return dict(
+        directories=directories,
+        timeframe=data_args["timeframe"],
+        start=streamingKC.datetime_to_ns(data_args["fromdate"]) // 1000000,
+        speed=data_args["fakeSpeed"],
+        latency=data_args["fakeLatency"] / 1000.0,
+        balance={currency_trade: float(data_args["startcash"])},
+    )
+
+
+def retrives_state_directory(exchange_id: str) -> str:
+    """
+    Get the directory of the saved Keltner Channels states of the live strategy.
+
+    Args:
+        exchange_id (str): Identifier for the exchange: each one has its own states,
+            since their bars differ.
+
+    Returns:
+        str: The full path of the directory.
+    """
+    return os.path.join(os.path.dirname(__file__), "../../datacsv/state", exchange_id)
+
+
+def retrives_live_catalog_root(exchange_id: str) -> str:
+    """
+    Get the root directory of the local data catalog of the live exchange, apart
+    from the backtesting one since the live store trades on the sandbox.
+
+    Args:
+        exchange_id (str): Identifier for the exchange.
+
+    Returns:
+        str: The full path of the catalog root.
+    """
+    return os.path.join(os.path.dirname(__file__), "../../datacsv/live", exchange_id)
+
+
+def retrives_warm_bars(
+    store: CCXTStore, name_asset: str, timeframe: str, since: int, exchange_id: str
+) -> list:
+    """
+    Bring the local store of an asset up to date and read its recent bars.
+
+    Only the candles after the last stored one are downloaded from the exchange (the
+    whole window the first time).
+
+    Args:
+        store (CCXTStore): CCXTStore instance.
+        name_asset (str): Symbol such as 'BTC/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        since (int): Open time (ns since epoch) of the first bar to replay.
+        exchange_id (str): Identifier for the exchange.
+
+    Returns:
+        list: Closed candles [timestamp (ms), open, high, low, close, volume], oldest
+        first.
+    """
+    root = retrives_live_catalog_root(exchange_id)
+    directory = dataCatalog.symbol_directory(root, name_asset, timeframe)
+
+    # Fetch the gap between the last stored candle and now
+    ohlcvDownloader.refresh(
+        store.exchange, name_asset, timeframe, since // 1000000, directory
+    )
+    dataCatalog.register(root, name_asset, timeframe)
+
+    # Only the bars to replay, found by binary search on the sorted timestamps, up to
+    #   the last closed candle (a simulated exchange may be behind the store)
+    step = ohlcvDownloader.timeframe_to_ms(timeframe)
+    last_closed = (store.exchange.milliseconds() // step) * step - step
+    stamps, columns = columnarStore.read_columns(
+        directory, start=since, end=(last_closed + 1) * 1000000
+    )
+
+    return [
+        [stamp // 1000000, open_, high, low, close, volume]
+        for stamp, open_, high, low, close, volume in zip(
+            stamps.tolist(),
+            columns["Open"].tolist(),
+            columns["High"].tolist(),
+            columns["Low"].tolist(),
+            columns["Close"].tolist(),
+            columns["Volume"].tolist(),
+        )
+    ]
+
+
+def retrives_warm_start(
     curr_traded: str, currency_trade: str, store: CCXTStore, data_args: dict
+) -> (int, int, list):
+    """
+    Retrieve the backtrader timeframe and the bars to replay at startup.
+
+    Args:
+        curr_traded (str): Symbol of the traded asset.
+        currency_trade (str): Currency used for trading.
+        store (CCXTStore): CCXTStore instance.
+        data_args (dict): Dictionary containing data-related arguments.
+
+    Returns:
+        int: backtrader timeframe.
+        int: Compression.
+        list: Closed candles [timestamp (ms), open, high, low, close, volume] to
+        replay, oldest first.
+    """
+    name_asset = curr_traded + "/" + currency_trade
+
+    if data_args["timeframe"] not in TIMEFRAMES:
+        exit("ERROR: TIMEFRAME %s NOT SUPPORTED" % data_args["timeframe"])
+    timeframe, compression = TIMEFRAMES[data_args["timeframe"]]
+    step = ohlcvDownloader.timeframe_to_ms(data_args["timeframe"]) * 1000000
+
+    # Warm-up window, from the last closed candle backwards
+    warm_up = WARM_UP_PERIODS * max(data_args["periodEMA"], data_args["periodATR"] + 1)
+    now = store.exchange.milliseconds() * 1000000
+    hist_start = (now // step - warm_up - 1) * step
+
+    # Warm state saved by a previous run: only the bars after it are needed
+    state = streamingKC.load_state(
+        streamingKC.state_path(
+            retrives_state_directory(data_args["exchangeId"]),
+            curr_traded,
+            timeframe,
+            compression,
+            data_args["periodEMA"],
+            data_args["periodATR"],
+        ),
+        data_args["periodEMA"],
+        data_args["periodATR"],
+    )
+    if streamingKC.bands(state) is not None and state["last_stamp"] < now:
+        # Resumed from the last bar of the state, even if older than the window
+        hist_start = state["last_stamp"]
+
+    warm_bars = retrives_warm_bars(
+        store, name_asset, data_args["timeframe"], hist_start, data_args["exchangeId"]
+    )
+
+    return timeframe, compression, warm_bars
+
+
+def retrieves_data(
+    curr_traded: str,
+    currency_trade: str,
+    store: CCXTStore,
+    data_args: dict,
+    latency: LatencyTracker | None = None,
 ) -> Type[CCXTStore.DataCls]:
     """
     Retrieve data using CCXTStore based on specified parameters.
@@ -51,6 +306,7 @@ def retrieves_data(
         currency_trade (str): Currency used for trading.
         store (CCXTStore): CCXTStore instance.
         data_args (dict): Dictionary containing data-related arguments.
+        latency (LatencyTracker | None): Tracker of the live loop latency.
 
     Returns:
         Type[CCXTStore.DataCls]: Retrieved data instance.
@@ -60,34 +316,109 @@ def retrieves_data(
 
     # TODO: Fix why cannot see price cost and comm when open and close a position
 
-    minutes_past = data_args["periodEMA"]
-
-    if data_args["timeframe"] == "1h":
-        minutes_past *= 65
-        compression_minutes = 60
-    elif data_args["timeframe"] == "1m":
-        minutes_past += 2
-        compression_minutes = 1
-    else:  # 1d
-        # TODO
-        exit("COMING SOON IMPLEMENTATION 1d")
+    timeframe, compression, warm_bars = retrives_warm_start(
+        curr_traded, currency_trade, store, data_args
+    )
+
     debug = True if data_args["levelDebug"] >= 2 else False
     # Get our data
     # Drop newest will prevent us from loading partial data from incomplete candles
-    hist_start_date = datetime.utcnow() - timedelta(minutes=minutes_past)
-    data = store.getdata(
+    data = WarmCCXTFeed(
         dataname=name_asset,
         name=name,
-        timeframe=bt.TimeFrame.Minutes,
-        fromdate=hist_start_date,
-        compression=compression_minutes,
+        timeframe=timeframe,
+        compression=compression,
         drop_newest=data_args["dropNewest"],
         debug=debug,
-    )  # , historical=True)
+        warm_bars=warm_bars,
+        latency=latency,
+    )
 
     return data
 
 
+def set_async_market_data(
+    exchange_id: str,
+    store: CCXTStore,
+    data_args: dict,
+    logger: loggingUtils.JsonLinesLogger | None = None,
+) -> AsyncMarketData:
+    """
+    Set up the concurrent polling of the candles of all the traded assets.
+
+    Args:
+        exchange_id (str): Identifier for the exchange.
+        store (CCXTStore): CCXTStore instance.
+        data_args (dict): Dictionary containing data-related arguments.
+        logger (JsonLinesLogger | None): Logger of the polling errors, None to print.
+
+    Returns:
+        AsyncMarketData: The market data, to start once all the assets are added.
+    """
+    if exchange_id == fakeExchange.EXCHANGE_ID:
+        # Same clock and data as the simulator of the store
+        return AsyncMarketData(
+            fakeExchange.AsyncFakeExchange(store.exchange),
+            data_args["timeframe"],
+            speed=store.exchange.speed,
+            logger=logger,
+        )
+
+    # Public market data only: no credentials needed
+    exchange = getattr(ccxt_async, exchange_id)({"enableRateLimit": False})
+    # Same sandbox as the CCXTStore
+    exchange.set_sandbox_mode(True)
+
+    return AsyncMarketData(exchange, data_args["timeframe"], logger=logger)
+
+
+def retrieves_async_data(
+    curr_traded: str,
+    currency_trade: str,
+    store: CCXTStore,
+    market_data: AsyncMarketData,
+    data_args: dict,
+    latency: LatencyTracker | None = None,
+) -> AsyncCandleFeed:
+    """
+    Retrieve a data feed of an asset polled by the shared asyncio market data.
+
+    Args:
+        curr_traded (str): Symbol of the traded asset.
+        currency_trade (str): Currency used for trading.
+        store (CCXTStore): CCXTStore instance, for the warm-up bars.
+        market_data (AsyncMarketData): Shared market data, not started yet.
+        data_args (dict): Dictionary containing data-related arguments.
+        latency (LatencyTracker | None): Tracker of the live loop latency.
+
+    Returns:
+        AsyncCandleFeed: Retrieved data instance.
+    """
+    name_asset = curr_traded + "/" + currency_trade
+
+    timeframe, compression, warm_bars = retrives_warm_start(
+        curr_traded, currency_trade, store, data_args
+    )
+
+    # Polled from the candle after the last replayed one
+    step = market_data.step
+    if warm_bars:
+        since = warm_bars[-1][0] + step
+    else:
+        since = (market_data.exchange.milliseconds() // step) * step
+    candles = market_data.subscribe(name_asset, since)
+
+    return AsyncCandleFeed(
+        name=curr_traded + currency_trade,
+        timeframe=timeframe,
+        compression=compression,
+        candles=candles,
+        warm_bars=warm_bars,
+        latency=latency,
+        clock=market_data.exchange.milliseconds,
+    )
+
+
 def retrive_broker_mapping(exchange_id: str) -> dict:
     """
     Retrieve broker mapping for order types and order status.
@@ -98,7 +429,8 @@ def retrive_broker_mapping(exchange_id: str) -> dict:
     Returns:
         dict: Broker mapping for order types and status.
     """
-    if exchange_id == "binance":
+    if exchange_id in ("binance", fakeExchange.EXCHANGE_ID):
+        # The local exchange simulator accepts the Binance order types
         broker_mapping = {
             "order_types": {
                 bt.Order.Market: "MARKET",
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import backtrader as bt
+
+from . import experimentStore
+
+# Results of whole runs, next to the indicator cache
+CACHE_DIRECTORY = os.path.join(os.path.dirname(__file__), "../../datacsv/.cache/runs")
+
+# Size of the cache on disk, least recently used runs evicted first
+MAX_DISK_BYTES = 256 * 1024 * 1024
+
+# Modules whose code determines the result of a run: editing any of them
+#   invalidates the cached runs. loggingUtils holds notify_order, which tracks the
+#   orders and positions of the strategy, and backtestingRetrivesDatas the broker
+#   setup of every backtest (set_broker)
+SOURCE_MODULES = (
+    "arrayFeed",
+    "backtestingRetrivesDatas",
+    "checkpointKC",
+    "indicatorCache",
+    "indicatorKC",
+    "loggingUtils",
+    "performanceAnalytics",
+    "strategyKC",
+    "streamingKC",
+    "vectorizedKC",
+)
+
+# Hash of the source of SOURCE_MODULES, computed once per process
+_source_hash = None
+
+
+def source_hash() -> str:
+    """
+    Hash the source code of the strategy, the indicators and the data feeds.
+
+    Returns:
+        str: Hexadecimal SHA-256 of the files and of the backtrader version.
+    """
+    global _source_hash
+    if _source_hash is None:
+        digest = hashlib.sha256(bt.__version__.encode())
+        for name in SOURCE_MODULES:
+            with open(os.path.join(os.path.dirname(__file__), name + ".py"), "rb") as f:
+                digest.update(f.read())
+        _source_hash = digest.hexdigest()
+
+    return _source_hash
+
+
+def run_key(data_args: dict, strategy_params: dict, data_analisys_list: list) -> str:
+    """
+    Build the key of a run from everything its result depends on.
+
+    Args:
+        data_args (dict): Dictionary containing data-related arguments.
+        strategy_params (dict): Parameters of the strategy, see retrives_strategy.
+        data_analisys_list (list): OHLCV data of each asset, in DataFrame format.
+
+    Returns:
+        str: Hexadecimal SHA-256, also used as file name.
+    """
+    content = dict(
+        data=experimentStore.data_fingerprint(data_analisys_list),
+        assets=data_args["nameasset"],
+        timeframe=data_args["timeframe"],
+        dtype=data_args["dtype"],
+        engine=data_args["engine"],
+        indicatorCache=data_args["indicatorCache"],
+        startcash=data_args["startcash"],
+        commission=data_args["commission"],
+        strategy=strategy_params,
+        source=source_hash(),
+    )
+
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get(key: str, directory: str = CACHE_DIRECTORY) -> (dict, dict) | None:
+    """
+    Look up a run.
+
+    Args:
+        key (str): Key of the run, see run_key.
+        directory (str): Directory of the cache.
+
+    Returns:
+        dict: Arrays of the run.
+        dict: Other values of the run.
+        None if the run is not cached.
+    """
+    path = os.path.join(directory, key + ".npz")
+    try:
+        with np.load(path, allow_pickle=False) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+    except (OSError, ValueError):
+        return None
+
+    # Recently used: the cache evicts by modification time
+    os.utime(path)
+    meta = json.loads(arrays.pop("_meta").item())
+
+    return arrays, meta
+
+
+def put(key: str, arrays: dict, meta: dict, directory: str = CACHE_DIRECTORY) -> None:
+    """
+    Store a run.
+
+    Args:
+        key (str): Key of the run, see run_key.
+        arrays (dict): Arrays of the run, e.g. equity and trades.
+        meta (dict): Other values of the run, serializable to JSON.
+        directory (str): Directory of the cache.
+
+    Returns:
+        None
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Written aside then renamed: a concurrent reader never sees a partial file
+    path = os.path.join(directory, key + ".npz")
+    tmp_path = "%s.%d.tmp.npz" % (path[:-4], os.getpid())
+    np.savez(tmp_path, _meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+    _evict_disk(directory)
+
+
+def _evict_disk(directory: str) -> None:
+    """Remove the least recently used runs beyond MAX_DISK_BYTES."""
+    with os.scandir(directory) as entries:
+        files = [
+            (entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+            for entry in entries
+            if entry.name.endswith(".npz") and ".tmp." not in entry.name
+        ]
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= MAX_DISK_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # Already removed by another process
+            pass
+        total -= size
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Alignment (bytes) of each array in the shared block
+ALIGNMENT = 64
+
+
+def publish(arrays: dict) -> (shared_memory.SharedMemory, dict):
+    """
+    Copy arrays once into a single shared memory block.
+
+    Args:
+        arrays (dict): Name -> 1-D NumPy array.
+
+    Returns:
+        shared_memory.SharedMemory: The block, to be released by the owner with
+            release(shm, unlink=True) once the workers are done.
+        dict: Handle of the block (name and layout), small and picklable, from which
+            the workers attach to the arrays.
+    """
+    layout = []
+    offset = 0
+    for name, values in arrays.items():
+        values = np.asarray(values)
+        layout.append((name, values.dtype.str, offset, len(values)))
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (name, dtype, start, length), values in zip(layout, arrays.values()):
+        np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=start)[:] = values
+
+    return shm, dict(name=shm.name, layout=layout)
+
+
+def attach(handle: dict) -> (shared_memory.SharedMemory, dict):
+    """
+    Attach to a block published by publish, without copying the arrays.
+
+    Args:
+        handle (dict): Handle returned by publish.
+
+    Returns:
+        shared_memory.SharedMemory: The block, to keep referenced while the arrays
+            are in use.
+        dict: Name -> read-only NumPy array backed by the block.
+    """
+    # The pool workers share the resource tracker of the owner, which unlinks the
+    #   block: attaching registers nothing new
+    shm = shared_memory.SharedMemory(name=handle["name"])
+
+    arrays = {}
+    for name, dtype, start, length in handle["layout"]:
+        values = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=start)
+        values.flags.writeable = False
+        arrays[name] = values
+
+    return shm, arrays
+
+
+def release(shm: shared_memory.SharedMemory, unlink: bool = False) -> None:
+    """
+    Close a shared memory block, and free it if this process owns it.
+
+    Args:
+        shm (shared_memory.SharedMemory): The block.
+        unlink (bool): Free the block, only by the process that published it.
+
+    Returns:
+        None
+    """
+    shm.close()
+    if unlink:
+        shm.unlink()
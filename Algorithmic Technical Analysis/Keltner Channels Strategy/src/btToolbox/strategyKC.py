@@ -6,6 +6,7 @@ from __future__ import (
     annotations,
 )
 
+import time
 from datetime import datetime
 
 import backtrader as bt
@@ -16,6 +17,8 @@ from . import loggingUtils
 
 from . import indicatorKC as iKC
 
+from . import streamingKC
+
 from typing import Type
 
 
@@ -34,6 +37,15 @@ class KeltnerChannelsStrategy(bt.Strategy):
         - order_params_sell (float): Order parameter for sell orders (default: 0.8).
         - print_position (bool): Flag to print position information (default: True).
         - debug (bool): Flag for debug mode (default: False).
+        - state_directory (str | None): Directory where the Keltner Channels state of each
+            data is saved, to resume warm after a restart (default: None, bands recomputed
+            from the history).
+        - latency (LatencyTracker | None): Tracker of the latency from the candles to the
+            orders (default: None, not measured).
+        - metrics (StrategyMetrics | None): Metrics of the live loop to update (default:
+            None).
+        - logger (JsonLinesLogger | None): Non-blocking logger of the strategy output
+            (default: None, printed).
 
     Keltner Channels calcolati come segue:
         - atrlow = EMA - 2 * ATR
@@ -80,16 +92,48 @@ class KeltnerChannelsStrategy(bt.Strategy):
         order_params_sell=0.8,
         print_position=True,
         debug=False,
+        state_directory=None,
+        latency=None,
+        metrics=None,
+        logger=None,
     )
 
-    def log(self, txt: str, dt: datetime | float | None = None) -> None:
+    def log(
+        self,
+        txt: str,
+        dt: datetime | float | None = None,
+        level: str = "INFO",
+        **fields,
+    ) -> None:
         """Logging function for the strategy."""
-        loggingUtils.log(self, txt, dt)
+        loggingUtils.log(self, txt, dt, level, **fields)
 
     def notify_order(self, order: bt.Order) -> None:
         """Notification function for order events."""
+        if self.p.latency is not None:
+            self.p.latency.notified(order)
         loggingUtils.notify_order(self, order)
 
+    def buy(self, *args, **kwargs) -> bt.Order | None:
+        """Create a buy order, marking its submission for the latency tracker."""
+        order = super().buy(*args, **kwargs)
+        if self.p.latency is not None and order is not None:
+            self.p.latency.submitted(order)
+        return order
+
+    def cancel(self, order: bt.Order) -> None:
+        """Cancel an order, counted in the metrics."""
+        super().cancel(order)
+        if self.p.metrics is not None:
+            self.p.metrics.cancelled(order)
+
+    def sell(self, *args, **kwargs) -> bt.Order | None:
+        """Create a sell order, marking its submission for the latency tracker."""
+        order = super().sell(*args, **kwargs)
+        if self.p.latency is not None and order is not None:
+            self.p.latency.submitted(order)
+        return order
+
     def __init__(self) -> None:
         """
         Initialization method for the strategy.
@@ -97,9 +141,7 @@ class KeltnerChannelsStrategy(bt.Strategy):
         Initializes various attributes, indicators, and flags for the strategy.
         """
         self.orders = {}
-        self.ema = {}
         self.position_short_long = {}
-        self.ema = {}
         self.atrlow = {}
         self.atrhigh = {}
         self.keltner_channels = {}
@@ -112,13 +154,29 @@ class KeltnerChannelsStrategy(bt.Strategy):
             d_name = d._name
             self.orders[d_name] = None
             self.position_short_long[d_name] = 0
-            self.ema[d_name] = btind.EMA(d, period=self.p.period_EMA)
-            self.keltner_channels[d_name] = iKC.IndicatorKeltnerChannels(
-                d,
-                period_EMA=self.p.period_EMA,
-                period_ATR=self.p.period_ATR,
-                subplot=False,
-            )
+            if self.p.state_directory is None:
+                self.keltner_channels[d_name] = iKC.IndicatorKeltnerChannels(
+                    d,
+                    period_EMA=self.p.period_EMA,
+                    period_ATR=self.p.period_ATR,
+                    subplot=False,
+                )
+            else:
+                # Bands updated bar by bar from the saved state
+                self.keltner_channels[d_name] = iKC.StreamingKeltnerChannels(
+                    d,
+                    period_EMA=self.p.period_EMA,
+                    period_ATR=self.p.period_ATR,
+                    state_path=streamingKC.state_path(
+                        self.p.state_directory,
+                        d_name,
+                        d._timeframe,
+                        d._compression,
+                        self.p.period_EMA,
+                        self.p.period_ATR,
+                    ),
+                    subplot=False,
+                )
             self.flagsell[d_name] = -btind.CrossOver(
                 d.close,
                 self.keltner_channels[d_name].atrlow,
@@ -133,6 +191,14 @@ class KeltnerChannelsStrategy(bt.Strategy):
             )
             self.flagclose[d_name] = 0
 
+    def stop(self) -> None:
+        """
+        Save the last Keltner Channels state of each data when the strategy ends.
+        """
+        if self.p.state_directory is not None:
+            for keltner_channels in self.keltner_channels.values():
+                keltner_channels.save_state()
+
     def params_order(self, d: Type[btfeeds.BaseData], is_buy: bool = True) -> float:
         """
         Calculate order price based on specified parameters.
@@ -149,10 +215,28 @@ class KeltnerChannelsStrategy(bt.Strategy):
         else:
             price = d.low * (1.0 - self.p.order_params_sell / 100.0)
         if self.p.debug == True:
-            print("Price DEBUG: ", price)
+            loggingUtils.write(self, "Price DEBUG: %s" % price, level="DEBUG")
         return price
 
     def next(self) -> None:
+        """
+        Executed on each data point: runs next_datas, timed for the latency tracker
+        and the metrics.
+        """
+        if self.p.latency is None and self.p.metrics is None:
+            self.next_datas()
+            return
+
+        start = time.perf_counter()
+        if self.p.latency is not None:
+            self.p.latency.enter_next(self.datas)
+        self.next_datas()
+        if self.p.latency is not None:
+            self.p.latency.exit_next(self.datas)
+        if self.p.metrics is not None:
+            self.p.metrics.observe_next(self, time.perf_counter() - start)
+
+    def next_datas(self) -> None:
         """
         Main strategy logic executed on each data point.
 
@@ -170,7 +254,9 @@ class KeltnerChannelsStrategy(bt.Strategy):
             if self.orders[d_name]:
                 # if (self.orders[d_name].isbuy() and self.flagbuy[d_name] < 0) or (self.orders[d_name].issell()
                 #   and self.flagsell[d_name] < 0):
-                loggingUtils.log(self, "%s - PENDING... CANCEL!!!" % d_name)
+                loggingUtils.log(
+                    self, "%s - PENDING... CANCEL!!!" % d_name, symbol=d_name
+                )
                 self.cancel(self.orders[d_name])
                 return
 
@@ -182,16 +268,22 @@ class KeltnerChannelsStrategy(bt.Strategy):
                     if self.flagbuy[d_name] < 0:
                         # order = exchange.create_order(symbol, operation, side, amount)
                         self.close(data=d, size=size)
-                        loggingUtils.log(self, "%s - CLOSE ALL LONG POSIZION" % d_name)
+                        loggingUtils.log(
+                            self, "%s - CLOSE ALL LONG POSIZION" % d_name, symbol=d_name
+                        )
                         self.flagclose[d_name] = 1
                 # short
                 elif self.position_short_long[d_name] < 0:
                     if self.flagsell[d_name] < 0:
                         self.close(data=d, size=size)
-                        loggingUtils.log(self, "%s - CLOSE ALL SHORT POSITION" % d_name)
+                        loggingUtils.log(
+                            self, "%s - CLOSE ALL SHORT POSITION" % d_name, symbol=d_name
+                        )
                         self.flagclose[d_name] = 1
                 else:
-                    loggingUtils.log(self, "%s ERROR POSITION" % d_name)
+                    loggingUtils.log(
+                        self, "%s ERROR POSITION" % d_name, level="ERROR", symbol=d_name
+                    )
                     exit(-1)
                 return
 
@@ -212,7 +304,9 @@ class KeltnerChannelsStrategy(bt.Strategy):
                     stopprice=price * (1 - self.p.stopprice),
                     stopLossPrice=price * (1 - self.p.stopprice),
                 )
-                loggingUtils.log(self, "%s - BUY Create: %.2f" % (d_name, price))
+                loggingUtils.log(
+                    self, "%s - BUY Create: %.2f" % (d_name, price), symbol=d_name
+                )
             elif self.flagsell[d_name] > 0:
                 price = self.params_order(d, False)
                 risk_amount = (self.p.risk_amount_sell / 100) * self.broker.getcash()
@@ -226,4 +320,6 @@ class KeltnerChannelsStrategy(bt.Strategy):
                     stopprice=price * (1 + self.p.stopprice),
                     stopLossPrice=price * (1 + self.p.stopprice),
                 )
-                loggingUtils.log(self, "%s - SELL Create: %.2f" % (d_name, price))
+                loggingUtils.log(
+                    self, "%s - SELL Create: %.2f" % (d_name, price), symbol=d_name
+                )
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import calendar
+import json
+import math
+import os
+from datetime import datetime
+
+
+def new_state(period_EMA: int, period_ATR: int) -> dict:
+    """
+    Create the state of the streaming Keltner Channels.
+
+    The state is a plain dictionary of numbers, serializable as JSON. The EMA and
+    the Wilder ATR are seeded, as in backtrader, with the arithmetic mean of their
+    first period values, which are kept only until then.
+
+    Args:
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+
+    Returns:
+        dict: The state, with no bar seen yet.
+    """
+    return dict(
+        period_EMA=period_EMA,
+        period_ATR=period_ATR,
+        ema=None,
+        ema_seed=[],
+        atr=None,
+        atr_seed=[],
+        prev_close=None,
+        last_stamp=None,
+    )
+
+
+def _smooth(
+    state: dict, name: str, value: float, period: int, alpha: float
+) -> None:
+    """Update an exponential smoothing of the state with a new value."""
+    if state[name] is None:
+        seed = state[name + "_seed"]
+        seed.append(value)
+        if len(seed) == period:
+            state[name] = math.fsum(seed) / period
+            state[name + "_seed"] = []
+    else:
+        state[name] = state[name] * (1.0 - alpha) + value * alpha
+
+
+def update(
+    state: dict, high: float, low: float, close: float, stamp: int | None = None
+) -> (float, float) | None:
+    """
+    Update the state with a new bar, in constant time.
+
+    Bars not newer than the last one seen are ignored, so that replaying bars
+    already in the state (e.g. after a restart) leaves it unchanged.
+
+    Args:
+        state (dict): The state, see new_state.
+        high (float): High price of the bar.
+        low (float): Low price of the bar.
+        close (float): Close price of the bar.
+        stamp (int | None): Timestamp of the bar (ns since epoch).
+
+    Returns:
+        (float, float) | None: The bands (atrlow, atrhigh), None while warming up.
+    """
+    if stamp is not None and state["last_stamp"] is not None:
+        if stamp <= state["last_stamp"]:
+            return bands(state)
+
+    period_EMA = state["period_EMA"]
+    period_ATR = state["period_ATR"]
+    _smooth(state, "ema", close, period_EMA, 2.0 / (1.0 + period_EMA))
+
+    # True range needs the previous close: the first bar has no value
+    prev_close = state["prev_close"]
+    if prev_close is not None:
+        true_range = max(high, prev_close) - min(low, prev_close)
+        _smooth(state, "atr", true_range, period_ATR, 1.0 / period_ATR)
+
+    state["prev_close"] = close
+    if stamp is not None:
+        state["last_stamp"] = stamp
+
+    return bands(state)
+
+
+def bands(state: dict) -> (float, float) | None:
+    """
+    Get the current Keltner Channels bands.
+
+    Args:
+        state (dict): The state, see new_state.
+
+    Returns:
+        (float, float) | None: The bands (atrlow, atrhigh), None while warming up.
+    """
+    if state["ema"] is None or state["atr"] is None:
+        return None
+
+    atr_x_2 = state["atr"] * 2
+
+    return state["ema"] - atr_x_2, state["ema"] + atr_x_2
+
+
+def datetime_to_ns(dt: datetime) -> int:
+    """
+    Convert a naive UTC datetime to a timestamp.
+
+    Args:
+        dt (datetime): Naive datetime, in UTC.
+
+    Returns:
+        int: Nanoseconds since epoch.
+    """
+    return (calendar.timegm(dt.utctimetuple()) * 1000000 + dt.microsecond) * 1000
+
+
+def state_path(
+    directory: str,
+    name: str,
+    timeframe: int,
+    compression: int,
+    period_EMA: int,
+    period_ATR: int,
+) -> str:
+    """
+    Get the file of the state of an asset.
+
+    Args:
+        directory (str): Directory of the states.
+        name (str): Name of the data feed of the asset.
+        timeframe (int): backtrader timeframe of the bars.
+        compression (int): Compression of the bars.
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+
+    Returns:
+        str: The full path of the state file.
+    """
+    return os.path.join(
+        directory,
+        "%s-%d-%d-%d-%d.json" % (name, timeframe, compression, period_EMA, period_ATR),
+    )
+
+
+def save_state(state: dict, path: str) -> None:
+    """
+    Save a state to disk, replacing the previous one atomically.
+
+    Args:
+        state (dict): The state, see new_state.
+        path (str): The file of the state.
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_state(path: str, period_EMA: int, period_ATR: int) -> dict:
+    """
+    Load a state from disk, or create a new one.
+
+    Args:
+        path (str): The file of the state.
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+
+    Returns:
+        dict: The saved state if it exists and has the same periods, a new one
+        otherwise.
+    """
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return new_state(period_EMA, period_ATR)
+
+    if state.get("period_EMA") != period_EMA or state.get("period_ATR") != period_ATR:
+        return new_state(period_EMA, period_ATR)
+
+    return state
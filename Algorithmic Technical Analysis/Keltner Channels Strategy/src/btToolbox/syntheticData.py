@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from . import columnarStore
+from . import dataCatalog
+from . import ohlcvDownloader
+
+# Milliseconds in a year, to scale the annualized volatility and drift to a bar
+YEAR_MS = 365 * 24 * 60 * 60 * 1000
+
+# Bars per block of the bootstrap: whole blocks keep the volatility clustering
+BOOTSTRAP_BLOCK = 24
+
+# Intrabar range relative to the volatility of the bar
+RANGE_FACTOR = 0.5
+
+
+def regime_multipliers(
+    bars: int, regimes: list, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Draw the volatility multiplier of each bar from switching regimes.
+
+    The series is split into segments of random (geometric) length, each in a
+    regime drawn at random among the others.
+
+    Args:
+        bars (int): Number of bars.
+        regimes (list): (volatility multiplier, mean length in bars) of each
+            regime, e.g. [(1.0, 2000), (3.0, 200)] for rare volatile periods.
+        rng (np.random.Generator): Random generator.
+
+    Returns:
+        np.ndarray: float64 multiplier of each bar.
+    """
+    if not regimes:
+        return np.ones(bars)
+
+    multipliers = np.array([regime[0] for regime in regimes], dtype=np.float64)
+    lengths = np.array([regime[1] for regime in regimes], dtype=np.float64)
+
+    # Enough segments on average, drawn at once and extended if still too short
+    segments = int(bars / lengths.min()) + 2
+    regime = []
+    length = []
+    total = 0
+    current = rng.integers(len(regimes))
+    while total < bars:
+        # Next regime differs from the current one when there is a choice
+        steps = rng.integers(1, max(len(regimes), 2), size=segments)
+        chosen = (current + np.cumsum(steps)) % len(regimes)
+        drawn = rng.geometric(1.0 / lengths[chosen])
+        regime.append(chosen)
+        length.append(drawn)
+        total += int(drawn.sum())
+        current = chosen[-1]
+
+    return np.repeat(multipliers[np.concatenate(regime)], np.concatenate(length))[
+        :bars
+    ]
+
+
+def gbm_returns(
+    bars: int, sigma: float, mu: float, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Draw the log returns of a geometric Brownian motion.
+
+    Args:
+        bars (int): Number of bars.
+        sigma (float): Volatility of one bar.
+        mu (float): Drift of one bar.
+        rng (np.random.Generator): Random generator.
+
+    Returns:
+        np.ndarray: float64 log return of each bar, with unit volatility
+        multiplier.
+    """
+    return rng.standard_normal(bars) * sigma + (mu - 0.5 * sigma * sigma)
+
+
+def bootstrap_returns(
+    bars: int,
+    source: np.ndarray,
+    rng: np.random.Generator,
+    block: int = BOOTSTRAP_BLOCK,
+) -> np.ndarray:
+    """
+    Resample log returns by blocks of consecutive bars (moving block bootstrap).
+
+    Args:
+        bars (int): Number of bars.
+        source (np.ndarray): Historical log returns.
+        rng (np.random.Generator): Random generator.
+        block (int): Bars per block.
+
+    Returns:
+        np.ndarray: float64 log return of each bar.
+    """
+    block = max(1, min(block, len(source)))
+    starts = rng.integers(0, len(source) - block + 1, size=math.ceil(bars / block))
+    index = (starts[:, None] + np.arange(block)).ravel()[:bars]
+
+    return source[index]
+
+
+def source_returns(csv_path: str) -> np.ndarray:
+    """
+    Get the log returns of the closes of an OHLCV CSV file, e.g. binance.csv.
+
+    Args:
+        csv_path (str): The path of the CSV file.
+
+    Returns:
+        np.ndarray: float64 log returns.
+    """
+    stamps, columns = columnarStore.read_columns(
+        columnarStore.ensure_csv_cache(csv_path)
+    )
+
+    return np.diff(np.log(columns["Close"]))
+
+
+def generate(
+    bars: int,
+    timeframe: str = "1h",
+    start: str = "2000-01-01",
+    method: str = "gbm",
+    price: float = 30000.0,
+    volatility: float = 0.6,
+    drift: float = 0.0,
+    regimes: list | None = None,
+    gap_probability: float = 0.0,
+    gap_length: float = 10.0,
+    volume: float = 1000.0,
+    source: np.ndarray | None = None,
+    seed: int | None = None,
+) -> (np.ndarray, dict):
+    """
+    Generate a realistic OHLCV series, vectorized.
+
+    Each bar opens at the previous close. The high and the low extend beyond the
+    open and the close by a random share of the volatility of the bar, and the
+    volume grows with the size of the move. Gaps are missing bars, as during an
+    exchange outage: the price keeps moving, so the bar after a gap opens away
+    from the last close before it.
+
+    Args:
+        bars (int): Number of bars generated, before removing the gaps.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        start (str): Datetime of the first bar.
+        method (str): 'gbm' for a geometric Brownian motion, 'bootstrap' to
+            resample the returns of source.
+        price (float): Open of the first bar.
+        volatility (float): Annualized volatility of the GBM.
+        drift (float): Annualized drift of the GBM.
+        regimes (list | None): (volatility multiplier, mean length in bars) of
+            each volatility regime, see regime_multipliers; None for a constant
+            volatility.
+        gap_probability (float): Probability that a gap starts at each bar.
+        gap_length (float): Mean length of a gap, in bars.
+        volume (float): Median volume of a bar.
+        source (np.ndarray | None): Historical log returns, for 'bootstrap'.
+        seed (int | None): Seed of the random generator, for a reproducible
+            series.
+
+    Returns:
+        np.ndarray: int64 timestamps (ns since epoch).
+        dict: Column name (as in the local store) -> float64 array.
+    """
+    rng = np.random.default_rng(seed)
+    step_ms = ohlcvDownloader.timeframe_to_ms(timeframe)
+
+    if method == "gbm":
+        sigma = volatility * math.sqrt(step_ms / YEAR_MS)
+        returns = gbm_returns(bars, sigma, drift * step_ms / YEAR_MS, rng)
+    elif method == "bootstrap":
+        if source is None or len(source) < 2:
+            exit("ERROR: BOOTSTRAP NEEDS THE RETURNS OF A SOURCE")
+        sigma = float(np.std(source))
+        returns = bootstrap_returns(bars, source, rng)
+    else:
+        exit("ERROR: METHOD MUST BE GBM OR BOOTSTRAP")
+
+    # Volatility of each bar, scaled by its regime
+    multipliers = regime_multipliers(bars, regimes or [], rng)
+    returns = returns * multipliers
+    sigma_bar = sigma * multipliers
+
+    close = price * np.exp(np.cumsum(returns))
+    open_ = np.empty(bars)
+    open_[0] = price
+    open_[1:] = close[:-1]
+
+    # Wicks beyond the body, in units of the volatility of the bar
+    wicks = np.abs(rng.standard_normal((2, bars))) * sigma_bar * RANGE_FACTOR
+    high = np.maximum(open_, close) * np.exp(wicks[0])
+    low = np.minimum(open_, close) * np.exp(-wicks[1])
+
+    # Lognormal volume, higher on large moves
+    volumes = (
+        volume
+        * np.exp(0.5 * rng.standard_normal(bars))
+        * (1.0 + np.abs(returns) / np.maximum(sigma_bar, 1e-12))
+    )
+
+    stamps = (
+        pd.Timestamp(start).value
+        + np.arange(bars, dtype=np.int64) * step_ms * 1000000
+    )
+
+    keep = np.ones(bars, dtype=bool)
+    if gap_probability > 0:
+        # Gaps start at random bars and last a geometric number of bars
+        gap_starts = np.flatnonzero(rng.random(bars) < gap_probability)
+        gap_ends = np.minimum(
+            gap_starts + rng.geometric(1.0 / gap_length, size=len(gap_starts)), bars
+        )
+        # +1 at each start, -1 at each end: bars inside a gap have a positive sum
+        depth = np.zeros(bars + 1, dtype=np.int64)
+        np.add.at(depth, gap_starts, 1)
+        np.add.at(depth, gap_ends, -1)
+        keep = np.cumsum(depth[:bars]) == 0
+        # The first bar is never missing: the series starts at price
+        keep[0] = True
+
+    columns = {
+        "Open": open_,
+        "High": high,
+        "Low": low,
+        "Close": close,
+        "Adj Close": close,
+        "Volume": volumes,
+    }
+
+    return stamps[keep], {name: values[keep] for name, values in columns.items()}
+
+
+def write(root: str, symbol: str, timeframe: str = "1h", **kwargs) -> dict:
+    """
+    Generate a series and store it in the local catalog, readable as the
+    downloaded data.
+
+    Args:
+        root (str): Root directory of the catalog.
+        symbol (str): Symbol such as 'SYN0/USDT'.
+        timeframe (str): Timeframe such as '1m', '1h' or '1d'.
+        **kwargs: Arguments of generate.
+
+    Returns:
+        dict: The manifest entry.
+    """
+    stamps, columns = generate(timeframe=timeframe, **kwargs)
+
+    # Parameters kept next to the data, the source returns excepted
+    meta = {
+        name: value
+        for name, value in kwargs.items()
+        if name != "source" and not isinstance(value, np.ndarray)
+    }
+    meta["generator"] = "syntheticData"
+
+    return dataCatalog.write(root, symbol, timeframe, stamps, columns, meta)
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pandas as pd
+
+# Structured dtype of the trade list produced by the vectorized engine
+TRADE_DTYPE = np.dtype(
+    [
+        ("entry_bar", np.int64),  # Bar index on which the entry order was filled
+        ("exit_bar", np.int64),  # Bar index on which the position was closed (-1 if open)
+        ("size", np.float64),  # Signed size: > 0 long, < 0 short
+        ("entry_price", np.float64),  # Size-weighted entry price
+        ("exit_price", np.float64),  # NaN while the trade is still open
+        ("stop_loss", np.float64),  # Stop-loss level attached to the entry order
+        ("pnl", np.float64),  # Gross profit and loss
+        ("pnlcomm", np.float64),  # Profit and loss net of entry and exit commission
+        ("commission", np.float64),  # Total commission paid on the trade
+    ]
+)
+
+
+def exponential_smoothing(
+    values: np.ndarray, period: int, alpha: float, start: int = 0
+) -> np.ndarray:
+    """
+    Exponential smoothing seeded with the arithmetic mean of the first period values.
+
+    Mirrors backtrader's ExponentialSmoothing so that the results are bit-identical.
+
+    Args:
+        values (np.ndarray): Input series.
+        period (int): Smoothing period.
+        alpha (float): Smoothing factor.
+        start (int): Index of the first valid input value.
+
+    Returns:
+        np.ndarray: Smoothed series, NaN before the first complete period.
+    """
+    out = np.full(len(values), np.nan)
+    seed = start + period - 1
+    if seed >= len(values):
+        return out
+
+    alpha1 = 1.0 - alpha
+    # Seed value from the arithmetic mean of the first period values
+    prev = math.fsum(values[start : seed + 1]) / period
+    out[seed] = prev
+
+    # The recurrence is inherently sequential: run it over plain Python floats
+    smoothed = [prev]
+    for x in values[seed + 1 :].tolist():
+        prev = prev * alpha1 + x * alpha
+        smoothed.append(prev)
+    out[seed:] = smoothed
+
+    return out
+
+
+def ema(close: np.ndarray, period: int) -> np.ndarray:
+    """
+    Exponential Moving Average, as btind.EMA.
+
+    Args:
+        close (np.ndarray): Close prices.
+        period (int): EMA period.
+
+    Returns:
+        np.ndarray: EMA series.
+    """
+    return exponential_smoothing(close, period, 2.0 / (1.0 + period))
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """
+    Wilder Average True Range, as btind.ATR.
+
+    Args:
+        high (np.ndarray): High prices.
+        low (np.ndarray): Low prices.
+        close (np.ndarray): Close prices.
+        period (int): ATR period.
+
+    Returns:
+        np.ndarray: ATR series.
+    """
+    # True range needs the previous close: the first bar has no value
+    true_range = np.full(len(close), np.nan)
+    prev_close = close[:-1]
+    true_range[1:] = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+
+    return exponential_smoothing(true_range, period, 1.0 / period, start=1)
+
+
+def keltner_bands(
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    period_EMA: int,
+    period_ATR: int,
+) -> (np.ndarray, np.ndarray):
+    """
+    Keltner Channels bands, as indicatorKC.IndicatorKeltnerChannels.
+
+    Args:
+        high (np.ndarray): High prices.
+        low (np.ndarray): Low prices.
+        close (np.ndarray): Close prices.
+        period_EMA (int): Period for Exponential Moving Average.
+        period_ATR (int): Period for Average True Range.
+
+    Returns:
+        np.ndarray: Lower band (atrlow).
+        np.ndarray: Upper band (atrhigh).
+    """
+    mid = ema(close, period_EMA)
+    atr_x_2 = atr(high, low, close, period_ATR) * 2
+
+    return mid - atr_x_2, mid + atr_x_2
+
+
+def crossover(data: np.ndarray, band: np.ndarray, start: int) -> np.ndarray:
+    """
+    Crossover signal, as btind.CrossOver.
+
+    Args:
+        data (np.ndarray): Crossing series.
+        band (np.ndarray): Crossed series.
+        start (int): Index of the first bar on which both series are valid.
+
+    Returns:
+        np.ndarray: 1.0 on upward crosses, -1.0 on downward crosses, 0.0 elsewhere.
+    """
+    cross = np.zeros(len(data))
+    if start + 1 >= len(data):
+        return cross
+
+    # Last non-zero difference between the two series (seeded at start)
+    diff = data[start:] - band[start:]
+    last_nonzero = np.where(diff != 0.0, np.arange(len(diff)), 0)
+    nzd = diff[np.maximum.accumulate(last_nonzero)]
+
+    before = nzd[:-1]
+    up = (before < 0.0) & (data[start + 1 :] > band[start + 1 :])
+    down = (before > 0.0) & (data[start + 1 :] < band[start + 1 :])
+    cross[start + 1 :] = up.astype(np.float64) - down.astype(np.float64)
+
+    return cross
+
+
+def backtest(
+    open_: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    startcash: float,
+    commission: float,
+    period_EMA: int = 20,
+    period_ATR: int = 14,
+    risk_amount_buy: float = 30,
+    risk_amount_sell: float = 15,
+    stopprice: float = 0.01,
+    order_params_buy: float = 1.8,
+    order_params_sell: float = 0.8,
+    stamps: np.ndarray | None = None,
+    bands: tuple | None = None,
+    **kwargs,
+) -> dict:
+    """
+    Run KeltnerChannelsStrategy on a single asset with whole-array operations.
+
+    Bands, crossover signals, order prices, stop-loss levels and stop-entry fills
+    are computed on the whole arrays. Only the bars where the position changes are
+    then visited, replaying the Cerebro order life-cycle: stop entries valid for one
+    bar, closes at the next open, percentage commission on the backtrader
+    stock-like broker.
+
+    Args:
+        open_ (np.ndarray): Open prices.
+        high (np.ndarray): High prices.
+        low (np.ndarray): Low prices.
+        close (np.ndarray): Close prices.
+        startcash (float): Initial cash.
+        commission (float): Commission rate.
+        period_EMA, period_ATR, risk_amount_buy, risk_amount_sell, stopprice,
+        order_params_buy, order_params_sell: KeltnerChannelsStrategy parameters.
+        stamps (np.ndarray | None): Bar timestamps as seen by the broker. A market
+            order executes on the first bar stamped after its creation bar
+            (default: the next bar).
+        bands (tuple | None): Precomputed (atrlow, atrhigh) for period_EMA and
+            period_ATR, e.g. from indicatorCache (default: computed here).
+        **kwargs: Other strategy parameters, ignored (e.g. live).
+
+    Returns:
+        dict: "trades" (np.ndarray of TRADE_DTYPE), "equity" (np.ndarray, broker
+        value at the end of each bar), "cash" and "value" (final broker state).
+    """
+    open_ = np.ascontiguousarray(open_, dtype=np.float64)
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    n = len(close)
+
+    # Indicators and signals
+    if bands is None:
+        bands = keltner_bands(high, low, close, period_EMA, period_ATR)
+    atrlow, atrhigh = bands
+    bands_start = max(period_EMA, period_ATR + 1) - 1
+    flagbuy = crossover(close, atrhigh, bands_start)
+    flagsell = -crossover(close, atrlow, bands_start)
+
+    # The strategy's next() is first called once the crossovers are valid
+    first = bands_start + 1
+    entry_bars = np.flatnonzero((flagbuy > 0) | (flagsell > 0))
+    entry_bars = entry_bars[entry_bars >= first]
+    exit_long_bars = np.flatnonzero(flagbuy < 0)
+    exit_short_bars = np.flatnonzero(flagsell < 0)
+
+    # Stop-entry prices and attached stop-loss levels for every bar
+    buy_price = close * (1.0 + order_params_buy / 100.0)
+    sell_price = low * (1.0 - order_params_sell / 100.0)
+    buy_stop_loss = buy_price * (1 - stopprice)
+    sell_stop_loss = sell_price * (1 + stopprice)
+
+    # Stop-entry fills on the bar following the signal: gap at the open or touch
+    next_open = np.append(open_[1:], np.nan)
+    next_high = np.append(high[1:], np.nan)
+    next_low = np.append(low[1:], np.nan)
+    buy_fill = np.where(
+        next_open >= buy_price,
+        next_open,
+        np.where(next_high >= buy_price, buy_price, np.nan),
+    )
+    sell_fill = np.where(
+        next_open <= sell_price,
+        next_open,
+        np.where(next_low <= sell_price, sell_price, np.nan),
+    )
+
+    # Market orders can only execute on a bar stamped after their creation
+    if stamps is None:
+        market_bar = np.arange(1, n + 1)
+    else:
+        market_bar = np.searchsorted(stamps, stamps, side="right")
+
+    cash = float(startcash)
+    trades = []
+    # Bars on which cash or position change, to rebuild the equity curve
+    change_bars = [0]
+    change_cash = [cash]
+    change_size = [0.0]
+    change_price = [0.0]
+
+    i = first
+    while True:
+        # Flat: next entry signal
+        k = np.searchsorted(entry_bars, i)
+        if k == len(entry_bars):
+            break
+        signal = int(entry_bars[k])
+        fill_bar = signal + 1
+        if fill_bar >= n:
+            break
+
+        is_buy = bool(flagbuy[signal] > 0)
+        if is_buy:
+            price = float(buy_price[signal])
+            size = (risk_amount_buy / 100) * cash / price
+        else:
+            price = float(sell_price[signal])
+            size = -((risk_amount_sell / 100) * cash / price)
+
+        # Submission check of the broker at the creation price
+        if cash - size * price - abs(size) * commission * price < 0.0:
+            i = fill_bar
+            continue
+
+        fill = buy_fill[signal] if is_buy else sell_fill[signal]
+        if np.isnan(fill):
+            # Not triggered: cancelled on the next bar, no new order on that bar
+            i = fill_bar + 1
+            continue
+        fill = float(fill)
+
+        entry_comm = abs(size) * commission * fill
+        new_cash = cash - size * fill - entry_comm
+        if new_cash < 0.0:
+            # Margin: not enough cash at the execution price
+            i = fill_bar
+            continue
+        cash = new_cash
+        change_bars.append(fill_bar)
+        change_cash.append(cash)
+        change_size.append(size)
+        change_price.append(fill)
+
+        # Trade records keep the size-weighted price, as backtrader's Trade does
+        trade = [
+            fill_bar,
+            -1,
+            size,
+            size * fill / size,
+            np.nan,
+            float(buy_stop_loss[signal] if is_buy else sell_stop_loss[signal]),
+            0.0,
+            -entry_comm,
+            entry_comm,
+        ]
+        trades.append(trade)
+
+        # In position: next exit signal, starting from the fill bar itself
+        exit_bars = exit_long_bars if is_buy else exit_short_bars
+        k = np.searchsorted(exit_bars, fill_bar)
+        if k == len(exit_bars):
+            break
+        signal = int(exit_bars[k])
+        close_bar = int(market_bar[signal])
+        if close_bar >= n:
+            break
+
+        # Submission check of the closing market order at the creation price
+        created = float(close[signal])
+        if cash + size * created - abs(size) * commission * created < 0.0:
+            # Margin on the close: the strategy keeps waiting for the close forever
+            break
+
+        # Market close at the open of the execution bar
+        exit_price = float(open_[close_bar])
+        pnl = size * (exit_price - fill)
+        exit_comm = abs(size) * commission * exit_price
+        cash += size * fill + pnl
+        cash -= exit_comm
+        change_bars.append(close_bar)
+        change_cash.append(cash)
+        change_size.append(0.0)
+        change_price.append(0.0)
+
+        trade[1] = close_bar
+        trade[4] = exit_price
+        trade[6] = size * (exit_price - trade[3])
+        trade[8] = entry_comm + exit_comm
+        trade[7] = trade[6] - trade[8]
+
+        i = close_bar
+
+    # Step functions of cash and position held at the end of each bar
+    steps = np.searchsorted(np.array(change_bars), np.arange(n), side="right") - 1
+    cash_curve = np.array(change_cash)[steps]
+    size_curve = np.array(change_size)[steps]
+    price_curve = np.array(change_price)[steps]
+
+    # Broker value as computed by backtrader (long positions are "unlevered")
+    position_value = size_curve * close
+    unrealized = size_curve * (close - price_curve)
+    equity = cash_curve + np.where(
+        position_value > 0, (position_value - unrealized) + unrealized, position_value
+    )
+
+    return dict(
+        trades=np.array([tuple(t) for t in trades], dtype=TRADE_DTYPE),
+        equity=equity,
+        cash=cash,
+        value=float(equity[-1]) if n else cash,
+    )
+
+
+def run_vectorized(
+    data_analisys: pd.DataFrame,
+    data_args: dict,
+    strategy_params: dict,
+    stamps: np.ndarray | None = None,
+    bands: tuple | None = None,
+) -> dict:
+    """
+    Run the vectorized engine on a data frame as returned by retrivesDatas.
+
+    Args:
+        data_analisys (pd.DataFrame): OHLCV data with Open, High, Low, Close columns.
+        data_args (dict): Dictionary containing data-related arguments.
+        strategy_params (dict): KeltnerChannelsStrategy parameters.
+        stamps (np.ndarray | None): Bar timestamps as seen by the broker.
+        bands (tuple | None): Precomputed (atrlow, atrhigh).
+
+    Returns:
+        dict: Result of backtest, plus the "datetime" index of the bars.
+    """
+    result = backtest(
+        data_analisys["Open"].to_numpy(),
+        data_analisys["High"].to_numpy(),
+        data_analisys["Low"].to_numpy(),
+        data_analisys["Close"].to_numpy(),
+        data_args["startcash"],
+        data_args["commission"],
+        stamps=stamps,
+        bands=bands,
+        **strategy_params,
+    )
+    result["datetime"] = data_analisys.index
+
+    return result
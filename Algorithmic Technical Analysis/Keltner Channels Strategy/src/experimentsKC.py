@@ -0,0 +1,122 @@
+import argparse
+
+import pandas as pd
+
+from btToolbox import backtestingAnalysis, experimentStore
+
+# Columns printed for each run, the full row is in the store
+COLUMNS = [
+    "created",
+    "engine",
+    "assets",
+    "timeframe",
+    "periodEMA",
+    "periodATR",
+    "riskAmountBuy",
+    "riskAmountSell",
+    "stopprice",
+    "orderParamBuy",
+    "orderParamSell",
+    "net_profit",
+    "sharpe_ratio",
+    "sqn",
+    "max_drawdown",
+    "closed",
+]
+
+
+def print_run(run_id: int, path: str) -> None:
+    """
+    Prints a stored run with its trades.
+
+    Args:
+    - run_id (int): Id of the run
+    - path (str): Path of the experiment store
+
+    Returns:
+    - None
+    """
+    run = experimentStore.load(run_id, path)
+    if run is None:
+        exit("ERROR: NO RUN %d IN THE EXPERIMENT STORE" % run_id)
+
+    # Parameters and metrics, one per line
+    for name in (
+        ["created", "assets", "fromdate", "todate", "fingerprint"]
+        + list(experimentStore.PARAM_COLUMNS)
+        + list(experimentStore.METRIC_COLUMNS)
+    ):
+        print("%-16s%s" % (name, run[name]))
+
+    print("bars\t\t%d" % len(run["equity"]))
+    backtestingAnalysis.print_md(pd.DataFrame(run["trades"]), "\n")
+
+
+def execute() -> None:
+    """
+    Main execution function: prints the runs of the experiment store matching a
+    query.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(description="Query of the stored backtest runs")
+    parser.add_argument(
+        "--where",
+        "-w",
+        required=False,
+        default=None,
+        help="SQL condition on the runs, e.g. 'max_drawdown < 10 AND periodEMA > 10'",
+    )
+    parser.add_argument(
+        "--order",
+        "-o",
+        required=False,
+        default="sharpe_ratio DESC",
+        help="SQL order of the runs",
+    )
+    parser.add_argument(
+        "--limit", "-l", required=False, type=int, default=20, help="Runs printed"
+    )
+    parser.add_argument(
+        "--last",
+        "-la",
+        required=False,
+        type=int,
+        default=None,
+        help="Only search the last runs stored",
+    )
+    parser.add_argument(
+        "--run",
+        "-r",
+        required=False,
+        type=int,
+        default=None,
+        help="Print a single run with its trades",
+    )
+    parser.add_argument(
+        "--path",
+        "-p",
+        required=False,
+        default=experimentStore.STORE_PATH,
+        help="Path of the experiment store",
+    )
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print_run(args.run, args.path)
+        return
+
+    df = experimentStore.query(
+        args.where,
+        order_by=args.order,
+        limit=args.limit,
+        last=args.last,
+        path=args.path,
+    )
+    backtestingAnalysis.print_md(df[COLUMNS], "\n", index=True)
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()
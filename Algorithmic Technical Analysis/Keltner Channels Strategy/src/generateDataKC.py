@@ -0,0 +1,155 @@
+import argparse
+
+from btToolbox import backtestingRetrivesDatas, syntheticData
+
+
+def parse_regimes(text: str | None) -> list | None:
+    """
+    Parses the volatility regimes.
+
+    Args:
+    - text (str | None): "multiplier:length,..." e.g. "1:2000,3:200"
+
+    Returns:
+    - list | None: (volatility multiplier, mean length in bars) of each regime
+    """
+    if not text:
+        return None
+
+    regimes = []
+    for item in text.split(","):
+        multiplier, length = item.split(":")
+        regimes.append((float(multiplier), float(length)))
+
+    return regimes
+
+
+def execute() -> None:
+    """
+    Main execution function: writes synthetic assets into the local catalog.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(
+        description="Synthetic OHLCV data for the backtests, in the local catalog"
+    )
+    parser.add_argument(
+        "--symbols",
+        "-sy",
+        required=False,
+        type=int,
+        default=1,
+        help="Number of assets, named <prefix><i>",
+    )
+    parser.add_argument(
+        "--prefix", "-pr", required=False, default="SYN", help="Name of the assets"
+    )
+    parser.add_argument(
+        "--currencyTrade",
+        "-ct",
+        required=False,
+        default="USDT",
+        help="Currency of the assets",
+    )
+    parser.add_argument(
+        "--bars", "-b", required=False, type=int, default=100000, help="Bars per asset"
+    )
+    parser.add_argument(
+        "--timeframe",
+        "-tf",
+        required=False,
+        default="1h",
+        help="Timeframe of the bars: 1m, 1h, 1d...",
+    )
+    parser.add_argument(
+        "--start", "-st", required=False, default="2000-01-01", help="First bar"
+    )
+    parser.add_argument(
+        "--method",
+        "-m",
+        required=False,
+        default="gbm",
+        choices=["gbm", "bootstrap"],
+        help="Geometric Brownian motion, or block bootstrap of binance.csv returns",
+    )
+    parser.add_argument(
+        "--volatility",
+        "-vo",
+        required=False,
+        type=float,
+        default=0.6,
+        help="Annualized volatility (gbm)",
+    )
+    parser.add_argument(
+        "--drift",
+        "-dr",
+        required=False,
+        type=float,
+        default=0.0,
+        help="Annualized drift (gbm)",
+    )
+    parser.add_argument(
+        "--regimes",
+        "-re",
+        required=False,
+        default=None,
+        help="Volatility regimes 'multiplier:mean bars,...' e.g. '1:2000,3:200'",
+    )
+    parser.add_argument(
+        "--gapProbability",
+        "-gp",
+        required=False,
+        type=float,
+        default=0.0,
+        help="Probability that a gap of missing bars starts at each bar",
+    )
+    parser.add_argument(
+        "--gapLength",
+        "-gl",
+        required=False,
+        type=float,
+        default=10.0,
+        help="Mean length of a gap, in bars",
+    )
+    parser.add_argument(
+        "--seed",
+        "-se",
+        required=False,
+        type=int,
+        default=0,
+        help="Seed of the first asset, +1 per asset",
+    )
+    args = parser.parse_args()
+
+    source = None
+    if args.method == "bootstrap":
+        source = syntheticData.source_returns(
+            backtestingRetrivesDatas.retireves_data_path("binance.csv")
+        )
+
+    root = backtestingRetrivesDatas.retrives_catalog_root()
+    for i in range(args.symbols):
+        name_asset = "%s%d/%s" % (args.prefix, i, args.currencyTrade)
+        # One seed per asset: the assets are reproducible and independent
+        entry = syntheticData.write(
+            root,
+            name_asset,
+            args.timeframe,
+            bars=args.bars,
+            start=args.start,
+            method=args.method,
+            volatility=args.volatility,
+            drift=args.drift,
+            regimes=parse_regimes(args.regimes),
+            gap_probability=args.gapProbability,
+            gap_length=args.gapLength,
+            source=source,
+            seed=args.seed + i,
+        )
+        print("%s:\t\t\t%d bars written" % (name_asset, entry["rows"]))
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()
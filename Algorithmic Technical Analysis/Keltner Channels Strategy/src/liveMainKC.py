@@ -1,28 +1,44 @@
+import signal
+
 import backtrader as bt
 
 import parseArgs
 
-from btToolbox import retrievesDataBroker
+from btToolbox import fakeExchange, loggingUtils, retrievesDataBroker
+
+from btToolbox.asyncFeed import AsyncMarketData
+
+from btToolbox.latencyTracker import LatencyTracker
+
+from btToolbox.metricsServer import MetricsServer, StrategyMetrics
 
 from btToolbox.strategyKC import KeltnerChannelsStrategy
 
 
-def create_cerebro_with_data(data_args: dict) -> bt.Cerebro:
+def create_cerebro_with_data(
+    data_args: dict,
+    latency: LatencyTracker | None = None,
+    logger: loggingUtils.JsonLinesLogger | None = None,
+) -> (bt.Cerebro, AsyncMarketData | None):
     """
     Creates a cerebro instance and adds data.
 
     Args:
     - data_args (dict): Dictionary containing data-related arguments
+    - latency (LatencyTracker | None): Tracker of the live loop latency
+    - logger (JsonLinesLogger | None): Logger of the polling errors, None to print
 
     Returns:
     - bt.Cerebro: Cerebro instance
+    - AsyncMarketData | None: Market data polling all the assets concurrently, to start
+        before running cerebro, None if each data feed polls its own asset
     """
     # Creating a cerebro instance with quicknotify enabled
     cerebro = bt.Cerebro(quicknotify=True)
 
     # Setting up data store and broker
     store = retrievesDataBroker.set_store(
-        data_args["exchangeId"], data_args["currencyTrade"]
+        data_args["exchangeId"], data_args["currencyTrade"], data_args
     )
     broker = store.getbroker(
         broker_mapping=retrievesDataBroker.retrive_broker_mapping(
@@ -32,13 +48,30 @@ def create_cerebro_with_data(data_args: dict) -> bt.Cerebro:
     # Setting broker for cerebro
     cerebro.setbroker(broker)
 
+    market_data = None
+    if data_args["asyncData"]:
+        # One event loop polls all the assets, with a shared rate limit
+        market_data = retrievesDataBroker.set_async_market_data(
+            data_args["exchangeId"], store, data_args, logger
+        )
+
     # Adding data for each asset
     for curr_traded in data_args["nameasset"]:
         try:
             # Retrieving data for the asset
-            data = retrievesDataBroker.retrieves_data(
-                curr_traded, data_args["currencyTrade"], store, data_args
-            )
+            if market_data is None:
+                data = retrievesDataBroker.retrieves_data(
+                    curr_traded, data_args["currencyTrade"], store, data_args, latency
+                )
+            else:
+                data = retrievesDataBroker.retrieves_async_data(
+                    curr_traded,
+                    data_args["currencyTrade"],
+                    store,
+                    market_data,
+                    data_args,
+                    latency,
+                )
             print(curr_traded + ":\t\t\tCorrectly contacted " + data_args["exchangeId"])
         except ValueError as e:
             print("ERROR IMPORT DATA")
@@ -47,16 +80,25 @@ def create_cerebro_with_data(data_args: dict) -> bt.Cerebro:
         cerebro.adddata(data, name=curr_traded)
 
     # Returning the cerebro instance
-    return cerebro
+    return cerebro, market_data
 
 
-def set_cerebro(cerebro: bt.Cerebro, data_args: dict) -> None:
+def set_cerebro(
+    cerebro: bt.Cerebro,
+    data_args: dict,
+    latency: LatencyTracker | None = None,
+    metrics: StrategyMetrics | None = None,
+    logger: loggingUtils.JsonLinesLogger | None = None,
+) -> None:
     """
     Sets up the cerebro with the KeltnerChannelsStrategy and parameters.
 
     Args:
     - cerebro (bt.Cerebro): Cerebro instance
     - data_args (dict): Dictionary containing data-related arguments
+    - latency (LatencyTracker | None): Tracker of the live loop latency
+    - metrics (StrategyMetrics | None): Metrics of the live loop
+    - logger (JsonLinesLogger | None): Non-blocking logger of the strategy
 
     Returns:
     - None
@@ -73,6 +115,12 @@ def set_cerebro(cerebro: bt.Cerebro, data_args: dict) -> None:
         order_params_buy=data_args["orderParamBuy"],
         order_params_sell=data_args["orderParamSell"],
         debug=True if data_args["levelDebug"] > 0 else False,
+        state_directory=retrievesDataBroker.retrives_state_directory(
+            data_args["exchangeId"]
+        ),
+        latency=latency,
+        metrics=metrics,
+        logger=logger,
     )
 
     # Setting the commission
@@ -93,14 +141,52 @@ def execute() -> None:
     # Getting data arguments from command line with verbose mode
     data_args = parseArgs.getdata(True)
 
+    # Latency from the candles to the orders, measured only if requested
+    # The delays from the candle closes are on the clock of the simulator, if any
+    speed = (
+        data_args["fakeSpeed"]
+        if data_args["exchangeId"] == fakeExchange.EXCHANGE_ID
+        else 1.0
+    )
+    latency = None
+    if data_args["latency"]:
+        latency = LatencyTracker(speed)
+
+    # The strategy log is written by a background thread: next() never waits on I/O
+    logger = loggingUtils.JsonLinesLogger(data_args["logFile"], data_args["logLevel"])
+
     # Creating cerebro with data
-    cerebro = create_cerebro_with_data(data_args)
+    cerebro, market_data = create_cerebro_with_data(data_args, latency, logger)
+
+    # Metrics of the live loop, served only if a port is given
+    metrics = None
+    metrics_server = None
+    if data_args["metricsPort"] is not None:
+        metrics = StrategyMetrics(cerebro.broker.store.exchange.milliseconds, speed)
+        metrics_server = MetricsServer(metrics, data_args["metricsPort"])
+        metrics_server.start()
+        print("Metrics served on http://127.0.0.1:%d/metrics" % metrics_server.port)
 
     # Setting up cerebro with strategies and parameters
-    set_cerebro(cerebro, data_args)
+    set_cerebro(cerebro, data_args, latency, metrics, logger)
+
+    if latency is not None and hasattr(signal, "SIGUSR1"):
+        # Latency table on demand: kill -USR1 <pid>
+        signal.signal(signal.SIGUSR1, lambda signum, frame: latency.dump())
 
     # Running strategies
-    cerebro.run()
+    if market_data is not None:
+        market_data.start()
+    try:
+        cerebro.run()
+    finally:
+        if market_data is not None:
+            market_data.stop()
+        if latency is not None:
+            latency.dump()
+        if metrics_server is not None:
+            metrics_server.stop()
+        logger.close()
 
 
 if __name__ == "__main__":
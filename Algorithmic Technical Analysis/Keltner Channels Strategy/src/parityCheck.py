@@ -0,0 +1,229 @@
+import argparse
+import sys
+
+import numpy as np
+
+import backtrader as bt
+
+import parseArgs
+
+from btToolbox import backtestingRetrivesDatas, performanceAnalytics, vectorizedKC
+
+# Strategy parameters checked on top of the defaults, one run per engine each
+PARAM_SETS = [
+    dict(),
+    dict(periodEMA=20, periodATR=14),
+    dict(periodEMA=30, periodATR=10, stopprice=0.02),
+    dict(orderParamBuy=1.2, orderParamSell=0.4, riskAmountBuy=40),
+]
+
+# Trade fields recorded by both engines: the PerformanceRecorder has no exit and
+#   stop prices
+TRADE_FIELDS = ("entry_bar", "exit_bar", "size", "entry_price", "pnl", "pnlcomm")
+
+
+def retrives_default_args() -> dict:
+    """
+    Gets the default arguments of the backtest, on binance.csv.
+
+    Returns:
+    - dict: Dictionary containing data-related arguments
+    """
+    # Defaults of the backtest command line, without the check's own arguments
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    try:
+        data_args = parseArgs.getdata()
+    finally:
+        sys.argv = argv
+
+    data_args["noPlot"] = True
+    data_args["nameasset"] = ["BTC"]
+    data_args["currencyTrade"] = "USDT"
+    data_args["timeframe"] = "1h"
+
+    return data_args
+
+
+def run_cerebro(data_args: dict, strategy_params: dict) -> dict:
+    """
+    Runs the strategy with cerebro.run() and the PerformanceRecorder.
+
+    Args:
+    - data_args (dict): Dictionary containing data-related arguments
+    - strategy_params (dict): KeltnerChannelsStrategy parameters
+
+    Returns:
+    - dict: equity and closed trades of the run
+    """
+    data, _ = backtestingRetrivesDatas.retrivesDatas(
+        data_args["nameasset"][0], data_args
+    )
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(data, name=data_args["nameasset"][0])
+
+    # Silent strategy: only the comparison is printed
+    cerebro.addstrategy(
+        backtestingRetrivesDatas.KeltnerChannelsStrategy,
+        print_position=False,
+        **strategy_params,
+    )
+    backtestingRetrivesDatas.set_broker(cerebro, data_args)
+    cerebro.addanalyzer(performanceAnalytics.PerformanceRecorder)
+
+    records = cerebro.run()[0].analyzers.performancerecorder.get_analysis()
+
+    # Closed trades, with the 0-based bars of the vectorized engine instead of the
+    #   lengths of the data backtrader counts from 1
+    trades = records["trades"][records["trades"]["exit_bar"] >= 0].copy()
+    trades["entry_bar"] -= 1
+    trades["exit_bar"] -= 1
+
+    return dict(equity=records["equity"], trades=trades)
+
+
+def run_vectorized(data_args: dict, strategy_params: dict) -> dict:
+    """
+    Runs the strategy with the vectorized engine, as backtestingMainKC does.
+
+    Args:
+    - data_args (dict): Dictionary containing data-related arguments
+    - strategy_params (dict): KeltnerChannelsStrategy parameters
+
+    Returns:
+    - dict: equity and closed trades of the run
+    """
+    data, data_analisys = backtestingRetrivesDatas.retrivesDatas(
+        data_args["nameasset"][0], data_args
+    )
+    stamps = backtestingRetrivesDatas.retrives_feed_stamps(data, data_analisys)
+    bands = None
+    if data_args["indicatorCache"]:
+        bands = backtestingRetrivesDatas.retrives_bands(
+            data_analisys, data_args["periodEMA"], data_args["periodATR"]
+        )
+
+    result = vectorizedKC.run_vectorized(
+        data_analisys, data_args, strategy_params, stamps, bands
+    )
+
+    # Closed trades, as recorded by cerebro
+    return dict(
+        equity=result["equity"],
+        trades=result["trades"][result["trades"]["exit_bar"] >= 0],
+    )
+
+
+def compare(expected: dict, actual: dict, rtol: float) -> list:
+    """
+    Compares the equity curves and the trades of two runs.
+
+    Args:
+    - expected (dict): equity and trades of the cerebro run
+    - actual (dict): equity and trades of the vectorized run
+    - rtol (float): Relative tolerance of the values
+
+    Returns:
+    - list: Description of each difference, empty if the runs match
+    """
+    differences = []
+    if len(expected["equity"]) != len(actual["equity"]):
+        differences.append(
+            "bars: %d != %d" % (len(expected["equity"]), len(actual["equity"]))
+        )
+    elif not np.allclose(expected["equity"], actual["equity"], rtol=rtol):
+        bar = int(
+            np.argmax(~np.isclose(expected["equity"], actual["equity"], rtol=rtol))
+        )
+        differences.append(
+            "equity at bar %d: %.6f != %.6f"
+            % (bar, expected["equity"][bar], actual["equity"][bar])
+        )
+
+    if len(expected["trades"]) != len(actual["trades"]):
+        differences.append(
+            "trades: %d != %d" % (len(expected["trades"]), len(actual["trades"]))
+        )
+        return differences
+
+    for name in TRADE_FIELDS:
+        mismatch = ~np.isclose(
+            expected["trades"][name],
+            actual["trades"][name],
+            rtol=rtol,
+            equal_nan=True,
+        )
+        if mismatch.any():
+            i = int(np.argmax(mismatch))
+            differences.append(
+                "trade %d %s: %s != %s"
+                % (i, name, expected["trades"][name][i], actual["trades"][name][i])
+            )
+
+    return differences
+
+
+def check(rtol: float) -> bool:
+    """
+    Checks the vectorized engine against cerebro on every parameter set.
+
+    Args:
+    - rtol (float): Relative tolerance of the values
+
+    Returns:
+    - bool: True if every run matches
+    """
+    default_args = retrives_default_args()
+    passed = True
+    print("Parameters\t\t\t\t\tbars\ttrades\tstatus")
+    for params in PARAM_SETS:
+        data_args = dict(default_args, **params)
+        strategy_params = backtestingRetrivesDatas.retrives_strategy(data_args)[1]
+
+        expected = run_cerebro(data_args, strategy_params)
+        actual = run_vectorized(data_args, strategy_params)
+        differences = compare(expected, actual, rtol)
+
+        passed = passed and not differences
+        print(
+            "%-48s\t%d\t%d\t%s"
+            % (
+                params or "defaults",
+                len(expected["equity"]),
+                len(expected["trades"]),
+                "MISMATCH" if differences else "OK",
+            )
+        )
+        for difference in differences:
+            print("\t" + difference)
+
+    return passed
+
+
+def execute() -> None:
+    """
+    Main execution function: exits with status 1 if the vectorized engine does not
+    match cerebro on binance.csv.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(
+        description="Parity check of the vectorized engine against cerebro"
+    )
+    parser.add_argument(
+        "--tolerance",
+        "-t",
+        required=False,
+        type=float,
+        default=1e-9,
+        help="Relative tolerance of the equity and of the trades",
+    )
+    args = parser.parse_args()
+
+    if not check(args.tolerance):
+        exit(1)
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()
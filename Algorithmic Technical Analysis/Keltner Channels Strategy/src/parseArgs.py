@@ -5,6 +5,17 @@ from argparse import Namespace
 
 from datetime import datetime
 
+# Strategy parameter -> command line flag of its range, for --optimize
+RANGE_FLAGS = {
+    "periodEMA": "rangeEMA",
+    "periodATR": "rangeATR",
+    "riskAmountBuy": "rangeRiskBuy",
+    "riskAmountSell": "rangeRiskSell",
+    "stopprice": "rangeStopPrice",
+    "orderParamBuy": "rangeOrderBuy",
+    "orderParamSell": "rangeOrderSell",
+}
+
 
 def getdata(live: bool | None = False) -> dict:
     """
@@ -37,6 +48,7 @@ def getdata(live: bool | None = False) -> dict:
 
     # Storing various arguments in the dictionary
     dfkwargs["plotstyle"] = args.plotstyle
+    dfkwargs["noPlot"] = args.noPlot
     dfkwargs["startcash"] = args.startcash
     dfkwargs["currencyTrade"] = args.currencyTrade
     dfkwargs["commission"] = args.commission
@@ -65,11 +77,85 @@ def getdata(live: bool | None = False) -> dict:
 
     dfkwargs["dropNewest"] = args.dropNewest
     dfkwargs["exchangeId"] = args.exchangeId
+    dfkwargs["engine"] = args.engine
+
+    if args.optimize:
+        # Values to sweep for each strategy parameter, the single value if no range is given
+        #   (the ranges are already parsed and validated by the parser)
+        dfkwargs["optimize"] = {
+            name: getattr(args, flag) or [dfkwargs[name]]
+            for name, flag in RANGE_FLAGS.items()
+        }
+    else:
+        dfkwargs["optimize"] = None
+    dfkwargs["processes"] = args.processes
+    dfkwargs["dtype"] = "float32" if args.float32 else "float64"
+    dfkwargs["lowmemory"] = args.lowmemory
+    dfkwargs["indicatorCache"] = not args.noIndicatorCache
+    dfkwargs["asyncData"] = args.asyncData
+    dfkwargs["fakeSpeed"] = args.fakeSpeed
+    dfkwargs["fakeLatency"] = args.fakeLatency
+    dfkwargs["latency"] = args.latency
+    dfkwargs["metricsPort"] = args.metricsPort
+    dfkwargs["logFile"] = args.logFile
+    dfkwargs["logLevel"] = args.logLevel
+    dfkwargs["store"] = not args.noStore
+    dfkwargs["runCache"] = not args.noCache
+    dfkwargs["checkpoint"] = args.checkpoint
 
     # Returning the dictionary containing data-related arguments
     return dfkwargs
 
 
+def parse_range(text: str, cast: type) -> list:
+    """
+    Parses a parameter range for the optimization.
+
+    Args:
+    - text (str): "start:stop:step" (stop included, step 1 if omitted) or "v1,v2,..."
+    - cast (type): Type of the parameter (int or float)
+
+    Returns:
+    - list: Values of the parameter
+
+    Raises:
+    - argparse.ArgumentTypeError: The range is malformed or empty
+    """
+    try:
+        if ":" not in text:
+            return [cast(value) for value in text.split(",")]
+
+        bounds = [cast(value) for value in text.split(":")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "invalid %s range: '%s'" % (cast.__name__, text)
+        )
+    if len(bounds) not in (2, 3):
+        raise argparse.ArgumentTypeError(
+            "a range is start:stop or start:stop:step, not '%s'" % text
+        )
+    start, stop = bounds[0], bounds[1]
+    step = bounds[2] if len(bounds) > 2 else cast(1)
+    if step <= 0:
+        raise argparse.ArgumentTypeError("The step of a range must be positive")
+    if stop < start:
+        raise argparse.ArgumentTypeError("empty range: '%s'" % text)
+
+    # Rounding avoids float steps accumulating errors (e.g. 0.30000000000000004)
+    count = int(round((stop - start) / step)) + 1
+    return [cast(round(start + i * step, 10)) for i in range(count)]
+
+
+def int_range(text: str) -> list:
+    """Parses a range of int values, see parse_range."""
+    return parse_range(text, int)
+
+
+def float_range(text: str) -> list:
+    """Parses a range of float values, see parse_range."""
+    return parse_range(text, float)
+
+
 def parse_args(live: bool | None = False) -> Namespace:
     """
     Parses command-line arguments.
@@ -113,6 +199,13 @@ def parse_args(live: bool | None = False) -> Namespace:
         choices=["bar", "line", "candle"],
         help="Plot the read data",
     )
+    parser.add_argument(
+        "--noPlot",
+        "-np",
+        required=False,
+        action="store_true",
+        help="Batch mode: no plot, matplotlib is never loaded",
+    )
     parser.add_argument(
         "--startcash",
         "-sc",
@@ -213,6 +306,194 @@ def parse_args(live: bool | None = False) -> Namespace:
     parser.add_argument(
         "--exchangeId", "-exid", required=False, default="binance", help="Exchange ID"
     )
+    parser.add_argument(
+        "--engine",
+        "-eng",
+        required=False,
+        default="cerebro",
+        choices=["cerebro", "vectorized"],
+        help="Backtesting engine: backtrader Cerebro or vectorized NumPy",
+    )
+    parser.add_argument(
+        "--optimize",
+        "-opt",
+        required=False,
+        action="store_true",
+        help="Sweep the strategy parameters over the given ranges",
+    )
+    parser.add_argument(
+        "--rangeEMA",
+        "-rema",
+        required=False,
+        type=int_range,
+        default=None,
+        help="EMA period range",
+    )
+    parser.add_argument(
+        "--rangeATR",
+        "-ratr",
+        required=False,
+        type=int_range,
+        default=None,
+        help="ATR period range",
+    )
+    parser.add_argument(
+        "--rangeRiskBuy",
+        "-rrab",
+        required=False,
+        type=int_range,
+        default=None,
+        help="Buy risk amount range",
+    )
+    parser.add_argument(
+        "--rangeRiskSell",
+        "-rras",
+        required=False,
+        type=int_range,
+        default=None,
+        help="Sell risk amount range",
+    )
+    parser.add_argument(
+        "--rangeStopPrice",
+        "-rstpp",
+        required=False,
+        type=float_range,
+        default=None,
+        help="Stop price range",
+    )
+    parser.add_argument(
+        "--rangeOrderBuy",
+        "-ropb",
+        required=False,
+        type=float_range,
+        default=None,
+        help="Buy order parameter range",
+    )
+    parser.add_argument(
+        "--rangeOrderSell",
+        "-rops",
+        required=False,
+        type=float_range,
+        default=None,
+        help="Sell order parameter range",
+    )
+    parser.add_argument(
+        "--processes",
+        "-proc",
+        required=False,
+        type=int,
+        default=None,
+        help="Number of processes of the optimization (default: all the cores)",
+    )
+    parser.add_argument(
+        "--float32",
+        "-f32",
+        required=False,
+        action="store_true",
+        help="Keep the OHLCV data of the feeds in float32 (half the memory)",
+    )
+    parser.add_argument(
+        "--lowmemory",
+        "-lowm",
+        required=False,
+        action="store_true",
+        help="Stream the bars from disk with bounded memory (exactbars, no plot)",
+    )
+    parser.add_argument(
+        "--noIndicatorCache",
+        "-nic",
+        required=False,
+        action="store_true",
+        help="Compute the Keltner Channels in every run instead of caching them",
+    )
+    parser.add_argument(
+        "--asyncData",
+        "-ad",
+        required=False,
+        action="store_true",
+        help="Poll the candles of all the assets concurrently (live mode)",
+    )
+    parser.add_argument(
+        "--fakeSpeed",
+        "-fsp",
+        required=False,
+        type=float,
+        default=100.0,
+        help="Speed of the local exchange simulator (--exchangeId fake), x real time",
+    )
+    parser.add_argument(
+        "--fakeLatency",
+        "-flt",
+        required=False,
+        type=float,
+        default=50.0,
+        help="Latency (ms) of each request to the local exchange simulator",
+    )
+    parser.add_argument(
+        "--latency",
+        "-lat",
+        required=False,
+        action="store_true",
+        help="Measure the latency from the candles to the orders (live mode)",
+    )
+    parser.add_argument(
+        "--metricsPort",
+        "-mp",
+        required=False,
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics on http://127.0.0.1:<port>/metrics (live mode)",
+    )
+    parser.add_argument(
+        "--logFile",
+        "-lf",
+        required=False,
+        type=str,
+        default=None,
+        help="JSON lines file of the strategy log (live mode: stdout if not given)",
+    )
+    parser.add_argument(
+        "--logLevel",
+        "-ll",
+        required=False,
+        type=str,
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="Lowest level of the JSON lines log",
+    )
+    parser.add_argument(
+        "--noStore",
+        "-nst",
+        required=False,
+        action="store_true",
+        help="Do not save the runs into the experiment store",
+    )
+    parser.add_argument(
+        "--noCache",
+        "-nc",
+        required=False,
+        action="store_true",
+        help="Run the backtest even if its result is in the run cache",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        "-cp",
+        required=False,
+        action="store_true",
+        help="Resume from the checkpoint of a run on the same first bars, only running"
+        " the new ones, and save a new checkpoint (one asset, cerebro engine)",
+    )
+
+    # Parsing the arguments
+    args = parser.parse_args()
+
+    given = ["--" + flag for flag in RANGE_FLAGS.values() if getattr(args, flag)]
+    if given and not args.optimize:
+        # Otherwise silently ignored
+        parser.error("the ranges only apply with --optimize: %s" % ", ".join(given))
+    if args.engine == "vectorized" and len(args.nameasset.split(",")) > 1:
+        # The assets share the cash in the strategy, they cannot be run one by one
+        parser.error("the vectorized engine supports one asset at a time")
 
-    # Parsing and returning the arguments
-    return parser.parse_args()
+    # Returning the arguments
+    return args
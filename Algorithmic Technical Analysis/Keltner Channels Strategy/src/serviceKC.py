@@ -0,0 +1,100 @@
+import argparse
+import sys
+
+import parseArgs
+
+from btToolbox import backtestService
+
+
+def retrives_default_args() -> dict:
+    """
+    Gets the default arguments of the backtests of the service.
+
+    Returns:
+    - dict: Dictionary containing data-related arguments
+    """
+    # Defaults of the backtest command line, without the service's own arguments
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    try:
+        data_args = parseArgs.getdata()
+    finally:
+        sys.argv = argv
+
+    data_args["noPlot"] = True
+
+    return data_args
+
+
+def execute() -> None:
+    """
+    Main execution function: serves backtests on localhost until interrupted.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(
+        description="Local backtest service keeping the data in memory"
+    )
+    parser.add_argument(
+        "--host",
+        "-ho",
+        required=False,
+        default="127.0.0.1",
+        help="Address to listen on",
+    )
+    parser.add_argument(
+        "--port", "-p", required=False, type=int, default=8750, help="Port"
+    )
+    parser.add_argument(
+        "--processes",
+        "-proc",
+        required=False,
+        type=int,
+        default=None,
+        help="Worker processes (default: all the cores)",
+    )
+    parser.add_argument(
+        "--preload",
+        "-pl",
+        required=False,
+        default="BTC",
+        help="Assets loaded by the workers at start, comma separated ('' for none)",
+    )
+    parser.add_argument(
+        "--noStore",
+        "-nst",
+        required=False,
+        action="store_true",
+        help="Do not save the runs into the experiment store",
+    )
+    parser.add_argument(
+        "--noCache",
+        "-nc",
+        required=False,
+        action="store_true",
+        help="Run the backtests even if their result is in the run cache",
+    )
+    args = parser.parse_args()
+
+    data_args = retrives_default_args()
+    data_args["store"] = not args.noStore
+    data_args["runCache"] = not args.noCache
+
+    preload = [name.strip() for name in args.preload.split(",") if name.strip()]
+    server = backtestService.BacktestServer(
+        data_args, args.port, args.host, args.processes, preload
+    )
+    print(
+        "Backtest service on http://%s:%d/backtest, %d workers"
+        % (args.host, server.port, server.processes)
+    )
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Backtest service stopped")
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Entry point -> (import budget in seconds, modules it must not load at import)
+ENTRY_POINTS = {
+    "backtestingMainKC": (1.0, ("matplotlib", "yfinance", "ccxt")),
+    "liveMainKC": (2.0, ("matplotlib", "yfinance")),
+}
+
+# Code run in a fresh interpreter: import time and heavy modules loaded
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import %s
+seconds = time.perf_counter() - start
+modules = [m for m in %r if m in sys.modules]
+print(json.dumps(dict(seconds=seconds, modules=modules)))
+"""
+
+
+def measure(entry_point: str, forbidden: tuple) -> dict:
+    """
+    Measures the import of an entry point in a fresh interpreter.
+
+    Args:
+    - entry_point (str): Module name of the entry point
+    - forbidden (tuple): Modules that must not be loaded by the import
+
+    Returns:
+    - dict: seconds of the import and forbidden modules loaded, or error if the
+        import failed
+    """
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE % (entry_point, forbidden)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return dict(error=result.stderr.strip().splitlines()[-1])
+
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def check(repeat: int, scale: float) -> bool:
+    """
+    Checks the import time of every entry point against its budget.
+
+    Args:
+    - repeat (int): Measures per entry point, the fastest is kept
+    - scale (float): Factor applied to the budgets, for slower machines
+
+    Returns:
+    - bool: True if no entry point is over budget or loads a forbidden module
+    """
+    passed = True
+    print("Entry point\t\tseconds\tbudget\tstatus")
+    for entry_point, (budget, forbidden) in ENTRY_POINTS.items():
+        results = [measure(entry_point, forbidden) for _ in range(repeat)]
+        errors = [r["error"] for r in results if "error" in r]
+        if errors:
+            # Missing optional dependencies (e.g. ccxtbt) do not fail the check
+            print("%-20s\t-\t%.2f\tSKIPPED: %s" % (entry_point, budget, errors[0]))
+            continue
+
+        seconds = min(r["seconds"] for r in results)
+        loaded = sorted(set(m for r in results for m in r["modules"]))
+        status = "OK"
+        if seconds > budget * scale:
+            status = "SLOW"
+        if loaded:
+            status = "LOADS " + ", ".join(loaded)
+        passed = passed and status == "OK"
+        print("%-20s\t%.3f\t%.2f\t%s" % (entry_point, seconds, budget * scale, status))
+
+    return passed
+
+
+def execute() -> None:
+    """
+    Main execution function: exits with status 1 on a startup regression.
+
+    Returns:
+    - None
+    """
+    parser = argparse.ArgumentParser(
+        description="Startup-time regression check of the entry points"
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        required=False,
+        type=int,
+        default=3,
+        help="Measures per entry point, the fastest is kept",
+    )
+    parser.add_argument(
+        "--scale",
+        "-s",
+        required=False,
+        type=float,
+        default=1.0,
+        help="Factor applied to the import budgets",
+    )
+    args = parser.parse_args()
+
+    if not check(args.repeat, args.scale):
+        exit(1)
+
+
+if __name__ == "__main__":
+    # Calling the main execution function
+    execute()